@@ -0,0 +1,295 @@
+"""
+Benchmark suite of the hot paths.
+
+Run from the repository root:
+    python -m benchmarks.run                         # all benchmarks, 1k and 10k keys
+    python -m benchmarks.run --sizes 1000,10000,100000 --filter keymanager
+    python -m benchmarks.run --latency 0.05 --filter flow
+    python -m benchmarks.run --save-baseline         # store results as the new baseline
+
+Results are written to benchmarks/results/ and compared with
+benchmarks/baseline.json, a median slower than the baseline by more than
+--threshold is reported as a regression (exit code 1).
+"""
+import argparse
+import contextlib
+import json
+import os
+import platform
+import random
+import statistics
+import sys
+import tempfile
+import time
+import typing
+from datetime import datetime
+from pathlib import Path
+
+from eth_account import Account
+
+from benchmarks.stub_node import StubNode, CHAIN_ID
+from utils.abi import get_abi
+from utils.account import KeyManager, new_encrypt_token
+from utils.chain import Networks
+from utils.cli import Context, cmd_balances, cmd_send, cmd_erc20
+from utils.crypto import BACKENDS, derive_addresses, new_private_key
+from utils.export import Export, Reader
+from utils.journal import journal, JOURNAL_FILE
+from utils.keystore import MAPPED_SUFFIX, MappedKeystore, to_mapped
+
+
+ROOT = Path(__file__).resolve().parent.parent
+RESULTS_DIR = ROOT / "benchmarks" / "results"
+BASELINE_PATH = ROOT / "benchmarks" / "baseline.json"
+TOKEN = "0x4200000000000000000000000000000000000006"
+# Keys per derivation run, reported as addresses/sec
+DERIVE_BATCH = 1000
+
+Benchmark = typing.Callable[..., typing.Callable[[], typing.Any]]
+BENCHMARKS: typing.Dict[str, typing.Tuple[Benchmark, bool]] = {}
+
+
+def benchmark(name: str, sized: bool = False):
+    """
+    Register a benchmark. The function does the setup and returns the timed operation.
+    Sized benchmarks are called with each keystore size.
+    """
+    def register(func: Benchmark) -> Benchmark:
+        BENCHMARKS[name] = (func, sized)
+        return func
+    return register
+
+
+def _keystore(workdir: str, size: int) -> KeyManager:
+    km = KeyManager(os.path.join(workdir, f"keys_{size}.json"), new_encrypt_token())
+    # Random keys are not needed to measure the keystore, derived ones are much faster
+    km.add_keys({f"bench_{i + 1}": f"{i + 1:064x}" for i in range(size)})
+    return km
+
+
+@benchmark("keymanager.create", sized=True)
+def bench_create(options, workdir, size):
+    km = _keystore(workdir, size)
+    return lambda: km.create(None)
+
+
+@benchmark("keymanager.add_key", sized=True)
+def bench_add_key(options, workdir, size):
+    km = _keystore(workdir, size)
+    counter = iter(range(10 ** 9))
+    return lambda: km.add_key(f"added_{next(counter)}", Account.create()._private_key.hex())
+
+
+@benchmark("keymanager.get_decrypted_key", sized=True)
+def bench_get_decrypted_key(options, workdir, size):
+    km = _keystore(workdir, size)
+    names = list(km.keys)
+    return lambda: km.get_decrypted_key(random.choice(names))
+
+
+@benchmark("keymanager.load_keys", sized=True)
+def bench_load_keys(options, workdir, size):
+    km = _keystore(workdir, size)
+    return km.load_keys
+
+
+def _mapped_keystore(workdir: str, size: int) -> str:
+    path = os.path.join(workdir, f"keys_{size}{MAPPED_SUFFIX}")
+    to_mapped(_keystore(workdir, size).file_path, path)
+    return path
+
+
+@benchmark("keystore.mapped.open", sized=True)
+def bench_mapped_open(options, workdir, size):
+    path = _mapped_keystore(workdir, size)
+    return lambda: MappedKeystore(path).close()
+
+
+@benchmark("keystore.mapped.lookup", sized=True)
+def bench_mapped_lookup(options, workdir, size):
+    store = MappedKeystore(_mapped_keystore(workdir, size))
+    return lambda: store[f"bench_{random.randint(1, size)}"]
+
+
+def _derive(backend: typing.Optional[str]) -> Benchmark:
+    def bench(options, workdir):
+        private_keys = [new_private_key() for _ in range(DERIVE_BATCH)]
+        # Cross-check against eth_account before timing
+        if backend is not None and derive_addresses(private_keys, backend) != [Account.from_key(key).address for key in private_keys]:
+            raise AssertionError(f"The {backend} backend derives other addresses than eth_account")
+        if backend is None:
+            # Reference: one LocalAccount per key
+            operation = lambda: [Account.from_key(key).address for key in private_keys]
+        else:
+            operation = lambda: derive_addresses(private_keys, backend)
+        operation.items = DERIVE_BATCH
+        return operation
+    return bench
+
+
+for _backend in BACKENDS:
+    benchmark(f"crypto.derive.{_backend}")(_derive(_backend))
+benchmark("crypto.derive.eth_account")(_derive(None))
+
+
+@benchmark("networks.load")
+def bench_networks_load(options, workdir):
+    return lambda: Networks(chains_path=ROOT / "chains")
+
+
+@benchmark("networks.lookup")
+def bench_networks_lookup(options, workdir):
+    chains = Networks(chains_path=ROOT / "chains")
+    names = [network["name"] for network in chains.networks["mixed"]]
+    return lambda: chains.get_rpc_url(random.choice(names))
+
+
+@benchmark("abi.get_abi")
+def bench_get_abi(options, workdir):
+    return lambda: get_abi(TOKEN, CHAIN_ID)
+
+
+@benchmark("reader.from_txt", sized=True)
+def bench_reader(options, workdir, size):
+    path = os.path.join(workdir, f"import_{size}.txt")
+    with open(path, 'w') as file:
+        for i in range(size):
+            file.write(f"0x{i + 1:040x} 0x{i + 1:064x}\n")
+    return Reader(path).from_txt
+
+
+def _export(workdir, size, method):
+    keys = {f"0x{i + 1:040x}": f"{i + 1:064x}" for i in range(size)}
+    return getattr(Export(workdir, keys, "PRIVATEKEY_ADDRESS"), method)
+
+
+@benchmark("export.to_txt", sized=True)
+def bench_export_txt(options, workdir, size):
+    return _export(workdir, size, "to_txt")
+
+
+@benchmark("export.to_csv", sized=True)
+def bench_export_csv(options, workdir, size):
+    return _export(workdir, size, "to_csv")
+
+
+def _flow(options, workdir, command, params):
+    node = options["node"]
+    km = KeyManager(os.path.join(workdir, f"flow_{command.__name__}.json"), new_encrypt_token())
+    km.add_keys({f"flow_{i + 1}": Account.create()._private_key.hex() for i in range(options["flow_accounts"])})
+    ctx = Context(km, Networks(chains_path=ROOT / "chains"), {"ENDPOINT": node.url})
+    # Keep stub answers out of the real data/<chainId>/ cache
+    ctx.cache_path = workdir
+    journal.path = os.path.join(workdir, JOURNAL_FILE)
+    return lambda: list(command(ctx, dict(params)))
+
+
+@benchmark("flow.balances")
+def bench_flow_balances(options, workdir):
+    return _flow(options, workdir, cmd_balances, {})
+
+
+@benchmark("flow.transfer")
+def bench_flow_transfer(options, workdir):
+    return _flow(options, workdir, cmd_send, {"to": "0x" + "00" * 20, "amount": "0.001"})
+
+
+@benchmark("flow.erc20")
+def bench_flow_erc20(options, workdir):
+    return _flow(options, workdir, cmd_erc20, {"contract": TOKEN, "to": "0x" + "00" * 20, "amount": "1"})
+
+
+def measure(operation: typing.Callable[[], typing.Any], repeat: int, min_time: float) -> typing.Dict[str, float]:
+    operation()  # warm up
+    samples = []
+    started = time.perf_counter()
+    while len(samples) < repeat or time.perf_counter() - started < min_time:
+        t = time.perf_counter()
+        operation()
+        samples.append(time.perf_counter() - t)
+        if len(samples) >= repeat * 10:
+            break
+    return {
+        "runs": len(samples),
+        "min": min(samples),
+        "median": statistics.median(samples),
+        "mean": statistics.fmean(samples),
+    }
+
+
+def compare(results: typing.Dict[str, typing.Dict[str, float]], baseline_path: Path, threshold: float) -> typing.List[str]:
+    if not baseline_path.exists():
+        return []
+    with open(baseline_path, 'r') as file:
+        baseline = json.load(file)["results"]
+    regressions = []
+    for name, result in results.items():
+        if name in baseline and result["median"] > baseline[name]["median"] * (1 + threshold):
+            ratio = result["median"] / baseline[name]["median"]
+            regressions.append(f"{name}: {ratio:.2f}x slower than baseline")
+    return regressions
+
+
+def main(argv: typing.Optional[typing.List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Benchmark the hot paths of the CLI.")
+    parser.add_argument("--sizes", default="1000,10000", help="Keystore sizes, comma separated")
+    parser.add_argument("--filter", default="", help="Only benchmarks whose name contains this")
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--min-time", type=float, default=0.2, help="Minimum seconds spent per benchmark")
+    parser.add_argument("--latency", type=float, default=0.0, help="Stub node latency per request, seconds")
+    parser.add_argument("--rate-limit", type=float, help="Stub node requests per second")
+    parser.add_argument("--flow-accounts", type=int, default=50, help="Accounts used by flow benchmarks")
+    parser.add_argument("--threshold", type=float, default=0.2, help="Allowed slowdown against the baseline")
+    parser.add_argument("--save-baseline", action="store_true")
+    args = parser.parse_args(argv)
+
+    sizes = [int(size) for size in args.sizes.split(",") if size]
+    results: typing.Dict[str, typing.Dict[str, float]] = {}
+    with StubNode(latency=args.latency, rate_limit=args.rate_limit) as node, tempfile.TemporaryDirectory() as workdir:
+        options = {"node": node, "flow_accounts": args.flow_accounts}
+        for name, (func, sized) in BENCHMARKS.items():
+            if args.filter not in name:
+                continue
+            for size in sizes if sized else [None]:
+                label = f"{name}[{size}]" if sized else name
+                with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+                    operation = func(options, workdir, size) if sized else func(options, workdir)
+                    result = measure(operation, args.repeat, args.min_time)
+                # Operations over many items also report a rate, e.g. addresses/sec
+                if getattr(operation, "items", None):
+                    result["per_second"] = operation.items / result["median"]
+                results[label] = result
+                rate = f"   {result['per_second']:10.0f} /s" if "per_second" in result else ""
+                print(f"{label:45} median {result['median'] * 1000:10.3f} ms   min {result['min'] * 1000:10.3f} ms   runs {result['runs']}{rate}")
+
+    report = {
+        "meta": {
+            "date": datetime.now().isoformat(timespec="seconds"),
+            "python": platform.python_version(),
+            "machine": platform.machine(),
+            "cpus": os.cpu_count(),
+            "latency": args.latency,
+            "rate_limit": args.rate_limit,
+        },
+        "results": results,
+    }
+    RESULTS_DIR.mkdir(parents=True, exist_ok=True)
+    result_path = RESULTS_DIR / f"{datetime.now().strftime('%Y-%m-%d_%H-%M-%S')}.json"
+    with open(result_path, 'w') as file:
+        json.dump(report, file, indent=2)
+    print(f"\nResults saved to {result_path}")
+
+    if args.save_baseline:
+        with open(BASELINE_PATH, 'w') as file:
+            json.dump(report, file, indent=2)
+        print(f"Baseline saved to {BASELINE_PATH}")
+        return 0
+
+    regressions = compare(results, BASELINE_PATH, args.threshold)
+    for regression in regressions:
+        print(f"REGRESSION {regression}")
+    return 1 if regressions else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
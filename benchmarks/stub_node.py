@@ -0,0 +1,310 @@
+import json
+import threading
+import time
+import typing
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from eth_abi import decode, encode
+from eth_account import Account
+from eth_account.typed_transactions import TypedTransaction
+from eth_account._utils.legacy_transactions import Transaction
+from eth_utils import keccak
+from hexbytes import HexBytes
+
+
+CHAIN_ID = 1946
+GAS_PRICE = 10 ** 9
+DEFAULT_BALANCE = 10 ** 20
+
+# ERC20 selectors answered by eth_call
+DECIMALS = "0x313ce567"
+BALANCE_OF = "0x70a08231"
+SYMBOL = "0x95d89b41"
+NAME = "0x06fdde03"
+APPROVE = "0x095ea7b3"
+ALLOWANCE = "0xdd62ed3e"
+# disperseToken(address,address[],uint256[]) spends the sender's tokens through transferFrom
+DISPERSE_TOKEN = "0x" + keccak(text="disperseToken(address,address[],uint256[])")[:4].hex()
+
+Revert = typing.Callable[[typing.Dict[str, typing.Any]], bool]
+
+
+class StubNode:
+    def __init__(
+        self,
+        chain_id: int = CHAIN_ID,
+        latency: float = 0.0,
+        rate_limit: typing.Optional[float] = None,
+        block_time: float = 2.0,
+        port: int = 0,
+        revert: typing.Optional[Revert] = None,
+    ):
+        """
+        In-process JSON-RPC node for benchmarks and tests.
+
+        Every address starts with DEFAULT_BALANCE of native and token balance,
+        sent transactions bump the sender nonce and get a successful receipt.
+        Approvals are recorded, and disperseToken reverts without allowance.
+
+        Args:
+        chain_id (int): Chain ID reported by eth_chainId.
+        latency (float): Seconds added to every HTTP request.
+        rate_limit (Optional[float]): Requests per second before answering 429, unlimited by default.
+        block_time (float): Seconds between two simulated blocks.
+        port (int): Port to listen on, a free one by default.
+        revert (Optional[Callable]): revert({"from", "to", "data", "value"}) -> True makes the call or tx revert.
+        """
+        self.chain_id = chain_id
+        self.latency = latency
+        self.rate_limit = rate_limit
+        self.block_time = block_time
+        self.started = time.monotonic()
+        self.balances: typing.Dict[str, int] = {}
+        self.nonces: typing.Dict[str, int] = {}
+        self.receipts: typing.Dict[str, typing.Dict[str, typing.Any]] = {}
+        # (owner, token, spender) -> amount
+        self.allowances: typing.Dict[typing.Tuple[str, str, str], int] = {}
+        self.revert = revert
+        self.requests = 0
+        self.calls: typing.Dict[str, int] = {}
+        self.throttled = 0
+        self._tokens = rate_limit or 0.0
+        self._refilled = time.monotonic()
+        self._lock = threading.Lock()
+        self.server = ThreadingHTTPServer(("127.0.0.1", port), self._handler())
+        self.server.daemon_threads = True
+        self._thread: typing.Optional[threading.Thread] = None
+
+    @property
+    def url(self) -> str:
+        host, port = self.server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self) -> "StubNode":
+        self._thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def __enter__(self) -> "StubNode":
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+    def block_number(self) -> int:
+        return 1000 + int((time.monotonic() - self.started) / self.block_time)
+
+    def _allow(self) -> bool:
+        if self.rate_limit is None:
+            return True
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self.rate_limit, self._tokens + (now - self._refilled) * self.rate_limit)
+            self._refilled = now
+            if self._tokens < 1:
+                self.throttled += 1
+                return False
+            self._tokens -= 1
+            return True
+
+    def _reverts(self, tx: typing.Dict[str, typing.Any]) -> typing.Optional[str]:
+        data = tx.get("data") or "0x"
+        if data[:10] == DISPERSE_TOKEN:
+            token, _, values = decode(["address", "address[]", "uint256[]"], bytes.fromhex(data[10:]))
+            key = (tx.get("from", "").lower(), token.lower(), (tx.get("to") or "").lower())
+            if self.allowances.get(key, 0) < sum(values):
+                return "execution reverted: transfer amount exceeds allowance"
+        if self.revert is not None and self.revert(tx):
+            return "execution reverted"
+        return None
+
+    def _call(self, tx: typing.Dict[str, typing.Any]) -> str:
+        error = self._reverts(tx)
+        if error:
+            raise ValueError(error)
+        data = tx.get("data") or "0x"
+        selector = data[:10]
+        if selector == ALLOWANCE:
+            owner, spender = decode(["address", "address"], bytes.fromhex(data[10:]))
+            return "0x" + encode(["uint256"], [self.allowances.get((owner.lower(), tx["to"].lower(), spender.lower()), 0)]).hex()
+        if selector == DECIMALS:
+            return "0x" + encode(["uint8"], [18]).hex()
+        if selector == BALANCE_OF:
+            return "0x" + encode(["uint256"], [DEFAULT_BALANCE]).hex()
+        if selector in (SYMBOL, NAME):
+            return "0x" + encode(["string"], ["STUB"]).hex()
+        # transfer, approve and the like succeed
+        return "0x" + encode(["bool"], [True]).hex()
+
+    def _send(self, raw: str) -> str:
+        sender = Account.recover_transaction(raw).lower()
+        tx_hash = "0x" + keccak(hexstr=raw).hex().removeprefix("0x")
+        data = HexBytes(raw)
+        fields = (TypedTransaction if data[0] < 0x80 else Transaction).from_bytes(data).as_dict()
+        to = "0x" + bytes(fields.get("to") or b"").hex() if fields.get("to") else None
+        tx = {"from": sender, "to": to, "data": "0x" + bytes(fields.get("data") or b"").hex(), "value": fields.get("value", 0)}
+        status = "0x0" if self._reverts(tx) else "0x1"
+        with self._lock:
+            if status == "0x1" and tx["data"][:10] == APPROVE:
+                spender, amount = decode(["address", "uint256"], bytes.fromhex(tx["data"][10:]))
+                self.allowances[(sender, to, spender.lower())] = amount
+            self.nonces[sender] = self.nonces.get(sender, 0) + 1
+            self.receipts[tx_hash] = {
+                "transactionHash": tx_hash,
+                "blockNumber": hex(self.block_number()),
+                "blockHash": "0x" + "11" * 32,
+                "transactionIndex": "0x0",
+                "from": sender,
+                "to": to,
+                "status": status,
+                "gasUsed": hex(21000),
+                "cumulativeGasUsed": hex(21000),
+                "effectiveGasPrice": hex(GAS_PRICE),
+                "logs": [],
+                "logsBloom": "0x" + "00" * 256,
+                "contractAddress": None,
+                "type": "0x2",
+            }
+        return tx_hash
+
+    def _block(self, number: int) -> typing.Dict[str, typing.Any]:
+        return {
+            "number": hex(number),
+            "hash": "0x" + number.to_bytes(32, "big").hex(),
+            "parentHash": "0x" + (number - 1).to_bytes(32, "big").hex(),
+            "timestamp": hex(int(time.time())),
+            "gasLimit": hex(30_000_000),
+            "gasUsed": hex(15_000_000),
+            "baseFeePerGas": hex(GAS_PRICE),
+            "miner": "0x" + "00" * 20,
+            "difficulty": "0x0",
+            "totalDifficulty": "0x0",
+            "extraData": "0x",
+            "size": "0x0",
+            "nonce": "0x0000000000000000",
+            "sha3Uncles": "0x" + "00" * 32,
+            "logsBloom": "0x" + "00" * 256,
+            "transactionsRoot": "0x" + "00" * 32,
+            "stateRoot": "0x" + "00" * 32,
+            "receiptsRoot": "0x" + "00" * 32,
+            "mixHash": "0x" + "00" * 32,
+            "transactions": [],
+            "uncles": [],
+        }
+
+    @staticmethod
+    def _tx(params: typing.Dict[str, typing.Any]) -> typing.Dict[str, typing.Any]:
+        return {
+            "from": (params.get("from") or "").lower(),
+            "to": (params.get("to") or "").lower(),
+            "data": params.get("data") or params.get("input") or "0x",
+            "value": int(params.get("value") or "0x0", 16),
+        }
+
+    def dispatch(self, method: str, params: typing.List[typing.Any]) -> typing.Any:
+        with self._lock:
+            self.calls[method] = self.calls.get(method, 0) + 1
+        match method:
+            case "eth_chainId":
+                return hex(self.chain_id)
+            case "net_version":
+                return str(self.chain_id)
+            case "eth_blockNumber":
+                return hex(self.block_number())
+            case "eth_gasPrice":
+                return hex(GAS_PRICE)
+            case "eth_maxPriorityFeePerGas":
+                return hex(GAS_PRICE // 10)
+            case "eth_feeHistory":
+                count = int(params[0], 16) if isinstance(params[0], str) else int(params[0])
+                return {
+                    "oldestBlock": hex(self.block_number() - count + 1),
+                    "baseFeePerGas": [hex(GAS_PRICE)] * (count + 1),
+                    "gasUsedRatio": [0.5] * count,
+                    "reward": [[hex(GAS_PRICE // 10)] for _ in range(count)],
+                }
+            case "eth_getBalance":
+                return hex(self.balances.get(params[0].lower(), DEFAULT_BALANCE))
+            case "eth_getTransactionCount":
+                return hex(self.nonces.get(params[0].lower(), 0))
+            case "eth_getCode":
+                return "0x6080"
+            case "eth_call":
+                return self._call(self._tx(params[0]))
+            case "eth_estimateGas":
+                tx = self._tx(params[0])
+                error = self._reverts(tx)
+                if error:
+                    raise ValueError(error)
+                return hex(21000 if tx["data"] == "0x" else 60000)
+            case "eth_sendRawTransaction":
+                return self._send(params[0])
+            case "eth_getTransactionReceipt":
+                return self.receipts.get(params[0])
+            case "eth_getBlockByNumber":
+                tag = params[0]
+                number = self.block_number() if tag in ("latest", "pending", "safe", "finalized") else int(tag, 16)
+                return self._block(number)
+            case "eth_getLogs":
+                return []
+        raise NotImplementedError(method)
+
+    def _answer(self, request: typing.Dict[str, typing.Any]) -> typing.Dict[str, typing.Any]:
+        response = {"jsonrpc": "2.0", "id": request.get("id")}
+        try:
+            response["result"] = self.dispatch(request["method"], request.get("params") or [])
+        except NotImplementedError as e:
+            response["error"] = {"code": -32601, "message": f"Method not found: {e}"}
+        except Exception as e:
+            response["error"] = {"code": -32000, "message": str(e)}
+        return response
+
+    def _handler(self):
+        node = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, *args):
+                pass
+
+            def do_POST(self):
+                body = self.rfile.read(int(self.headers.get("Content-Length", 0)))
+                with node._lock:
+                    node.requests += 1
+                if node.latency:
+                    time.sleep(node.latency)
+                if not node._allow():
+                    self.send_response(429)
+                    self.send_header("Retry-After", "1")
+                    self.send_header("Content-Length", "0")
+                    self.end_headers()
+                    return
+                request = json.loads(body)
+                if isinstance(request, list):
+                    payload = [node._answer(item) for item in request]
+                else:
+                    payload = node._answer(request)
+                data = json.dumps(payload).encode()
+                self.send_response(200)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+        return Handler
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Run the stub JSON-RPC node")
+    parser.add_argument("--port", type=int, default=8545)
+    parser.add_argument("--latency", type=float, default=0.0)
+    parser.add_argument("--rate-limit", type=float)
+    args = parser.parse_args()
+    node = StubNode(latency=args.latency, rate_limit=args.rate_limit, port=args.port)
+    print(f"Stub node on {node.url}, chain ID {node.chain_id}")
+    node.server.serve_forever()
@@ -1,17 +1,53 @@
+import atexit
 import os
+import re
+import sys
+from datetime import datetime
 from colorama import Fore, Back, Style
 from web3 import Web3
 import inquirer
 from pathlib import Path
 
 from utils.tx import SendTransaction
+from utils.gas import FeeOracle
+from utils.metrics import metrics, instrument, Profiler
+from utils.ratelimit import rate_limit
+from utils.cache import enable_cache
+from utils.sweep import check_empty, sweep, DEFAULT_GAS_LIMIT
+from utils.portfolio import scan as portfolio_scan, format_amount
+from utils.snapshot import SnapshotStore
+from utils.distribute import Distributor, DISPERSE_ADDRESS, load_recipients
+from utils.preflight import simulate as preflight, summary as preflight_summary
+from utils.replace import replace_stuck, track, SPEED_UP, CANCEL, DEFAULT_BUMP
+from utils.journal import journal
+from utils.heads import HeadScheduler, ws_endpoint
+from utils.selector import select_accounts
+from utils.dataset import BalanceDataset
+from utils.invoke import FunctionInvoker, SELF, is_amount
+from utils.batch import batch_call
+from utils.crypto import address_map
+from utils.offline import load_plan, sign_bundle, broadcast_bundle
 from utils.chain import Networks
+from utils.endpoint import fastest as fastest_endpoint
 from utils.abi import ABIDecoder, get_abi
 from utils.export import Export, Reader, TEMPLATES
 from utils.init import configure, load_chains, load_contracts
 from utils.account import new_encrypt_token, KeyManager
+from utils.rotate import rotate as rotate_token
+from utils.hdwallet import HDWallet
+from utils.vanity import VanityPattern, search as vanity_search, format_eta
 
 
+# Any argument switches to headless mode, see utils/cli.py
+HEADLESS = len(sys.argv) > 1
+if HEADLESS:
+    # Keep stdout for JSON lines, human-readable messages go to stderr
+    results_stream, sys.stdout = sys.stdout, sys.stderr
+
+# Opt-in performance report written on exit, .prom for Prometheus text, JSON otherwise
+if os.getenv("EVMACCS_METRICS"):
+    atexit.register(metrics.export, os.getenv("EVMACCS_METRICS"))
+
 # Check validity of .env file or initialize it
 config = configure(".env", new_encrypt_token().decode())
 for key in ["ENDPOINT", "KEYS_PATH", "ENCRYPTION_TOKEN"]:
@@ -21,7 +57,7 @@ for key in ["ENDPOINT", "KEYS_PATH", "ENCRYPTION_TOKEN"]:
 
 
 #______________________________INITIALIZE_KEY_MANAGER_SECTION________________________
-km = KeyManager(config["KEYS_PATH"], config["ENCRYPTION_TOKEN"])
+km = KeyManager(config["KEYS_PATH"], config["ENCRYPTION_TOKEN"], [config.get("ENCRYPTION_TOKEN_PREVIOUS")])
 # __________________________________________________________________________________
 
 #______________________________INITIALIZE_CHAINS_SECTION________________________
@@ -34,7 +70,8 @@ if load_chains(chains_path=chains_dir):
 
 # ______________________________INITIALIZE_WEB3_SECTION________________________
 def w3_init(endpoint) -> Web3:
-    w3 = Web3(Web3.HTTPProvider(endpoint))
+    w3 = rate_limit(instrument(Web3(Web3.HTTPProvider(endpoint))))
+    w3.rpc_cache = enable_cache(w3)
     if w3.is_connected():  
         print(
             f"{Back.BLUE}\nConnected to the endpoint, current chain ID: {w3.eth.chain_id}{Style.RESET_ALL}"
@@ -49,7 +86,19 @@ def menu():
     sentinel = "Exit"
     choice = None
     w3 = None  # Initialize w3 variable
+    fee_oracle = None
+    snapshots = SnapshotStore()
+
+    def account_addresses():
+        # Only derived when an account search is by address, mapped keystores store them
+        return km.get_addresses()
+
+    # Profiles one action at a time when EVMACCS_PROFILE is set
+    profiler = Profiler()
     while choice != sentinel:
+        profile_path = profiler.stop()
+        if profile_path:
+            print(f"Profile saved to {profile_path}")
         # Clear the terminal at the beginning of each loop iteration
         os.system('cls' if os.name == 'nt' else 'clear')
 
@@ -67,15 +116,26 @@ def menu():
                     "Show my accounts",
                     "Show available batches of accounts",
                     "Unsafe export keys to file",
+                    "Rotate encryption token",
                     "Get balance of each account",
+                    "Portfolio scan [MULTI-CHAIN]",
+                    "Export balances dataset [COLUMNAR]",
                     "Transaction(s) [NATIVE TOKEN]",
+                    "Sweep accounts [NATIVE TOKEN]",
+                    "Replace stuck transactions",
                     "Contract call(s) [ERC20 TOKEN]",
+                    "Distribute [MULTISEND]",
+                    "Offline signing [BUNDLE]",
+                    "Broadcast bundle",
+                    "Export performance report",
                     "Exit",
                 ],
             )
         ]
         answer = inquirer.prompt(questions)
         choice = answer["choice"]
+        metrics.set_action(choice)
+        profiler.start(choice)
 
         match choice:
             case "Show available batches of accounts":
@@ -115,15 +175,7 @@ def menu():
                 os.system('cls' if os.name == 'nt' else 'clear')
                 accounts = km.load_keys()
                 if accounts:
-                    questions = [
-                        inquirer.List(
-                            "name",
-                            message="Select account to delete",
-                            choices=accounts,
-                        )
-                    ]
-                    answers = inquirer.prompt(questions)
-                    name = answers["name"]
+                    name = select_accounts(km, "Select account to delete", multiple=False)[0]
                     km.delete_key(name)
                     print(f"Account '{name}' deleted.\n")
                 else:
@@ -135,15 +187,7 @@ def menu():
                 os.system('cls' if os.name == 'nt' else 'clear')
                 accounts = km.load_keys()
                 if accounts:
-                    questions = [
-                        inquirer.List(
-                            "name",
-                            message="Select account to get private key",
-                            choices=accounts,
-                        )
-                    ]
-                    answers = inquirer.prompt(questions)
-                    name = answers["name"]
+                    name = select_accounts(km, "Select account to get private key", multiple=False)[0]
                     private_key = km.get_decrypted_key(name)
                     if private_key is not None:
                         print(f"Private key for '{name}': {private_key}\n")
@@ -155,6 +199,11 @@ def menu():
             case "Generate new account(s)":
                 os.system('cls' if os.name == 'nt' else 'clear')
                 questions = [
+                    inquirer.List(
+                        "mode",
+                        message="Select how to generate account(s)",
+                        choices=["Random private keys", "From mnemonic (HD wallet)", "Vanity address (pattern search)"],
+                    ),
                     inquirer.Text(
                         "num_accounts",
                         message="Enter the number of account(s) to generate",
@@ -165,9 +214,70 @@ def menu():
                 answers = inquirer.prompt(questions)
                 num_accounts = int(answers["num_accounts"])
                 name_prefix = answers["name_prefix"]
-                print("\n")
-                for num in range(num_accounts):
-                    km.create(name=f"{name_prefix}_{num + 1}")
+
+                if answers["mode"] == "From mnemonic (HD wallet)":
+                    hd_questions = [
+                        inquirer.Password("mnemonic", message="Enter mnemonic (leave empty to generate a new one)"),
+                        inquirer.Text(
+                            "start",
+                            message="Enter the first derivation index",
+                            default="0",
+                            validate=lambda _, x: x.isdigit(),
+                        ),
+                    ]
+                    hd_answers = inquirer.prompt(hd_questions)
+                    mnemonic = hd_answers["mnemonic"].strip()
+                    if not mnemonic:
+                        mnemonic = HDWallet.generate_mnemonic()
+                        print(f"{Fore.YELLOW}\nNew mnemonic (write it down): {mnemonic}{Style.RESET_ALL}\n")
+                    print("\n")
+                    try:
+                        km.add_hd_keys(mnemonic, name_prefix, start=int(hd_answers["start"]), count=num_accounts)
+                    except ValueError as e:
+                        print(f"{Fore.RED}\nError deriving accounts: {e}{Style.RESET_ALL}\n")
+                        input("Press Enter to continue...")
+                        continue
+                elif answers["mode"] == "Vanity address (pattern search)":
+                    is_hex = lambda _, x: all(c in "0123456789abcdefABCDEF" for c in x.removeprefix("0x"))
+                    vanity_questions = [
+                        inquirer.Text("prefix", message="Enter the address prefix (hex, may be empty)", validate=is_hex),
+                        inquirer.Text("suffix", message="Enter the address suffix (hex, may be empty)", validate=is_hex),
+                        inquirer.Text("regex", message="Enter a regex to match (may be empty)"),
+                        inquirer.Confirm("case_sensitive", message="Match checksum case?", default=False),
+                    ]
+                    vanity_answers = inquirer.prompt(vanity_questions)
+                    try:
+                        pattern = VanityPattern(
+                            vanity_answers["prefix"],
+                            vanity_answers["suffix"],
+                            vanity_answers["regex"],
+                            vanity_answers["case_sensitive"],
+                        )
+                    except (ValueError, re.error) as e:
+                        print(f"{Fore.RED}\nInvalid pattern: {e}{Style.RESET_ALL}\n")
+                        input("Press Enter to continue...")
+                        continue
+
+                    def show_progress(attempts, rate, eta):
+                        print(f"\rAttempts: {attempts}, {rate:.0f} addr/s, expected: {format_eta(eta)}   ", end="", flush=True)
+
+                    print("\n")
+                    # Ctrl+C stops the search, the matches found so far are returned
+                    found = vanity_search(pattern, count=num_accounts, on_progress=show_progress)
+                    print("\n")
+                    if len(found) < num_accounts:
+                        print(f"{Fore.YELLOW}Search stopped with {len(found)} of {num_accounts} match(es).{Style.RESET_ALL}")
+                        if found and not inquirer.confirm("Save the matches found so far?", default=True):
+                            found = []
+                    for num, (private_key, address) in enumerate(found):
+                        name = f"{name_prefix}_{num + 1}" if name_prefix else f"{address[2:5]}_{address[-3:]}"
+                        km.add_key(name, private_key)
+                        print(f"{Fore.GREEN}{name}: {address}{Style.RESET_ALL}")
+                    num_accounts = len(found)
+                else:
+                    print("\n")
+                    # One keystore write and one batch of address derivations for all of them
+                    km.create_many([f"{name_prefix}_{num + 1}" for num in range(num_accounts)])
                 print(f"Successfully generated {num_accounts} account(s).\n")
                 input("Press Enter to continue...")
                 continue
@@ -224,12 +334,31 @@ def menu():
                     )
                 ]
                 answers = inquirer.prompt(questions)
-                endpoint = chains.get_rpc_url(answers["name"])
+                network = chains.find(answers["name"])
+                questions = [
+                    inquirer.List(
+                        "mode",
+                        message="Select endpoint",
+                        choices=["Fastest available (auto)", "Configured RPC URL"],
+                    )
+                ]
+                mode = inquirer.prompt(questions)["mode"]
+                if mode == "Fastest available (auto)" and network:
+                    print("Probing endpoints...")
+                    endpoint, probes = fastest_endpoint(chains, network["chainId"])
+                    for probe in probes:
+                        if probe.error is None:
+                            print(f"{Fore.GREEN}{probe.latency * 1000:8.1f} ms  block {probe.block}  {probe.url}{Style.RESET_ALL}")
+                        else:
+                            print(f"{Fore.RED}{'-':>8}     {probe.error[:60]}  {probe.url}{Style.RESET_ALL}")
+                else:
+                    endpoint = chains.get_rpc_url(answers["name"])
                 if not endpoint:
                     print(f"{Fore.RED}\nNo endpoint provided.{Style.RESET_ALL}\n")
                     input("Press Enter to continue...")
                     continue
                 w3 = w3_init(endpoint)
+                fee_oracle = FeeOracle(w3)
                 print("\n")
                 input("Press Enter to continue...")
                 continue
@@ -253,6 +382,7 @@ def menu():
                 os.system('cls' if os.name == 'nt' else 'clear')
                 
                 export_data = {}
+                export_paths = {}
                 accounts = km.load_keys()
 
                 if w3 is None:
@@ -302,11 +432,12 @@ def menu():
                             if "SEEDPHRASE" in template:
                                 if mnemonic:
                                     export_data[address] = mnemonic
+                                    export_paths[address] = km.get_derivation_path(acc)
                                 else:
                                     print(f"{Fore.RED}\nNo mnemonic found for account: {acc}{Style.RESET_ALL}\n")
                                     continue
 
-                    _export = Export(export_path, export_data, template)
+                    _export = Export(export_path, export_data, template, export_paths)
                     if file_format == "txt":
                         _export.to_txt()
                     elif file_format == "csv":
@@ -331,12 +462,15 @@ def menu():
                         continue
                     try:
                         current_symbol = chains.get_symbol_by_id(str(w3.eth.chain_id))
-                        for acc in accounts:
-                            key = km.get_decrypted_key(acc)
-                            address = w3.eth.account.from_key(key).address
-                            balance = w3.eth.get_balance(address)
+                        addresses = km.get_addresses(accounts)
+                        # Native balances are read again in batches at the snapshot block
+                        summary = snapshots.refresh(w3, addresses.values())
+                        balances = snapshots.load(summary["chainId"])
+                        for acc, address in addresses.items():
+                            balance, _ = balances.get(address.lower(), (0, 0))
                             if balance > 0:
                                 print(f"{acc}: {balance / 10**18} {current_symbol}")
+                        print(f"\nSnapshot at block {summary['block']}, {summary['read']['native']} balance(s) read.")
                         print("\n")
                     except Exception as e:
                         print(f"{Fore.RED}\nError fetching balances: {e}{Style.RESET_ALL}\n")
@@ -345,6 +479,105 @@ def menu():
                 input("Press Enter to continue...")
                 continue
 
+            case "Portfolio scan [MULTI-CHAIN]":
+                os.system('cls' if os.name == 'nt' else 'clear')
+                accounts = km.load_keys()
+                if not accounts:
+                    print(f"{Fore.RED}\nNo accounts found.{Style.RESET_ALL}\n")
+                    input("Press Enter to continue...")
+                    continue
+                questions = [
+                    inquirer.Checkbox(
+                        "types",
+                        message="Select network types",
+                        choices=["Mainnet", "Testnet", "Mixed"],
+                        default=["Mainnet"],
+                    ),
+                    inquirer.Text("search", message="Filter networks by name or chain ID (empty for all)"),
+                ]
+                answers = inquirer.prompt(questions)
+                search = answers["search"].strip().lower()
+                _chains = [
+                    network
+                    for _type in answers["types"]
+                    for network in chains.networks[_type.lower()]
+                    if search in network.get("name", "").lower() or search == network.get("chainId")
+                ]
+                if not _chains:
+                    print(f"{Fore.RED}\nNo networks found.{Style.RESET_ALL}\n")
+                    input("Press Enter to continue...")
+                    continue
+                questions = [
+                    inquirer.Checkbox(
+                        "names",
+                        message="Select networks to scan",
+                        choices=[network["name"] for network in _chains],
+                    ),
+                    inquirer.Confirm("auto", message="Use the fastest endpoint of each network?", default=False),
+                ]
+                answers = inquirer.prompt(questions)
+                selected = [network for network in _chains if network["name"] in answers["names"]]
+                addresses = km.get_addresses(accounts)
+                print(f"Scanning {len(selected)} network(s) for {len(addresses)} account(s)...")
+                rows, timings = portfolio_scan(selected, addresses, auto_endpoint=answers["auto"], chains=chains, store=snapshots)
+
+                print(f"\n{'Network':30} {'Account':20} {'Asset':12} {'Balance':>24}")
+                for row in rows:
+                    if "error" not in row and row["balance"] > 0:
+                        print(f"{row['chain'][:30]:30} {row['account'][:20]:20} {str(row['asset'])[:12]:12} {format_amount(row['balance'], row['decimals']):>24}")
+                print("\nPer network:")
+                for timing in timings:
+                    if "error" in timing:
+                        print(f"{Fore.RED}{timing['chain'][:30]:30} {timing['seconds']:7.2f} s  {timing['error'][:80]}{Style.RESET_ALL}")
+                    else:
+                        print(f"{timing['chain'][:30]:30} {timing['seconds']:7.2f} s  {timing['calls']} calls")
+                print("\n")
+                input("Press Enter to continue...")
+                continue
+
+            case "Export balances dataset [COLUMNAR]":
+                os.system('cls' if os.name == 'nt' else 'clear')
+                accounts = km.load_keys()
+                if not accounts:
+                    print(f"{Fore.RED}\nNo accounts found.{Style.RESET_ALL}\n")
+                    input("Press Enter to continue...")
+                    continue
+                timestamp = datetime.now().strftime("%Y-%m-%d_%H-%M-%S")
+                questions = [
+                    inquirer.List("file_format", message="Select the file format", choices=["npz", "parquet"], default="npz"),
+                    inquirer.Text("path", message="Enter the dataset path", default=f"{timestamp}_balances"),
+                    inquirer.Text("dust", message="Count balances below this amount as dust", default="0.001"),
+                ]
+                answers = inquirer.prompt(questions)
+                try:
+                    dust = float(answers["dust"])
+                    # Balances come from the snapshots kept by "Get balance of each account" and the portfolio scan
+                    symbols = {int(network["chainId"]): network.get("symbol") for kind in chains.networks.values() for network in kind}
+                    dataset = BalanceDataset.from_snapshots(snapshots, account_addresses(), symbols=symbols)
+                    path = answers["path"]
+                    if answers["file_format"] == "parquet":
+                        path = dataset.to_parquet(path if path.endswith(".parquet") else path + ".parquet")
+                    else:
+                        path = dataset.to_npz(path)
+                except Exception as e:
+                    print(f"{Fore.RED}\nError exporting the dataset: {e}{Style.RESET_ALL}\n")
+                    input("Press Enter to continue...")
+                    continue
+
+                print(f"{Fore.GREEN}\n{len(dataset)} row(s) saved to {path}{Style.RESET_ALL}\n")
+                print("Totals per batch and chain:")
+                for row in dataset.totals(("batch", "chainId", "asset"))[:20]:
+                    print(f"  {row['batch']} on {row['chainId']}: {row['amount']} {row['asset']} in {row['holders']}/{row['accounts']} account(s)")
+                print("\nTop holders:")
+                for row in dataset.top(10):
+                    print(f"  {row['account']} ({row['address']}): {row['amount']} {row['asset']} on {row['chainId']}")
+                print(f"\nDust below {dust}:")
+                for row in dataset.dust(dust):
+                    print(f"  {row['count']} account(s) with {row['amount']} {row['asset']} on {row['chainId']}")
+                print("\n")
+                input("Press Enter to continue...")
+                continue
+
             case "Transaction(s) [NATIVE TOKEN]":
                 os.system('cls' if os.name == 'nt' else 'clear')
                 accounts = km.load_keys()
@@ -357,12 +590,8 @@ def menu():
                         continue
 
 
+                    selected_accounts = select_accounts(km, "Select [FROM] account(s) to transfer", all_label="Send from all accounts", addresses=account_addresses)
                     tx_question = [
-                        inquirer.Checkbox( 
-                            "accounts",
-                            message="Select [FROM] account(s) to transfer",
-                            choices=list(accounts) + ["Send from all accounts"],
-                        ),
                         inquirer.Text(
                             "amount",
                             message="Enter the amount to transfer (in ether or native token)",
@@ -379,55 +608,209 @@ def menu():
                         ),
                         inquirer.Text(
                             "gas_price",
-                            message="Enter the gas price",
-                            default = w3.eth.gas_price
+                            message="Enter the gas price in wei (leave empty for EIP-1559 fees)",
                         )
                     ]
 
                     answers = inquirer.prompt(tx_question)
 
-                    selected_accounts = list(accounts) if "Send from all accounts" in answers["accounts"] else answers["accounts"]
-
+                    chain_id = w3.eth.chain_id
+                    to_address = answers["to_address"]
 
+                    try:
+                        # Converting to correct format (wei)
+                        amount = w3.to_wei(float(answers["amount"]), 'ether')
+                        gas_limit = int(answers["gas_limit"])
+                        gas_price = int(answers["gas_price"]) if answers["gas_price"] else None
+                    except ValueError as e:
+                        print(f"{Fore.RED}\nInvalid input: {e}{Style.RESET_ALL}\n")
+                        input("Press Enter to continue...")
+                        continue
+                    fees = fee_oracle.fees() if gas_price is None else None
 
+                    keys = {}
                     for acc in selected_accounts:
-
-                        #________________SEND TRANSACTION__________________________
                         key = km.get_decrypted_key(acc)
                         # add 0x to private key
                         if "0x" not in key:
                             key = "0x" + key
-                        address = w3.eth.account.from_key(key).address
-                        w3.eth.default_account = address
-                        to_address = answers["to_address"]
-
-                        try:
-                            amount = answers["amount"]
-                            gas_limit = answers["gas_limit"]
-                            gas_price = answers["gas_price"]
-                        except ValueError as e:
-                            print(f"{Fore.RED}\nInvalid input: {e}{Style.RESET_ALL}\n")
+                        keys[acc] = key
+                    addresses = address_map(keys)
+                    nonces = batch_call(w3, [(w3.eth.get_transaction_count, (address, "pending")) for address in addresses.values()])
+
+                    #________________PRE-FLIGHT__________________________
+                    txs = {}
+                    for (acc, key), nonce in zip(keys.items(), nonces):
+                        if isinstance(nonce, Exception):
+                            print(f"{Fore.RED}{acc}: cannot get nonce: {nonce}{Style.RESET_ALL}")
                             continue
-                        # Converting to correct format (wei)
-                        amount = w3.to_wei(float(amount), 'ether')
-                        gas_limit = int(gas_limit)  
-                        gas_price = int(gas_price)
-
-
-                        print(f"{Fore.GREEN}\nTransferring from: {acc} to: {answers['to_address']}{Style.RESET_ALL}\n")
-                        chain_id = w3.eth.chain_id
-                        tx = SendTransaction(w3, chain_id, key, address, to_address, amount, gas_limit, gas_price)
+                        tx = SendTransaction(w3, chain_id, key, addresses[acc], to_address, amount, gas_limit, gas_price, fees, nonce=nonce)
                         tx.build()
-
+                        txs[acc] = tx
+                    results = preflight(w3, [{"from": tx.from_address, **tx.tx} for tx in txs.values()])
+                    for acc, row in zip(list(txs), results):
+                        if row["status"] != "ok":
+                            print(f"{Fore.RED}{acc}: {row['status']}: {row['reason']}{Style.RESET_ALL}")
+                            del txs[acc]
+                    print(f"\nPre-flight: {preflight_summary(results)}")
+
+                    sent = {}
+                    for acc, tx in txs.items():
+                        #________________SEND TRANSACTION__________________________
+                        print(f"{Fore.GREEN}\nTransferring from: {acc} to: {to_address}{Style.RESET_ALL}\n")
                         try:
-                            tx.sign()
                             result = tx.send()
+                            sent[acc] = result
                             print(f"{Fore.GREEN}\nTransaction sent successfully: {result.hex()}{Style.RESET_ALL}\n")
                         except Exception as e:
                             print(f"{Fore.RED}\nError sending transaction: {e}{Style.RESET_ALL}\n")
                             continue
                         # __________________________________________________________________
 
+                    #________________CONFIRMATIONS__________________________
+                    if sent and inquirer.confirm("Wait for confirmations?", default=False):
+                        # Receipts and balances are checked once per new block, in batches
+                        symbol = chains.get_symbol_by_id(str(chain_id))
+                        names = {address: acc for acc, address in addresses.items()}
+                        scheduler = HeadScheduler(
+                            w3, ws_endpoint(config), store=snapshots,
+                            on_balance=lambda address, balance, block: print(
+                                f"{names.get(address, address)}: {balance / 10**18} {symbol} at block {block}"
+                            ),
+                        )
+                        for acc, tx_hash in sent.items():
+                            # The sender and recipient balances are read again at the mining block
+                            scheduler.watch_receipt(
+                                tx_hash,
+                                lambda tx_hash, receipt, acc=acc: print(
+                                    f"{acc}: {tx_hash} mined in block {receipt['blockNumber']}, "
+                                    f"status {'success' if receipt['status'] == 1 else 'failed'}"
+                                ),
+                            )
+                        if not scheduler.run(timeout=300):
+                            print(f"{Fore.RED}\nSome transactions are still pending.{Style.RESET_ALL}\n")
+                    input("Press Enter to continue...")
+                    continue
+
+            case "Sweep accounts [NATIVE TOKEN]":
+                os.system('cls' if os.name == 'nt' else 'clear')
+                accounts = km.load_keys()
+                if not accounts:
+                    print(f"{Fore.RED}\nNo accounts found.{Style.RESET_ALL}\n")
+                    input("Press Enter to continue...")
+                    continue
+                if w3 is None:
+                    print(f"{Fore.RED}\nPlease connect to the endpoint first.{Style.RESET_ALL}\n")
+                    input("Press Enter to continue...")
+                    continue
+
+                selected_accounts = select_accounts(km, "Select account(s) to sweep", all_label="Sweep all accounts", addresses=account_addresses)
+                questions = [
+                    inquirer.Text("to_address", message="Enter the destination address"),
+                    inquirer.Text("gas_limit", message="Enter the gas limit", default=str(DEFAULT_GAS_LIMIT)),
+                    inquirer.Text("dust", message="Skip amounts below (in ether or native token)", default="0"),
+                ]
+                answers = inquirer.prompt(questions)
+                if not w3.is_address(answers["to_address"]):
+                    print(f"{Fore.RED}\nInvalid destination address.{Style.RESET_ALL}\n")
+                    input("Press Enter to continue...")
+                    continue
+
+                private_keys = {}
+                for acc in selected_accounts:
+                    key = km.get_decrypted_key(acc)
+                    if key is not None:
+                        private_keys[acc] = key
+                try:
+                    summary = sweep(
+                        w3,
+                        private_keys,
+                        w3.to_checksum_address(answers["to_address"]),
+                        fee_oracle.fees(),
+                        gas_limit=int(answers["gas_limit"]),
+                        dust=w3.to_wei(float(answers["dust"]), 'ether'),
+                    )
+                except Exception as e:
+                    print(f"{Fore.RED}\nError sweeping accounts: {e}{Style.RESET_ALL}\n")
+                    input("Press Enter to continue...")
+                    continue
+
+                total = 0
+                for row in summary:
+                    if row["status"] == "sent":
+                        total += row["value"]
+                        print(f"{Fore.GREEN}{row['account']}: {row['value'] / 10**18} -> {row['hash']}{Style.RESET_ALL}")
+                    elif row["status"] == "failed":
+                        print(f"{Fore.RED}{row['account']}: {row['error']}{Style.RESET_ALL}")
+                sent = sum(1 for row in summary if row["status"] == "sent")
+                skipped = sum(1 for row in summary if row["status"] == "skipped")
+                print(f"\nSwept {total / 10**18} from {sent} account(s), skipped {skipped} dust account(s).\n")
+
+                if sent and inquirer.confirm("Wait for the transfers and check the accounts are empty?", default=True):
+                    for row in check_empty(w3, summary):
+                        if "error" in row:
+                            print(f"{Fore.RED}{row['account']}: {row['error']}{Style.RESET_ALL}")
+                        elif row["left"]:
+                            print(f"{Fore.YELLOW}{row['account']}: {row['left'] / 10**18} left{Style.RESET_ALL}")
+                    print(f"\n{sum(1 for row in summary if row.get('left') == 0)} of {sent} account(s) empty.\n")
+                input("Press Enter to continue...")
+                continue
+
+            case "Replace stuck transactions":
+                os.system('cls' if os.name == 'nt' else 'clear')
+                accounts = km.load_keys()
+                if not accounts:
+                    print(f"{Fore.RED}\nNo accounts found.{Style.RESET_ALL}\n")
+                    input("Press Enter to continue...")
+                    continue
+                if w3 is None:
+                    print(f"{Fore.RED}\nPlease connect to the endpoint first.{Style.RESET_ALL}\n")
+                    input("Press Enter to continue...")
+                    continue
+
+                selected_accounts = select_accounts(km, "Select account(s) to check", all_label="All accounts", addresses=account_addresses)
+                questions = [
+                    inquirer.List(
+                        "mode",
+                        message="Replace stuck transactions with",
+                        choices=["Same transaction, higher fee (speed up)", "0-value self-send (cancel)"],
+                    ),
+                    inquirer.Text("bump", message="Minimum fee increase in %", default=str(round((DEFAULT_BUMP - 1) * 100, 1))),
+                    inquirer.Text("wait", message="Seconds to wait for them to be mined (0 to skip)", default="120"),
+                ]
+                answers = inquirer.prompt(questions)
+                try:
+                    bump = 1 + float(answers["bump"]) / 100
+                    wait = float(answers["wait"] or 0)
+                except ValueError as e:
+                    print(f"{Fore.RED}\nInvalid input: {e}{Style.RESET_ALL}\n")
+                    input("Press Enter to continue...")
+                    continue
+
+                private_keys = {acc: km.get_decrypted_key(acc) for acc in selected_accounts}
+                mode = SPEED_UP if answers["mode"].endswith("(speed up)") else CANCEL
+                rows = replace_stuck(w3, {acc: key for acc, key in private_keys.items() if key}, fee_oracle.fees(), mode, bump)
+                if not rows:
+                    print("No stuck transactions found.\n")
+                    input("Press Enter to continue...")
+                    continue
+                for row in rows:
+                    if row.get("status") == "replaced":
+                        print(f"{Fore.GREEN}{row['account']} nonce {row['nonce']}: {row['action']} sent {row['hash']}{Style.RESET_ALL}")
+                    else:
+                        print(f"{Fore.RED}{row['account']} nonce {row.get('nonce', '-')}: {row.get('error')}{Style.RESET_ALL}")
+                if wait > 0:
+                    print(f"\nWaiting up to {wait:.0f}s for the nonces to be mined...")
+                    for row in track(w3, rows, timeout=wait):
+                        if row.get("status") == "mined":
+                            version = "replacement" if row["replacement"] else "original"
+                            print(f"{row['account']} nonce {row['nonce']}: {version} mined {row['mined'] or ''}")
+                        elif row.get("status") == "pending":
+                            print(f"{Fore.YELLOW}{row['account']} nonce {row['nonce']}: still pending{Style.RESET_ALL}")
+                print("\n")
+                input("Press Enter to continue...")
+                continue
+
             case "Contract call(s) [ERC20 TOKEN]":
                 os.system('cls' if os.name == 'nt' else 'clear')
                 accounts = km.load_keys()
@@ -443,12 +826,8 @@ def menu():
                     available_contracts = load_contracts(chain_id)
 
 
+                    selected_accounts = select_accounts(km, "Select [FROM] account(s) to execute contract call", addresses=account_addresses)
                     primary_question = [
-                        inquirer.Checkbox( 
-                            "accounts",
-                            message="Select [FROM] account(s) to execute contract call",
-                            choices=accounts,
-                        ),
                         inquirer.List(
                             "contract",
                             message="Select a contract",
@@ -462,8 +841,12 @@ def menu():
                     selected_contract = primary_answers["contract"].split(".")[0]
                     abi = get_abi(selected_contract, chain_id)
                     current_contract = w3.eth.contract(address=selected_contract, abi=abi.abi)
-                    decimals = current_contract.functions.decimals().call()
-                    print(f"Decimals: {decimals}")
+                    try:
+                        decimals = current_contract.functions.decimals().call()
+                        print(f"Decimals: {decimals}")
+                    except Exception:
+                        # Not a token, amounts are taken as they are
+                        decimals = None
 
                     questions = [
                         inquirer.List(
@@ -474,43 +857,62 @@ def menu():
                     ]
 
                     answers = inquirer.prompt(questions)
-                    if answers["function"] == "transfer":
-                        transfer_question = [
-                            inquirer.Text(
-                                "to_address",
-                                message="Enter the recipient's address",
-                                default = "0x0000000000000000000000000000000000000000",
-                            ),
-                            inquirer.Text(
-                                "amount",
-                                message="Enter the amount to transfer",
-                            )
-                        ]
-
-                        transfer_answers = inquirer.prompt(transfer_question)
+                    try:
+                        invoker = FunctionInvoker.from_abi(abi, answers["function"])
+                    except ValueError as e:
+                        print(f"{Fore.RED}\n{e}{Style.RESET_ALL}\n")
+                        input("Press Enter to continue...")
+                        continue
 
-                        amount = transfer_answers["amount"]
-                        to_address = transfer_answers["to_address"]
+                    argument_questions = []
+                    for i, arg in enumerate(invoker.function.inputs):
+                        message = f"Enter {arg.name or f'argument {i + 1}'} ({arg.type})"
+                        if arg.type == "address":
+                            message += f", '{SELF}' for each account's address"
+                        elif decimals is not None and is_amount(arg.name, arg.type):
+                            message += " in tokens"
+                        argument_questions.append(inquirer.Text(f"arg_{i}", message=message))
+                    argument_answers = inquirer.prompt(argument_questions) if argument_questions else {}
+                    values = [argument_answers[f"arg_{i}"] for i in range(len(invoker.function.inputs))]
+
+                    rows = []
+                    try:
+                        keys = {}
+                        for acc in selected_accounts:
+                            key = km.get_decrypted_key(acc)
+                            if "0x" not in key:
+                                key = "0x" + key
+                            keys[acc] = key
+                        for (acc, key), address in zip(keys.items(), address_map(keys).values()):
+                            rows.append((acc, key, address, invoker.parse_args(values, decimals, address)))
+                    except Exception as e:
+                        print(f"{Fore.RED}\nInvalid argument: {e}{Style.RESET_ALL}\n")
+                        input("Press Enter to continue...")
+                        continue
 
-                        amount = w3.to_wei(float(amount), 'ether')
+                    if invoker.read_only:
+                        # Reads of every account go out as batched eth_call
+                        results = invoker.call(w3, [(address, args) for _, _, address, args in rows])
+                        for (acc, _, _, _), row in zip(rows, results):
+                            if "error" in row:
+                                print(f"{Fore.RED}{acc}: {row['error']}{Style.RESET_ALL}")
+                            else:
+                                print(f"{acc}: {row['result']}")
+                        print("\n")
+                        input("Press Enter to continue...")
+                        continue
 
-                    for acc in primary_answers["accounts"]:
-                        key = km.get_decrypted_key(acc)
-                        if "0x" not in key:
-                            key = "0x" + key
-                        address = w3.eth.account.from_key(key).address
-                        w3.eth.default_account = address
-                        nonce = w3.eth.get_transaction_count(address)
-                        tx = current_contract.functions.transfer(to_address, amount).build_transaction({
-                            'from': address,
-                            'nonce': nonce,
-                            'gasPrice': w3.eth.gas_price,
-                            'chainId': chain_id
-                        })
-                        tx['gas'] = w3.eth.estimate_gas(tx)
-                        signed_tx = w3.eth.account.sign_transaction(tx, key)
-                        tx_hash = w3.eth.send_raw_transaction(signed_tx.rawTransaction)
-                        print(f"{Fore.GREEN}\nTransaction sent successfully: {tx_hash.hex()}{Style.RESET_ALL}\n")
+                    # Every call is simulated before signing, reverts are decoded with the contract ABI
+                    results = []
+                    for row in invoker.send(w3, [(acc, key, args) for acc, key, _, args in rows], fee_oracle.fees()):
+                        if "hash" in row:
+                            print(f"{Fore.GREEN}\nTransaction sent successfully: {row['hash']}{Style.RESET_ALL}\n")
+                        elif "status" in row:
+                            print(f"{Fore.RED}{row['account']}: {row['status']}: {row['error']}{Style.RESET_ALL}")
+                        else:
+                            print(f"{Fore.RED}\nError sending transaction: {row['error']}{Style.RESET_ALL}\n")
+                        results.append({"status": row.get("status", "ok")})
+                    print(f"\nPre-flight: {preflight_summary(results)}")
 
 
 
@@ -520,6 +922,164 @@ def menu():
                 input("Press Enter to continue...")
                 continue
 
+            case "Distribute [MULTISEND]":
+                os.system('cls' if os.name == 'nt' else 'clear')
+                accounts = km.load_keys()
+                if not accounts:
+                    print(f"{Fore.RED}\nNo accounts found.{Style.RESET_ALL}\n")
+                    input("Press Enter to continue...")
+                    continue
+                if w3 is None:
+                    print(f"{Fore.RED}\nPlease connect to the endpoint first.{Style.RESET_ALL}\n")
+                    input("Press Enter to continue...")
+                    continue
+
+                chain_id = w3.eth.chain_id
+                account = select_accounts(km, "Select [FROM] account", multiple=False)[0]
+                questions = [
+                    inquirer.List(
+                        "asset",
+                        message="Select asset to distribute",
+                        choices=["Native token"] + [contract.split(".")[0] for contract in load_contracts(chain_id)],
+                    ),
+                    inquirer.Text("path", message="Enter the path to the recipients file (address amount per line)"),
+                    inquirer.Text("contract", message="Enter the disperse contract address", default=DISPERSE_ADDRESS),
+                ]
+                answers = inquirer.prompt(questions)
+                token = None if answers["asset"] == "Native token" else answers["asset"]
+                try:
+                    distributor = Distributor(w3, km.get_decrypted_key(account), fee_oracle.fees(), answers["contract"], token)
+                    decimals = distributor.token.functions.decimals().call() if token else 18
+                    recipients = load_recipients(answers["path"], decimals)
+                except Exception as e:
+                    print(f"{Fore.RED}\nCannot prepare the distribution: {e}{Style.RESET_ALL}\n")
+                    input("Press Enter to continue...")
+                    continue
+
+                total = sum(value for _, value in recipients)
+                print(f"{len(recipients)} recipient(s), total {total / 10 ** decimals}.")
+                if not inquirer.prompt([inquirer.Confirm("confirm", message="Send?", default=False)])["confirm"]:
+                    continue
+
+                def on_chunk(row):
+                    if row["chunk"] == 1:
+                        # Chunks are sized after the approval, a token disperse cannot be estimated without allowance
+                        print(f"{row['chunks']} call(s) of up to {row['recipients']} recipient(s).")
+                    color = Fore.GREEN if row["status"] in ("mined", "sent") else Fore.RED
+                    details = row.get("hash") or row.get("error") or ""
+                    print(f"{color}[{row['chunk']}/{row['chunks']}] {row['status']:8} {row['recipients']} recipient(s)  {details}{Style.RESET_ALL}")
+
+                try:
+                    if token:
+                        print("Checking the allowance of the disperse contract...")
+                    distributor.distribute(recipients, on_chunk=on_chunk)
+                except Exception as e:
+                    print(f"{Fore.RED}\nError distributing: {e}{Style.RESET_ALL}\n")
+                print("\n")
+                input("Press Enter to continue...")
+                continue
+
+            case "Offline signing [BUNDLE]":
+                os.system('cls' if os.name == 'nt' else 'clear')
+                questions = [
+                    inquirer.Text("plan_path", message="Enter the path to the signing plan (JSON)"),
+                    inquirer.Text("bundle_path", message="Enter the path to write the bundle to", default="bundle.jsonl"),
+                ]
+                answers = inquirer.prompt(questions)
+                try:
+                    plan = load_plan(answers["plan_path"])
+                except (OSError, ValueError) as e:
+                    print(f"{Fore.RED}\nInvalid plan: {e}{Style.RESET_ALL}\n")
+                    input("Press Enter to continue...")
+                    continue
+
+                private_keys = {}
+                for name in {tx["from"] for tx in plan["txs"]}:
+                    key = km.get_decrypted_key(name)
+                    if key is not None:
+                        private_keys[name] = key
+                try:
+                    count = sign_bundle(plan, private_keys, answers["bundle_path"])
+                    print(f"{Fore.GREEN}\nSigned {count} transaction(s) to {answers['bundle_path']}{Style.RESET_ALL}\n")
+                except ValueError as e:
+                    print(f"{Fore.RED}\nError signing plan: {e}{Style.RESET_ALL}\n")
+                input("Press Enter to continue...")
+                continue
+
+            case "Broadcast bundle":
+                os.system('cls' if os.name == 'nt' else 'clear')
+                if w3 is None:
+                    print(f"{Fore.RED}\nPlease connect to the endpoint first.{Style.RESET_ALL}\n")
+                    input("Press Enter to continue...")
+                    continue
+                questions = [
+                    inquirer.Text("bundle_path", message="Enter the path to the bundle", default="bundle.jsonl"),
+                    inquirer.Text(
+                        "concurrency",
+                        message="Enter the number of parallel senders",
+                        default="8",
+                        validate=lambda _, x: x.isdigit() and int(x) > 0,
+                    ),
+                ]
+                answers = inquirer.prompt(questions)
+
+                def show_result(record):
+                    if "error" in record:
+                        print(f"{Fore.RED}{record['from']} #{record['nonce']}: {record['error']}{Style.RESET_ALL}")
+                    else:
+                        print(f"{Fore.GREEN}{record['from']} #{record['nonce']}: {record['hash']}{Style.RESET_ALL}")
+
+                try:
+                    summary = broadcast_bundle(w3, answers["bundle_path"], int(answers["concurrency"]), show_result)
+                    print(f"\nSent: {summary['sent']}, failed: {summary['failed']}\n")
+                except (OSError, ValueError) as e:
+                    print(f"{Fore.RED}\nError broadcasting bundle: {e}{Style.RESET_ALL}\n")
+                input("Press Enter to continue...")
+                continue
+
+            case "Rotate encryption token":
+                os.system('cls' if os.name == 'nt' else 'clear')
+                print(f"All {len(km.keys)} key(s) will be re-encrypted with a new token stored in .env.")
+                if not inquirer.prompt([inquirer.Confirm("confirm", message="Rotate the encryption token?", default=False)])["confirm"]:
+                    continue
+                old_token, new_token = config["ENCRYPTION_TOKEN"], new_encrypt_token().decode()
+                try:
+                    summary = rotate_token(config["KEYS_PATH"], ".env", old_token, new_token, [config.get("ENCRYPTION_TOKEN_PREVIOUS")])
+                except ValueError as e:
+                    print(f"{Fore.RED}\nRotation failed, nothing was changed: {e}{Style.RESET_ALL}\n")
+                    input("Press Enter to continue...")
+                    continue
+                config["ENCRYPTION_TOKEN"], config["ENCRYPTION_TOKEN_PREVIOUS"] = new_token, old_token
+                km.set_encryption_key(new_token, [old_token])
+                km.keys = km.load_keys()
+                km.seeds = km.load_seeds()
+                print(f"{Fore.GREEN}\nRotated {summary['keys']} key(s) and {summary['seeds']} seed(s).{Style.RESET_ALL}\n")
+                input("Press Enter to continue...")
+                continue
+
+            case "Export performance report":
+                os.system('cls' if os.name == 'nt' else 'clear')
+                questions = [
+                    inquirer.Text(
+                        "report_path",
+                        message="Enter the report path (.json, or .prom for Prometheus text)",
+                        default="metrics.json",
+                    ),
+                ]
+                answers = inquirer.prompt(questions)
+                report = metrics.report()
+                for method, stats in sorted(report["rpc"].items(), key=lambda item: -item[1]["count"]):
+                    print(f"{method}: {stats['count']} call(s), p50 {stats['p50'] * 1000:.1f}ms, p99 {stats['p99'] * 1000:.1f}ms")
+                for category, section in report["sections"].items():
+                    print(f"{category}: {section['seconds']:.3f}s in {section['count']} section(s)")
+                if w3 is not None:
+                    cache_stats = w3.rpc_cache.stats()
+                    print(f"RPC cache: {cache_stats['hits']} hit(s), {cache_stats['misses']} miss(es)")
+                metrics.export(answers["report_path"])
+                print(f"\nReport saved to {answers['report_path']}\n")
+                input("Press Enter to continue...")
+                continue
+
             case "Exit":
                 print("Exiting the program...")
                 exit(0)
@@ -530,4 +1090,7 @@ def menu():
 
 
 if __name__ == "__main__":
+    if HEADLESS:
+        from utils import cli
+        sys.exit(cli.main(sys.argv[1:], km, chains, config, out=results_stream))
     menu()
@@ -0,0 +1,50 @@
+import pytest
+from web3 import Web3
+from web3.exceptions import TransactionNotFound
+
+from benchmarks.stub_node import StubNode
+from utils.batch import batch_call
+from utils.heads import HeadScheduler
+
+
+@pytest.fixture
+def node():
+    with StubNode() as node:
+        yield node
+
+
+def test_pending_receipts_stay_in_one_batch(node):
+    w3 = Web3(Web3.HTTPProvider(node.url))
+    hashes = ["0x" + f"{i + 1:064x}" for i in range(5)]
+    address = Web3.to_checksum_address("0x" + "11" * 20)
+    requests = node.requests
+    results = batch_call(w3, [(w3.eth.get_transaction_receipt, (tx_hash,)) for tx_hash in hashes] + [(w3.eth.get_balance, (address,))])
+    assert node.requests - requests == 1
+    assert all(isinstance(result, TransactionNotFound) for result in results[:5])
+    assert results[5] == 10 ** 20
+
+
+def test_failed_calls_keep_their_place(node):
+    node.revert = lambda tx: tx["data"].startswith("0xdeadbeef")
+    w3 = Web3(Web3.HTTPProvider(node.url))
+    to = Web3.to_checksum_address("0x" + "22" * 20)
+    calls = [(w3.eth.call, ({"to": to, "data": data},)) for data in ("0x313ce567", "0xdeadbeef", "0x313ce567")]
+    requests = node.requests
+    results = batch_call(w3, calls)
+    # web3 reads the chain ID on its own while building eth_call requests
+    assert node.requests - requests - node.calls["eth_chainId"] == 1
+    assert node.calls["eth_call"] == 3
+    assert isinstance(results[1], Exception)
+    assert int.from_bytes(results[0], "big") == int.from_bytes(results[2], "big") == 18
+
+
+def test_head_polls_pending_receipts_in_one_request(node):
+    w3 = Web3(Web3.HTTPProvider(node.url))
+    scheduler = HeadScheduler(w3)
+    for i in range(5):
+        scheduler.watch_receipt("0x" + f"{i + 1:064x}")
+    scheduler.watch_balance("0x" + "11" * 20)
+    requests = node.requests
+    scheduler.on_head(node.block_number())
+    assert node.requests - requests == 2
+    assert len(scheduler.receipts) == 5
@@ -0,0 +1,53 @@
+import os
+
+import pytest
+from eth_account import Account
+
+from utils.crypto import BACKENDS, BACKEND_ENV, N, address_map, derive_addresses, get_backend, to_address
+
+# Scalars at the ends of the curve order and with zero windows in between
+EDGE_SCALARS = [1, 2, 3, 255, 256, 2 ** 128, 2 ** 248, 2 ** 255, N // 2, N - 2, N - 1]
+
+
+def key_of(scalar: int) -> str:
+    return "0x" + scalar.to_bytes(32, "big").hex()
+
+
+@pytest.fixture(scope="module")
+def random_keys():
+    return ["0x" + os.urandom(32).hex() for _ in range(200)]
+
+
+@pytest.mark.parametrize("backend", list(BACKENDS))
+def test_to_address_matches_eth_account(backend, random_keys):
+    for key in random_keys[:20] + [key_of(scalar) for scalar in EDGE_SCALARS]:
+        assert to_address(key, backend) == Account.from_key(key).address
+
+
+@pytest.mark.parametrize("backend", list(BACKENDS))
+def test_address_map_matches_eth_account(backend, random_keys):
+    keys = {f"account_{i}": key for i, key in enumerate(random_keys + [key_of(scalar) for scalar in EDGE_SCALARS])}
+    assert address_map(keys, backend) == {name: Account.from_key(key).address for name, key in keys.items()}
+
+
+@pytest.mark.parametrize("backend", list(BACKENDS))
+def test_key_formats(backend):
+    key = key_of(N - 1)
+    address = Account.from_key(key).address
+    assert to_address(key[2:], backend) == address
+    assert to_address(bytes.fromhex(key[2:]), backend) == address
+    assert derive_addresses([key], backend, checksum=False) == [address.lower()]
+
+
+@pytest.mark.parametrize("scalar", [0, N, 2 ** 256 - 1])
+def test_invalid_keys(scalar):
+    with pytest.raises(ValueError):
+        to_address(key_of(scalar))
+
+
+def test_backend_selection(monkeypatch):
+    assert get_backend()[0] == next(iter(BACKENDS))
+    monkeypatch.setenv(BACKEND_ENV, "python")
+    assert get_backend()[0] == "python"
+    with pytest.raises(ValueError):
+        get_backend("missing")
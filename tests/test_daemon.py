@@ -0,0 +1,62 @@
+import threading
+import time
+import types
+
+import pytest
+
+from utils import cli
+from utils.account import KeyManager, new_encrypt_token
+from utils.crypto import new_private_key
+from utils.daemon import Daemon
+
+
+@pytest.fixture
+def daemon(tmp_path):
+    old_token, token = new_encrypt_token().decode(), new_encrypt_token().decode()
+    keys_path = str(tmp_path / "keys.json")
+    km = KeyManager(keys_path, token)
+    km.add_keys({"account_1": "0x" + new_private_key()})
+    config = {"ENCRYPTION_TOKEN": token, "ENCRYPTION_TOKEN_PREVIOUS": old_token, "KEYS_PATH": keys_path}
+    ctx = types.SimpleNamespace(km=km, config=config)
+    return Daemon(ctx, keys_path, idle_timeout=0), token, old_token
+
+
+def test_lock_drops_the_tokens(daemon):
+    daemon, _, _ = daemon
+    daemon.handle({"method": "lock"})
+    assert daemon.locked
+    assert "ENCRYPTION_TOKEN" not in daemon.ctx.config
+    assert "ENCRYPTION_TOKEN_PREVIOUS" not in daemon.ctx.config
+
+
+def test_unlock_takes_the_current_token_only(daemon):
+    daemon, token, _ = daemon
+    daemon.ctx.km = None
+    # The previous token alone must not let any other token in
+    daemon.ctx.config["ENCRYPTION_TOKEN_PREVIOUS"] = token
+    with pytest.raises(ValueError, match="Invalid encryption token"):
+        daemon.handle({"method": "unlock", "params": {"token": new_encrypt_token().decode()}})
+    assert daemon.locked
+    daemon.handle({"method": "unlock", "params": {"token": token}})
+    assert not daemon.locked
+    assert daemon.ctx.config["ENCRYPTION_TOKEN"] == token
+
+
+def test_commands_run_one_at_a_time(daemon, monkeypatch):
+    daemon, _, _ = daemon
+    running, overlaps = [], []
+
+    def slow(ctx, params):
+        running.append(1)
+        overlaps.append(len(running))
+        time.sleep(0.05)
+        running.pop()
+        yield {"done": True}
+
+    monkeypatch.setitem(cli.COMMANDS, "slow", slow)
+    threads = [threading.Thread(target=daemon.handle, args=({"method": "slow"},)) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert overlaps == [1] * 4
@@ -0,0 +1,52 @@
+import pytest
+from web3 import Web3
+
+from benchmarks.stub_node import StubNode
+from utils.crypto import new_private_key
+from utils.distribute import DISPERSE_ADDRESS, Distributor
+
+TOKEN = "0x4200000000000000000000000000000000000006"
+FEES = {"maxFeePerGas": 2 * 10 ** 9, "maxPriorityFeePerGas": 10 ** 8}
+
+
+def recipients(count):
+    return [(Web3.to_checksum_address(f"0x{i + 1:040x}"), (i + 1) * 10 ** 18) for i in range(count)]
+
+
+@pytest.fixture
+def node():
+    with StubNode() as node:
+        yield node
+
+
+def test_native(node):
+    w3 = Web3(Web3.HTTPProvider(node.url))
+    rows = Distributor(w3, "0x" + new_private_key(), FEES).distribute(recipients(5), batch_size=2)
+    assert [row["status"] for row in rows] == ["mined"] * 3
+    assert [row["recipients"] for row in rows] == [2, 2, 1]
+    assert sum(row["value"] for row in rows) == sum(value for _, value in recipients(5))
+
+
+def test_token_approves_before_sizing(node):
+    w3 = Web3(Web3.HTTPProvider(node.url))
+    distributor = Distributor(w3, "0x" + new_private_key(), FEES, token=TOKEN)
+    # Without allowance disperseToken reverts, so it cannot be sized before approve()
+    with pytest.raises(Exception):
+        distributor.fit_batch_size(recipients(5))
+    rows = distributor.distribute(recipients(5))
+    assert [row["status"] for row in rows] == ["mined"]
+    owner = distributor.account.address.lower()
+    assert node.allowances[(owner, TOKEN.lower(), DISPERSE_ADDRESS.lower())] == sum(value for _, value in recipients(5))
+    # Enough allowance left over, no second approve
+    nonce = distributor.nonce
+    distributor.distribute(recipients(1))
+    assert distributor.nonce == nonce + 1
+
+
+def test_reverting_chunk_skips_the_rest(node):
+    target = recipients(5)[2][0][2:].lower()
+    node.revert = lambda tx: target in tx["data"]
+    w3 = Web3(Web3.HTTPProvider(node.url))
+    rows = Distributor(w3, "0x" + new_private_key(), FEES).distribute(recipients(5), batch_size=1)
+    assert [row["status"] for row in rows] == ["mined", "mined", "failed", "skipped", "skipped"]
+    assert "reverted" in rows[2]["error"]
@@ -0,0 +1,51 @@
+import pytest
+from web3 import Web3
+
+from benchmarks.stub_node import CHAIN_ID, StubNode
+from utils import offline
+from utils.crypto import new_private_key
+from utils.offline import broadcast_bundle, sign_bundle
+
+
+def plan(count, senders):
+    return {
+        "chainId": CHAIN_ID,
+        "fees": {"gasPrice": 10 ** 9},
+        "nonces": {name: 0 for name in senders},
+        "txs": [{"from": senders[i % len(senders)], "to": "0x" + "33" * 20, "value": i} for i in range(count)],
+    }
+
+
+@pytest.fixture
+def node():
+    with StubNode() as node:
+        yield node
+
+
+def test_sign_bundle_derives_addresses_once(tmp_path, monkeypatch):
+    keys = {f"account{i}": "0x" + new_private_key() for i in range(3)}
+    keys["unused"] = "0x" + new_private_key()
+    derived = []
+    address_map = offline.address_map
+    monkeypatch.setattr(offline, "address_map", lambda private_keys: derived.append(len(private_keys)) or address_map(private_keys))
+    path = tmp_path / "bundle.jsonl"
+    assert sign_bundle(plan(10, ["account0", "account1", "account2"]), keys, str(path), workers=1, chunk_size=2) == 10
+    assert derived == [3]
+
+
+def test_failing_callback_does_not_block_broadcast(node, tmp_path):
+    keys = {"account0": "0x" + new_private_key()}
+    path = tmp_path / "bundle.jsonl"
+    # More records than a lane queue holds
+    sign_bundle(plan(300, ["account0"]), keys, str(path), workers=1)
+    w3 = Web3(Web3.HTTPProvider(node.url))
+    seen = []
+
+    def on_result(record):
+        seen.append(record)
+        raise RuntimeError("callback failed")
+
+    with pytest.raises(RuntimeError, match="callback failed"):
+        broadcast_bundle(w3, str(path), concurrency=2, on_result=on_result)
+    assert len(seen) == 300
+    assert node.calls["eth_sendRawTransaction"] == 300
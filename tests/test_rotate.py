@@ -0,0 +1,34 @@
+import json
+
+import pytest
+from cryptography.fernet import Fernet, MultiFernet
+
+from utils.rotate import _verify, rotate
+
+
+def test_verify_checks_every_entry():
+    old_token, new_token = Fernet.generate_key(), Fernet.generate_key()
+    old_cipher, cipher = Fernet(old_token), MultiFernet([Fernet(new_token), Fernet(old_token)])
+    old = {f"account_{i}": old_cipher.encrypt(f"key{i}".encode()).decode() for i in range(3000)}
+    new = {name: cipher.rotate(value.encode()).decode() for name, value in old.items()}
+    _verify(old, new, [new_token, old_token], 1, 500)
+    new["account_2999"] = Fernet(new_token).encrypt(b"other").decode()
+    with pytest.raises(ValueError, match="account_2999"):
+        _verify(old, new, [new_token, old_token], 1, 500)
+    # Still under the old token only
+    new["account_2999"] = old["account_2999"]
+    with pytest.raises(ValueError, match="account_2999"):
+        _verify(old, new, [new_token, old_token], 1, 500)
+
+
+def test_rotate(tmp_path):
+    old_token = Fernet.generate_key().decode()
+    keys = {f"account_{i}": Fernet(old_token).encrypt(f"key{i}".encode()).decode() for i in range(20)}
+    keys_path, env_path = tmp_path / "keys.json", tmp_path / ".env"
+    keys_path.write_text(json.dumps(keys))
+    env_path.write_text("")
+    summary = rotate(str(keys_path), str(env_path), old_token, workers=2, chunk_size=5)
+    assert summary == {"keys": 20, "seeds": 0}
+    new_token = [line for line in env_path.read_text().splitlines() if line.startswith("ENCRYPTION_TOKEN=")][0].split("=", 1)[1].strip("'\"")
+    rotated = json.loads(keys_path.read_text())
+    assert {name: Fernet(new_token).decrypt(value.encode()) for name, value in rotated.items()} == {f"account_{i}": f"key{i}".encode() for i in range(20)}
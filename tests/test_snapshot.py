@@ -0,0 +1,46 @@
+import pytest
+from web3 import Web3
+
+from benchmarks.stub_node import CHAIN_ID, DEFAULT_BALANCE, StubNode
+from utils.portfolio import scan
+from utils.snapshot import SnapshotStore
+
+
+ADDRESSES = [Web3.to_checksum_address(f"0x{i + 1:040x}") for i in range(3)]
+
+
+@pytest.fixture
+def node():
+    with StubNode() as node:
+        yield node
+
+
+@pytest.fixture
+def store(tmp_path):
+    store = SnapshotStore(str(tmp_path / "snapshots.db"))
+    yield store
+    store.close()
+
+
+def test_refresh_reads_native_received_internally(node, store):
+    w3 = Web3(Web3.HTTPProvider(node.url))
+    store.refresh(w3, ADDRESSES)
+    # Paid by a contract call of someone else: no block shows it
+    node.balances[ADDRESSES[0].lower()] = 5
+    requests = node.requests
+    summary = store.refresh(w3, ADDRESSES)
+    assert summary["read"]["native"] == 3
+    assert summary["scanned"] == 0
+    assert store.load(CHAIN_ID)[ADDRESSES[0].lower()][0] == 5
+    # chainId and head, then one batch of balances
+    assert node.requests - requests - node.calls["eth_chainId"] <= 2
+
+
+def test_portfolio_writes_to_the_store(node, store, tmp_path):
+    network = {"name": "stub", "chainId": str(CHAIN_ID), "rpcUrl": node.url, "symbol": "ETH"}
+    rows, timings = scan([network], {f"account{i}": address for i, address in enumerate(ADDRESSES)}, data_path=str(tmp_path), store=store)
+    assert "error" not in timings[0]
+    stored = store.load(CHAIN_ID)
+    assert {address: balance for address, (balance, _) in stored.items()} == {address.lower(): DEFAULT_BALANCE for address in ADDRESSES}
+    # The snapshot block stays with refresh, which still reads every address once
+    assert store.last_block(CHAIN_ID) is None
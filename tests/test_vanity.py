@@ -0,0 +1,35 @@
+import os
+
+from eth_account import Account
+from eth_utils import to_checksum_address
+
+from utils import vanity
+from utils.vanity import VanityPattern, search
+
+
+def test_case_sensitive_checksums_only_lowercase_matches(monkeypatch):
+    pattern = VanityPattern("aB", "", "", case_sensitive=True)
+    addresses = [Account.create().address[2:].lower() for _ in range(500)]
+    checksummed = []
+    monkeypatch.setattr(vanity, "to_checksum_address", lambda address: checksummed.append(address) or to_checksum_address(address))
+    matches = [address for address in addresses if pattern.matches(address)]
+    assert len(checksummed) == sum(1 for address in addresses if address.startswith("ab"))
+    assert matches == [address for address in addresses if to_checksum_address(address)[2:].startswith("aB")]
+
+
+def test_case_sensitive_regex():
+    pattern = VanityPattern(regex="[A-F]{2}$", case_sensitive=True)
+    for _ in range(200):
+        address = os.urandom(20).hex()
+        assert pattern.matches(address) == (to_checksum_address(address)[-2:].isupper() and to_checksum_address(address)[-2:].isalpha())
+
+
+def test_interrupted_search_keeps_matches():
+    def stop(attempts, rate, eta):
+        raise KeyboardInterrupt
+
+    found = search(VanityPattern("0"), count=1000, workers=1, on_progress=stop)
+    assert 0 < len(found) < 1000
+    for private_key, address in found:
+        assert Account.from_key(private_key).address == address
+        assert address[2:].startswith("0")
@@ -5,7 +5,6 @@ from eth_account import Account
 import typing
 import json
 import os
-from mnemonic import Mnemonic
 
 class AccountManager(ABC):
     def __init__(self, storage_path="accounts.json", password="qwerty"):
@@ -85,9 +84,10 @@ class Web3AccountManager(AccountManager):
 
     def import_from_seed(self, seed_phrase):
         """Импорт аккаунта из сид-фразы."""
-        mnemo = Mnemonic("english")
-        private_key = mnemo.to_entropy(seed_phrase)
-        return self.import_account(private_key.hex())
+        # Entropy of the mnemonic is not a private key, derive m/44'/60'/0'/0/0 instead
+        self.web3.eth.account.enable_unaudited_hdwallet_features()
+        account = self.web3.eth.account.from_mnemonic(seed_phrase)
+        return self.import_account(account.key.hex())
 
     def export_account(self, address):
         """Экспорт приватного ключа аккаунта."""
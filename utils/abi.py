@@ -2,6 +2,13 @@ from pydantic import BaseModel, ValidationError
 from typing import List, Union, Optional
 import json
 
+from eth_abi import decode
+from eth_abi.exceptions import DecodingError
+from eth_utils import keccak
+
+from utils.init import DATA_PATH
+from utils.metrics import metrics
+
 
 class ABIFunctionInput(BaseModel):
     name: str
@@ -25,6 +32,37 @@ class ABIEvent(BaseModel):
     anonymous: bool
     type: str = "event"
 
+class ABIError(BaseModel):
+    name: str
+    inputs: List[ABIFunctionInput]
+    type: str = "error"
+
+    @property
+    def signature(self) -> str:
+        return f"{self.name}({','.join(arg.type for arg in self.inputs)})"
+
+    @property
+    def selector(self) -> str:
+        return "0x" + keccak(text=self.signature)[:4].hex()
+
+
+# Errors every Solidity contract can revert with
+BUILTIN_ERRORS = [
+    ABIError(name="Error", inputs=[ABIFunctionInput(name="reason", type="string")]),
+    ABIError(name="Panic", inputs=[ABIFunctionInput(name="code", type="uint256")]),
+]
+PANIC_CODES = {
+    0x01: "assertion failed",
+    0x11: "arithmetic overflow or underflow",
+    0x12: "division by zero",
+    0x21: "invalid enum value",
+    0x31: "pop on empty array",
+    0x32: "array index out of bounds",
+    0x41: "out of memory",
+    0x51: "call to uninitialized function",
+}
+
+
 class ABIDecoder:
     """
     A class for decoding ABI data.
@@ -43,6 +81,9 @@ class ABIDecoder:
         get_event(self, name: str) -> Union[ABIEvent, None]:
             Returns the ABIEvent object with the specified name, or None if not found.
 
+        decode_error(self, data: str) -> Union[str, None]:
+            Returns a readable revert reason from revert data, or None if unknown.
+
         list_functions(self) -> List[str]:
             Returns a list of function names.
 
@@ -60,6 +101,7 @@ class ABIDecoder:
         self.contract_address = contract_address
         self.functions = []
         self.events = []
+        self.errors = []
         self._parse_abi()
 
         if not self.contract_address.startswith("0x") or len(self.contract_address) != 42:
@@ -74,6 +116,9 @@ class ABIDecoder:
                 elif item["type"] == "event":
                     event = ABIEvent(**item)
                     self.events.append(event)
+                elif item["type"] == "error":
+                    error = ABIError(**item)
+                    self.errors.append(error)
                 else:
                     pass
             except ValidationError as e:
@@ -99,18 +144,41 @@ class ABIDecoder:
     def list_events(self) -> List[str]:
         return [event.name for event in self.events]
 
+    def decode_error(self, data: str) -> Union[str, None]:
+        """
+        Decode revert data with the errors of the ABI and the built-in Error/Panic.
+
+        :param data: Revert data as a hex string.
+        :return: "reason" for Error(string), "Panic: ..." or "Name(args)" for custom errors, None if unknown.
+        """
+        data = data if data.startswith("0x") else "0x" + data
+        for error in BUILTIN_ERRORS + self.errors:
+            if data[:10] != error.selector:
+                continue
+            try:
+                args = decode([arg.type for arg in error.inputs], bytes.fromhex(data[10:]))
+            except (DecodingError, ValueError):
+                return error.name
+            if error is BUILTIN_ERRORS[0]:
+                return args[0]
+            if error is BUILTIN_ERRORS[1]:
+                return f"Panic: {PANIC_CODES.get(args[0], hex(args[0]))}"
+            return f"{error.name}({', '.join(str(arg) for arg in args)})"
+        return None
+
     
-def get_abi(contract_address: str, chain_id: int) -> ABIDecoder:
+def get_abi(contract_address: str, chain_id: int, data_path: str = DATA_PATH) -> ABIDecoder:
     """
     Get the ABI of a contract by its address.
     Find JSON file in data/chain_id/contract_address.json
     param contract_address: str
     param chain_id: int
+    param data_path: str, root of the per-chain directories
     return: ABIDecoder class
     """
-    abi_path = f"data/{chain_id}/{contract_address}.json"
+    abi_path = f"{data_path}/{chain_id}/{contract_address}.json"
     try:
-        with open(abi_path, "r") as f:
+        with metrics.timer("disk"), open(abi_path, "r") as f:
             abi = json.load(f)
             return ABIDecoder(abi, contract_address)
     except FileNotFoundError:
@@ -1,16 +1,22 @@
 import os
 import json
 import typing
-from cryptography.fernet import Fernet, InvalidToken
+from cryptography.fernet import Fernet, MultiFernet, InvalidToken
 from eth_account import Account
 
+from utils.crypto import address_map, new_private_key, to_address
+from utils.filelock import lock, atomic_write
+from utils.hdwallet import HDWallet, DEFAULT_BASE_PATH, account_path
+from utils.keystore import MappedKeystore, is_mapped, write_keystore
+from utils.metrics import metrics
+
 
 def new_encrypt_token():
     return Fernet.generate_key()
 
 
 class KeyManager:
-    def __init__(self, file_path, encryption_key):
+    def __init__(self, file_path, encryption_key, previous_keys: typing.Sequence[str] = ()):
 
         Account.enable_unaudited_hdwallet_features()
 
@@ -18,42 +24,185 @@ class KeyManager:
             open(file_path, 'w').close()
 
         self.file_path = file_path
+        self.seeds_path = f"{os.path.splitext(file_path)[0]}.seeds.json"
 
         if encryption_key is None or len(encryption_key) == 0:
             print("Encryption key not provided")
 
-        self.cipher_suite = Fernet(encryption_key)
+        self.set_encryption_key(encryption_key, previous_keys)
         self.keys = self.load_keys()
+        self.seeds = self.load_seeds()
+        # Names added or deleted by this process since the last save, merged into the files on save
+        self._changed = {"keys": set(), "accounts": set()}
+        self._deleted = {"keys": set(), "accounts": set()}
+
 
+    def set_encryption_key(self, encryption_key, previous_keys: typing.Sequence[str] = ()):
+        # Keys of a rotation that did not finish are still readable with the previous token
+        previous_keys = [key for key in previous_keys if key]
+        if previous_keys:
+            self.cipher_suite = MultiFernet([Fernet(key) for key in [encryption_key, *previous_keys]])
+        else:
+            self.cipher_suite = Fernet(encryption_key)
 
-    def load_keys(self) -> typing.Dict[str, str]:
+    def load_keys(self) -> typing.MutableMapping[str, str]:
         if not os.path.exists(self.file_path):
             return {}
+        # Mapped keystores are opened, not parsed, whatever their size
+        if is_mapped(self.file_path):
+            with metrics.timer("disk"):
+                return MappedKeystore(self.file_path)
         try:
-            with open(self.file_path, 'r') as file:
+            with metrics.timer("disk"), open(self.file_path, 'r') as file:
                 data = json.load(file, object_pairs_hook=dict)
         except json.JSONDecodeError:
             return {}
         return data
 
+    def _merge(self, current: typing.Dict[str, typing.Any], mine: typing.Dict[str, typing.Any], kind: str):
+        for name in self._changed[kind]:
+            if name not in mine:
+                continue
+            if isinstance(current, MappedKeystore):
+                current.set(name, mine[name], mine.address(name) if isinstance(mine, MappedKeystore) else None)
+            else:
+                current[name] = mine[name]
+        for name in self._deleted[kind]:
+            current.pop(name, None)
+        self._changed[kind].clear()
+        self._deleted[kind].clear()
+        return current
+
     def save_keys(self):
-        data = {
-            name: value
-            for name, value in self.keys.items()
-        }
+        """
+        Merge the changes of this process into the keystore file.
+
+        The file is re-read under an exclusive lock, the names added or deleted
+        here are applied on top of it and the result replaces it atomically,
+        so keys written meanwhile by other processes are kept. Reads need no lock.
+        """
         try:
-            with open(self.file_path, 'w') as file:
-                json.dump(data, file)
+            with lock(self.file_path):
+                data = self._merge(self.load_keys(), self.keys, "keys")
+                with metrics.timer("disk"):
+                    if isinstance(data, MappedKeystore):
+                        atomic_write(self.file_path, lambda file: write_keystore(file, data.entries()), mode='wb')
+                    else:
+                        atomic_write(self.file_path, lambda file: json.dump(data, file))
+            if isinstance(data, MappedKeystore):
+                # Map the new file, the changes held in memory are in it now
+                data.close()
+                if isinstance(self.keys, MappedKeystore):
+                    self.keys.close()
+                data = self.load_keys()
+            self.keys = data
         except FileNotFoundError as e:
             print(f"Error saving keys: {e}")
 
 
+    def load_seeds(self) -> typing.Dict[str, typing.Dict[str, typing.Any]]:
+        # {"seeds": {seed_id: encrypted mnemonic}, "accounts": {name: {"seed": seed_id, "path": path}}}
+        seeds = {"seeds": {}, "accounts": {}}
+        if not os.path.exists(self.seeds_path):
+            return seeds
+        try:
+            with open(self.seeds_path, 'r') as file:
+                seeds.update(json.load(file))
+        except json.JSONDecodeError:
+            pass
+        return seeds
+
+    def save_seeds(self):
+        try:
+            with lock(self.seeds_path):
+                data = self.load_seeds()
+                # Seeds are keyed by their id and never change
+                data["seeds"].update(self.seeds["seeds"])
+                self._merge(data["accounts"], self.seeds["accounts"], "accounts")
+                atomic_write(self.seeds_path, lambda file: json.dump(data, file))
+            self.seeds = data
+        except FileNotFoundError as e:
+            print(f"Error saving seeds: {e}")
+
+    def _set_key(self, name, encrypted_key, address=None):
+        if isinstance(self.keys, MappedKeystore):
+            # Mapped keystores keep the address next to the key
+            self.keys.set(name, encrypted_key, address)
+        else:
+            self.keys[name] = encrypted_key
+
     def add_key(self, name, private_key):
-        encrypted_key = self.cipher_suite.encrypt(private_key.encode())
-        self.keys[name] = encrypted_key.decode()
+        with metrics.timer("crypto"):
+            encrypted_key = self.cipher_suite.encrypt(private_key.encode())
+        address = to_address(private_key) if isinstance(self.keys, MappedKeystore) else None
+        self._set_key(name, encrypted_key.decode(), address)
+        self._changed["keys"].add(name)
+        self._deleted["keys"].discard(name)
         self.save_keys()
         print(f"Key added: {name}")
 
+    def add_keys(self, private_keys: typing.Dict[str, str]):
+        """
+        Add many keys at once with a single write of the keystore.
+        """
+        with metrics.timer("crypto"):
+            addresses = address_map(private_keys) if isinstance(self.keys, MappedKeystore) else {}
+            for name, private_key in private_keys.items():
+                self._set_key(name, self.cipher_suite.encrypt(private_key.encode()).decode(), addresses.get(name))
+        self._changed["keys"].update(private_keys)
+        self._deleted["keys"].difference_update(private_keys)
+        self.save_keys()
+        print(f"Keys added: {len(private_keys)}")
+
+    def add_hd_keys(
+        self,
+        mnemonic: str,
+        name_prefix: str,
+        start: int = 0,
+        count: int = 1,
+        base_path: str = DEFAULT_BASE_PATH,
+        passphrase: str = "",
+    ) -> typing.Dict[str, str]:
+        """
+        Derive count accounts from the mnemonic and store them with a reference to it.
+        Return the new account names mapped to their addresses.
+
+        The mnemonic is encrypted once and shared by all derived accounts, each
+        account only keeps the seed id and its derivation path.
+        """
+        wallet = HDWallet(mnemonic, passphrase)
+        derived = wallet.derive_batch(start, count, base_path)
+        private_keys = {f"{name_prefix}_{index + 1}": private_key for index, private_key, _ in derived}
+        self.seeds["seeds"][wallet.seed_id] = self.cipher_suite.encrypt(wallet.mnemonic.encode()).decode()
+        for index, _, _ in derived:
+            self.seeds["accounts"][f"{name_prefix}_{index + 1}"] = {
+                "seed": wallet.seed_id,
+                "path": account_path(index, base_path),
+            }
+            self._changed["accounts"].add(f"{name_prefix}_{index + 1}")
+        self.add_keys(private_keys)
+        self.save_seeds()
+        return {f"{name_prefix}_{index + 1}": address for index, _, address in derived}
+
+    def get_address(self, name) -> typing.Optional[str]:
+        """
+        Return the address stored with the key in a mapped keystore, None when it has to be derived.
+        """
+        return self.keys.address(name) if isinstance(self.keys, MappedKeystore) else None
+
+    def get_addresses(self, names: typing.Optional[typing.Iterable[str]] = None) -> typing.Dict[str, str]:
+        """
+        Return name -> address of the accounts, all by default.
+
+        Addresses stored in a mapped keystore are used as they are, the other
+        keys are decrypted and their addresses derived in one batch.
+        """
+        names = list(self.keys) if names is None else list(names)
+        stored = {name: self.get_address(name) for name in names}
+        keys = {name: self.get_decrypted_key(name) for name in names if not stored[name]}
+        derived = address_map({name: key for name, key in keys.items() if key is not None})
+        return {name: stored[name] or derived[name] for name in names if stored[name] or name in derived}
+
     def get_key(self, name):
         key = self.keys.get(name)
         if key is None:
@@ -65,7 +214,8 @@ class KeyManager:
         if key is None:
             return None
         try:
-            __pkey = self.cipher_suite.decrypt(key.encode())
+            with metrics.timer("crypto"):
+                __pkey = self.cipher_suite.decrypt(key.encode())
             return __pkey.decode()
         except InvalidToken as e:
             print(f"Error decrypting...")
@@ -73,32 +223,57 @@ class KeyManager:
     def delete_key(self, name):
         if name in self.keys:
             del self.keys[name]
+            self._deleted["keys"].add(name)
+            self._changed["keys"].discard(name)
             self.save_keys()
+            if self.seeds["accounts"].pop(name, None) is not None:
+                self._deleted["accounts"].add(name)
+                self._changed["accounts"].discard(name)
+                self.save_seeds()
             print(f"Key deleted: {name}")
         else:
             print(f"No key found with name: {name}")
 
-    def to_private_key(self, seed_phrase):
+    def to_private_key(self, seed_phrase, path=account_path(0)):
         try:
-            account = Account.from_mnemonic(seed_phrase)
+            account = Account.from_mnemonic(seed_phrase, account_path=path)
             return account._private_key.hex()
         except ValueError as e:
             print(f"Error converting seed to private key: {e}")
-            
-    # FIX ME
+
     def get_mnemonic(self, name):
-        key = self.get_key(name)
-        if key is None:
+        ref = self.seeds["accounts"].get(name)
+        if ref is None:
+            return None
+        encrypted = self.seeds["seeds"].get(ref["seed"])
+        if encrypted is None:
             return None
-        return "MNEMONIC_PLACEHOLDER"
+        try:
+            return self.cipher_suite.decrypt(encrypted.encode()).decode()
+        except InvalidToken as e:
+            print(f"Error decrypting...")
+
+    def get_derivation_path(self, name):
+        ref = self.seeds["accounts"].get(name)
+        return ref["path"] if ref else None
 
     def create(self, name) -> str:
-        new = Account.create()
-        private_key = new._private_key.hex()
+        private_key = new_private_key()
         if name is None or len(name) == 0:
-            name = f"{new.address[2:5]}_{new.address[-3:]}"
+            address = to_address(private_key)
+            name = f"{address[2:5]}_{address[-3:]}"
         self.add_key(name, private_key)
         return name
+
+    def create_many(self, names: typing.Sequence[str]) -> typing.Dict[str, str]:
+        """
+        Create one random account per name with a single write of the keystore.
+        Return the names mapped to their addresses.
+        """
+        private_keys = {name: new_private_key() for name in names}
+        addresses = address_map(private_keys)
+        self.add_keys(private_keys)
+        return addresses
     
     def get_available_batches(self) -> typing.List[str]:
         full_list = list(self.keys)
@@ -0,0 +1,74 @@
+import typing
+from concurrent.futures import ThreadPoolExecutor
+
+
+DEFAULT_BATCH_SIZE = 100
+
+
+def _execute(w3, requests_info: typing.List[typing.Any]) -> typing.List[typing.Any]:
+    """
+    Send one batch and format every response on its own.
+
+    RequestBatcher.execute() raises on the first failed item, e.g. the
+    TransactionNotFound of a pending receipt, and the whole chunk would be
+    sent again call by call. Here a failed item gets its exception in place.
+    Raises only when the endpoint rejects the batch as a whole.
+    """
+    request_func = w3.provider.batch_request_func(w3, w3.middleware_onion)
+    response = request_func([(method, params) for (method, params), _ in requests_info])
+    if not isinstance(response, list) or len(response) != len(requests_info):
+        raise ValueError(f"Batch rejected: {response}")
+    results = []
+    for info, item in zip(requests_info, response):
+        try:
+            results.append(w3.manager._format_batched_response(info, item))
+        except Exception as e:
+            results.append(e)
+    return results
+
+
+def batch_call(
+    w3,
+    calls: typing.Sequence[typing.Tuple[typing.Callable[..., typing.Any], tuple]],
+    batch_size: int = DEFAULT_BATCH_SIZE,
+    max_workers: int = 8,
+) -> typing.List[typing.Any]:
+    """
+    Run many read calls as JSON-RPC batches.
+
+    Failed calls get their exception in place of the result, the rest of
+    their batch is kept. If the endpoint rejects a batch as a whole (no batch
+    support), that chunk is retried call by call in a thread pool.
+
+    Args:
+    w3 (Web3): Connected Web3 instance.
+    calls (Sequence): (method, args) pairs, e.g. (w3.eth.get_balance, (address, "latest"))
+        or (contract.functions.balanceOf, (address,)).
+    batch_size (int): Calls per batch request.
+    max_workers (int): Threads used by the fallback.
+
+    Returns:
+    List[Any]: Results in the order of calls.
+    """
+    def call_one(call):
+        method, args = call
+        try:
+            result = method(*args)
+            # Contract functions are batched as is, but need .call() on their own
+            return result.call() if hasattr(result, "call") else result
+        except Exception as e:
+            return e
+
+    results = []
+    for i in range(0, len(calls), batch_size):
+        chunk = calls[i:i + batch_size]
+        try:
+            with w3.batch_requests() as batch:
+                for method, args in chunk:
+                    batch.add(method(*args))
+                requests_info = list(batch._requests_info)
+            results.extend(_execute(w3, requests_info))
+        except Exception:
+            with ThreadPoolExecutor(max_workers=max_workers) as executor:
+                results.extend(executor.map(call_one, chunk))
+    return results
@@ -0,0 +1,267 @@
+import json
+import threading
+import time
+import typing
+from collections import OrderedDict
+from pathlib import Path
+
+from web3.middleware import Web3Middleware
+
+from utils.filelock import atomic_write
+from utils.init import DATA_PATH
+
+
+CACHE_FILE = "cache.json"
+
+# Results that never change for a given chain
+PERMANENT_METHODS = {"eth_chainId", "net_version"}
+# ERC20 decimals(), symbol(), name()
+TOKEN_METADATA_SELECTORS = {"0x313ce567", "0x95d89b41", "0x06fdde03"}
+# State reads that only change with a new block
+BLOCK_METHODS = {"eth_getBalance", "eth_getTransactionCount", "eth_call", "eth_getStorageAt", "eth_getCode"}
+TTL_METHODS = {"eth_gasPrice", "eth_maxPriorityFeePerGas", "eth_feeHistory"}
+# Our own sends change state before the next block
+INVALIDATING_METHODS = {"eth_sendRawTransaction", "eth_sendTransaction"}
+MOVING_TAGS = {"latest", "safe", "finalized"}
+
+
+class RPCCache:
+    def __init__(self, head_ttl: float = 2.0, fee_ttl: float = 5.0, max_entries: int = 100000, data_path: str = DATA_PATH):
+        """
+        Read-through cache of RPC results with a policy per method.
+
+        - permanent: chain ID, contract code and ERC20 decimals/symbol/name,
+          persisted in data/<chainId>/cache.json
+        - block: state reads at "latest", dropped when a new head is seen,
+          reads at an explicit block number are kept until evicted
+        - ttl: gas price and fee history
+        - anything else (pending state, sends, receipts) is never cached
+
+        Args:
+        head_ttl (float): Seconds the current block number is trusted before asking the node again.
+        fee_ttl (float): Seconds fee data stays valid.
+        max_entries (int): Size of the in-memory LRU for block and ttl entries.
+        data_path (str): Root of the per-chain data directories.
+        """
+        self.head_ttl = head_ttl
+        self.fee_ttl = fee_ttl
+        self.max_entries = max_entries
+        self.data_path = data_path
+        self.chain_id: typing.Optional[int] = None
+        self.permanent: typing.Dict[str, typing.Any] = {}
+        self.entries: "OrderedDict[str, typing.Tuple[str, typing.Any, typing.Any]]" = OrderedDict()
+        self.head: typing.Optional[int] = None
+        self._head_checked = 0.0
+        self.hits: typing.Dict[str, int] = {}
+        self.misses: typing.Dict[str, int] = {}
+        self._lock = threading.RLock()
+
+    # -- persistence -- #
+
+    def _cache_path(self) -> Path:
+        return Path(self.data_path) / str(self.chain_id) / CACHE_FILE
+
+    def set_chain(self, chain_id: int):
+        with self._lock:
+            if self.chain_id == chain_id:
+                return
+            self.chain_id = chain_id
+            self.permanent = {"eth_chainId": hex(chain_id)}
+            path = self._cache_path()
+            if path.exists():
+                try:
+                    with open(path, 'r') as file:
+                        self.permanent.update(json.load(file))
+                except json.JSONDecodeError:
+                    pass
+
+    def _persist(self):
+        path = self._cache_path()
+        path.parent.mkdir(parents=True, exist_ok=True)
+        # A temporary file of its own, the CLI and the daemon may persist the same chain at once
+        atomic_write(str(path), lambda file: json.dump(self.permanent, file))
+
+    # -- policies -- #
+
+    def policy(self, method: str, params: typing.Any) -> typing.Tuple[typing.Optional[str], typing.Optional[str]]:
+        """
+        Return (policy, key) of a request, (None, None) when it must not be cached.
+        """
+        params = list(params or [])
+        if method in PERMANENT_METHODS:
+            return "permanent", method
+        if method == "eth_call" and params and isinstance(params[0], dict):
+            data = (params[0].get("data") or params[0].get("input") or "")
+            data = data if isinstance(data, str) else "0x" + bytes(data).hex()
+            if data in TOKEN_METADATA_SELECTORS:
+                return "permanent", f"token:{str(params[0].get('to')).lower()}:{data}"
+        if method == "eth_getCode" and params:
+            return "permanent", f"code:{str(params[0]).lower()}"
+        key = method + ":" + json.dumps(params, sort_keys=True, default=str).lower()
+        if method in TTL_METHODS:
+            return "ttl", key
+        if method in BLOCK_METHODS:
+            tag = params[-1] if len(params) > 1 else "latest"
+            if tag in MOVING_TAGS:
+                return "block", key
+            if isinstance(tag, int) or (isinstance(tag, str) and tag.startswith("0x")):
+                return "fixed", key
+        return None, None
+
+    def get(self, policy: str, key: str) -> typing.Tuple[bool, typing.Any]:
+        with self._lock:
+            if policy == "permanent":
+                if key in self.permanent:
+                    return True, self.permanent[key]
+                return False, None
+            if key not in self.entries:
+                return False, None
+            _, stamp, value = self.entries[key]
+            valid = (
+                policy == "fixed"
+                or (policy == "block" and stamp == self.head)
+                or (policy == "ttl" and time.monotonic() - stamp < self.fee_ttl)
+            )
+            if not valid:
+                del self.entries[key]
+                return False, None
+            self.entries.move_to_end(key)
+            return True, value
+
+    def put(self, policy: str, key: str, value: typing.Any):
+        with self._lock:
+            if policy == "permanent":
+                # A contract without code yet may be deployed later, its code and metadata are not final
+                if key.startswith(("code:", "token:")) and value in ("0x", "", None):
+                    return
+                self.permanent[key] = value
+                if self.chain_id is not None:
+                    self._persist()
+                return
+            stamp = time.monotonic() if policy == "ttl" else self.head
+            if policy == "block" and stamp is None:
+                return
+            self.entries[key] = (policy, stamp, value)
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+
+    def invalidate_block(self):
+        with self._lock:
+            for key in [key for key, (policy, _, _) in self.entries.items() if policy == "block"]:
+                del self.entries[key]
+
+    def refresh_head(self, make_request) -> None:
+        if time.monotonic() - self._head_checked < self.head_ttl:
+            return
+        try:
+            response = make_request("eth_blockNumber", [])
+            self.set_head(int(response["result"], 16))
+        except Exception:
+            # Unknown head, block entries just miss until the node answers
+            self.set_head(None)
+
+    def set_head(self, number: typing.Optional[int]):
+        with self._lock:
+            self.head = number
+            self._head_checked = time.monotonic()
+
+    def count(self, method: str, hit: bool):
+        with self._lock:
+            stats = self.hits if hit else self.misses
+            stats[method] = stats.get(method, 0) + 1
+
+    def stats(self) -> typing.Dict[str, typing.Any]:
+        with self._lock:
+            hits = sum(self.hits.values())
+            misses = sum(self.misses.values())
+            return {
+                "hits": hits,
+                "misses": misses,
+                "hit_rate": hits / (hits + misses) if hits + misses else 0.0,
+                "per_method": {
+                    method: {"hits": self.hits.get(method, 0), "misses": self.misses.get(method, 0)}
+                    for method in set(self.hits) | set(self.misses)
+                },
+            }
+
+
+class RPCCacheMiddleware(Web3Middleware):
+    cache: RPCCache
+
+    def _lookup(self, make_request, method, params):
+        policy, key = self.cache.policy(method, params)
+        if policy is None:
+            return None, None, None
+        if policy == "block":
+            self.cache.refresh_head(make_request)
+        hit, value = self.cache.get(policy, key)
+        self.cache.count(method, hit)
+        return policy, key, ({"jsonrpc": "2.0", "id": 0, "result": value} if hit else None)
+
+    def _store(self, policy, key, method, response):
+        if policy is None or "result" not in response or response["result"] is None:
+            return
+        if method == "eth_chainId":
+            self.cache.set_chain(int(response["result"], 16))
+        self.cache.put(policy, key, response["result"])
+
+    def wrap_make_request(self, make_request):
+        def middleware(method, params):
+            if method in INVALIDATING_METHODS:
+                self.cache.invalidate_block()
+            policy, key, cached = self._lookup(make_request, method, params)
+            if cached is not None:
+                return cached
+            response = make_request(method, params)
+            self._store(policy, key, method, response)
+            return response
+
+        return middleware
+
+    def wrap_make_batch_request(self, make_batch_request):
+        def middleware(requests_info):
+            if any(method in INVALIDATING_METHODS for method, _ in requests_info):
+                self.cache.invalidate_block()
+            single = lambda method, params: make_batch_request([(method, params)])[0]
+            lookups = [self._lookup(single, method, params) for method, params in requests_info]
+            missing = [i for i, (_, _, cached) in enumerate(lookups) if cached is None]
+            if not missing:
+                return [cached for _, _, cached in lookups]
+            response = make_batch_request([requests_info[i] for i in missing])
+            if not isinstance(response, list):
+                return response
+            merged = [cached for _, _, cached in lookups]
+            for i, item in zip(missing, response):
+                policy, key, _ = lookups[i]
+                self._store(policy, key, requests_info[i][0], item)
+                merged[i] = item
+            return merged
+
+        return middleware
+
+
+def enable_cache(w3, cache: typing.Optional[RPCCache] = None) -> RPCCache:
+    """
+    Add a read-through cache to a Web3 instance and return it.
+
+    The cache is added as the outermost middleware, so hits never reach the
+    instrumentation or the provider.
+    """
+    cache = cache or RPCCache()
+
+    def build(w3):
+        middleware = RPCCacheMiddleware(w3)
+        middleware.cache = cache
+        return middleware
+
+    if "rpc_cache" in w3.middleware_onion:
+        w3.middleware_onion.replace("rpc_cache", build)
+    else:
+        w3.middleware_onion.add(build, "rpc_cache")
+    # Learn the chain first, permanent entries are stored per chain
+    try:
+        w3.eth.chain_id
+    except Exception:
+        pass
+    return cache
@@ -3,6 +3,8 @@ import json
 import requests
 from pathlib import Path
 
+from utils.metrics import metrics
+
 
 class Networks:
     def __init__(self, chains_path: str = "chains"):
@@ -13,7 +15,8 @@ class Networks:
         chains_path (str): The path to the directory containing the network configuration files.
         """
         self.chains_path = chains_path
-        self.networks = self.load(self.chains_path)
+        with metrics.timer("disk"):
+            self.networks = self.load(self.chains_path)
 
     @classmethod
     def load(cls, chains_path: str) -> Dict[str, List[Dict[str, str]]]:
@@ -72,6 +75,39 @@ class Networks:
             return None
         
 
+    def find(self, name_or_id: str) -> Optional[Dict[str, str]]:
+        """
+        Return the network configuration matching a network name or chain ID.
+
+        Args:
+        name_or_id (str): The name or the chain ID of the network.
+
+        Returns:
+        Optional[Dict[str, str]]: The network configuration or None if not found.
+        """
+        name_or_id = str(name_or_id)
+        for network in self.networks.get("testnet", []) + self.networks.get("mainnet", []) + self.networks.get("mixed", []):
+            if network.get("name") == name_or_id or network.get("chainId") == name_or_id:
+                return network
+        return None
+
+    def get_rpc_urls(self, chain_id: str) -> List[str]:
+        """
+        Return the RPC URLs of every network configuration with a given chain ID.
+
+        Args:
+        chain_id (str): The chain ID of the network.
+
+        Returns:
+        List[str]: The RPC URLs, possibly with ${VAR} templates, without duplicates.
+        """
+        urls = []
+        for network in self.networks.get("testnet", []) + self.networks.get("mainnet", []) + self.networks.get("mixed", []):
+            url = network.get("rpcUrl")
+            if network.get("chainId") == str(chain_id) and url and url not in urls:
+                urls.append(url)
+        return urls
+
     def get_symbol_by_id(self, network_id: str) -> Optional[str]:
         """
         Return the symbol for a given network ID.
@@ -0,0 +1,645 @@
+import argparse
+import json
+import sys
+import typing
+from decimal import Decimal
+from pathlib import Path
+
+from web3 import Web3
+
+from utils.abi import get_abi
+from utils.batch import batch_call
+from utils.dataset import BalanceDataset
+from utils.distribute import Distributor, DISPERSE_ADDRESS, load_recipients
+from utils.export import Export, Reader, TEMPLATES
+from utils.gas import FeeOracle
+from utils.heads import HeadScheduler, ws_endpoint
+from utils.metrics import metrics, instrument, Profiler
+from utils.ratelimit import rate_limit
+from utils.portfolio import scan as portfolio_scan
+from utils.preflight import simulate as preflight
+from utils.replace import replace_stuck, track, SPEED_UP, CANCEL, DEFAULT_BUMP
+from utils.rotate import rotate as rotate_token
+from utils.snapshot import SnapshotStore, SNAPSHOT_FILE
+from utils.cache import enable_cache, RPCCache
+from utils.crypto import address_map, to_address
+from utils.endpoint import fastest as fastest_endpoint
+from utils.init import DATA_PATH
+from utils.invoke import FunctionInvoker, is_amount
+from utils.journal import journal
+from utils.keystore import MAPPED_SUFFIX, is_mapped, to_mapped, to_json as keystore_to_json
+from utils.tx import SendTransaction
+
+
+Record = typing.Dict[str, typing.Any]
+
+
+class Context:
+    def __init__(self, km, chains, config):
+        """
+        Shared state of headless commands.
+
+        Web3 connections and fee oracles are created on first use and reused by
+        every command of the same invocation.
+
+        Args:
+        km (KeyManager): The key manager.
+        chains (Networks): The chain registry.
+        config (dict): Values from .env.
+        """
+        self.km = km
+        self.chains = chains
+        self.config = config
+        # Where permanent RPC cache entries are persisted, per chain ID
+        self.cache_path = DATA_PATH
+        self._web3: typing.Dict[str, Web3] = {}
+        self._oracles: typing.Dict[str, FeeOracle] = {}
+
+    def endpoint(self, params: Record) -> str:
+        if params.get("endpoint") and params["endpoint"] != "auto":
+            return params["endpoint"]
+        if params.get("chain"):
+            network = self.chains.find(params["chain"])
+            if network is None or not network.get("rpcUrl"):
+                raise ValueError(f"Unknown chain: {params['chain']}")
+            if params.get("endpoint") == "auto":
+                url, _ = fastest_endpoint(self.chains, network["chainId"])
+                if url is None:
+                    raise ValueError(f"No healthy endpoint for chain {network['chainId']}")
+                return url
+            return network["rpcUrl"]
+        if params.get("endpoint") == "auto":
+            raise ValueError("--endpoint auto needs --chain")
+        return self.config["ENDPOINT"]
+
+    def web3(self, params: Record) -> Web3:
+        endpoint = self.endpoint(params)
+        if endpoint not in self._web3:
+            w3 = rate_limit(instrument(Web3(Web3.HTTPProvider(endpoint))))
+            w3.rpc_cache = enable_cache(w3, RPCCache(data_path=self.cache_path))
+            self._web3[endpoint] = w3
+        return self._web3[endpoint]
+
+    def fee_oracle(self, params: Record) -> FeeOracle:
+        endpoint = self.endpoint(params)
+        if endpoint not in self._oracles:
+            self._oracles[endpoint] = FeeOracle(self.web3(params))
+        return self._oracles[endpoint]
+
+    def select_accounts(self, params: Record) -> typing.List[str]:
+        names = params.get("accounts") or ["all"]
+        if isinstance(names, str):
+            names = [names]
+        if "all" in names:
+            return list(self.km.keys)
+        missing = [name for name in names if name not in self.km.keys]
+        if missing:
+            raise ValueError(f"Unknown account(s): {', '.join(missing)}")
+        return names
+
+    def private_keys(self, params: Record) -> typing.Dict[str, str]:
+        keys = {}
+        for name in self.select_accounts(params):
+            key = self.km.get_decrypted_key(name)
+            if key is None:
+                continue
+            keys[name] = key if key.startswith("0x") else "0x" + key
+        return keys
+
+
+def to_wei(amount, decimals: int = 18) -> int:
+    return int(Decimal(str(amount)) * 10 ** decimals)
+
+
+def _fees(ctx: Context, params: Record) -> typing.Dict[str, int]:
+    if params.get("gas_price"):
+        return {"gasPrice": int(params["gas_price"])}
+    return ctx.fee_oracle(params).fees()
+
+
+def _preflight(w3, params: Record, txs: typing.List[Record], decoder=None) -> typing.List[Record]:
+    """
+    Simulate txs before signing, unless params has no_preflight.
+    """
+    if params.get("no_preflight"):
+        return [{"status": "ok", "gas": tx.get("gas") or w3.eth.estimate_gas(tx)} for tx in txs]
+    return preflight(w3, txs, decoder)
+
+
+def cmd_generate(ctx: Context, params: Record) -> typing.Iterator[Record]:
+    count = int(params.get("count", 1))
+    prefix = params.get("prefix") or "acc"
+    if params.get("mnemonic") or params.get("hd"):
+        mnemonic = params.get("mnemonic")
+        if not mnemonic:
+            from utils.hdwallet import HDWallet
+            mnemonic = HDWallet.generate_mnemonic()
+            yield {"mnemonic": mnemonic}
+        derived = ctx.km.add_hd_keys(mnemonic, prefix, start=int(params.get("start", 0)), count=count)
+        for name, address in derived.items():
+            yield {"name": name, "address": address}
+        return
+
+    addresses = ctx.km.create_many([f"{prefix}_{num + 1}" for num in range(count)])
+    for name, address in addresses.items():
+        yield {"name": name, "address": address}
+
+
+def cmd_import(ctx: Context, params: Record) -> typing.Iterator[Record]:
+    acc_list = Reader(params["file"]).from_txt()
+    if not acc_list:
+        raise ValueError(f"No accounts found in {params['file']}")
+    prefix = params.get("prefix") or "imported"
+    keys = {f"{prefix}_{num + 1}": key for num, (_, key) in enumerate(acc_list)}
+    ctx.km.add_keys(keys)
+    for name, (address, _) in zip(keys, acc_list):
+        yield {"name": name, "address": address}
+
+
+def cmd_balances(ctx: Context, params: Record) -> typing.Iterator[Record]:
+    w3 = ctx.web3(params)
+    symbol = ctx.chains.get_symbol_by_id(str(w3.eth.chain_id))
+    addresses = address_map(ctx.private_keys(params))
+    if params.get("snapshot"):
+        store = SnapshotStore(str(Path(ctx.cache_path) / SNAPSHOT_FILE))
+        try:
+            summary = store.refresh(w3, addresses.values(), scan_native=bool(params.get("scan_native")))
+            stored = store.load(summary["chainId"])
+        finally:
+            store.close()
+        for name, address in addresses.items():
+            balance, block = stored[address.lower()]
+            if balance > 0 or not params.get("nonzero"):
+                yield {"account": name, "address": address, "balance": balance, "symbol": symbol, "block": block}
+        return
+    balances = batch_call(w3, [(w3.eth.get_balance, (address, "latest")) for address in addresses.values()])
+    for (name, address), balance in zip(addresses.items(), balances):
+        if isinstance(balance, Exception):
+            yield {"account": name, "address": address, "error": str(balance)}
+        elif balance > 0 or not params.get("nonzero"):
+            yield {"account": name, "address": address, "balance": balance, "symbol": symbol}
+
+
+def cmd_portfolio(ctx: Context, params: Record) -> typing.Iterator[Record]:
+    names = params.get("chains") or []
+    if isinstance(names, str):
+        names = [names]
+    networks = []
+    for name in names:
+        network = ctx.chains.find(name)
+        if network is None:
+            raise ValueError(f"Unknown chain: {name}")
+        networks.append(network)
+    if params.get("type"):
+        networks += ctx.chains.networks.get(params["type"], [])
+    if not networks:
+        raise ValueError("No chains selected, use --chains or --type")
+    addresses = address_map(ctx.private_keys(params))
+    store = SnapshotStore(str(Path(ctx.cache_path) / SNAPSHOT_FILE)) if params.get("snapshot") else None
+    try:
+        rows, timings = portfolio_scan(
+            networks, addresses,
+            max_chains=int(params.get("max_chains") or 8),
+            concurrency=int(params.get("concurrency") or 4),
+            auto_endpoint=bool(params.get("auto")),
+            chains=ctx.chains,
+            data_path=ctx.cache_path,
+            store=store,
+        )
+    finally:
+        if store is not None:
+            store.close()
+    for row in rows:
+        if "error" in row or row["balance"] > 0 or not params.get("nonzero"):
+            yield row
+    for timing in timings:
+        yield {"timing": True, **timing}
+
+
+def _confirm(ctx: Context, params: Record, w3, records: typing.Iterable[Record]) -> typing.Iterator[Record]:
+    """
+    Pass records through, then with params wait follow their hashes once per new block.
+    """
+    sent = []
+    for record in records:
+        yield record
+        if record.get("hash"):
+            sent.append(record)
+    if not params.get("wait") or not sent:
+        return
+    confirmations: typing.List[Record] = []
+    scheduler = HeadScheduler(
+        w3, params.get("ws") or ws_endpoint(ctx.config, ctx.endpoint(params)),
+        on_balance=lambda address, balance, block: confirmations.append({"address": address, "balance": balance, "block": block}),
+    )
+    for record in sent:
+        scheduler.watch_receipt(record["hash"], lambda tx_hash, receipt, record=record: confirmations.append({
+            "account": record.get("account"), "hash": tx_hash, "block": receipt["blockNumber"],
+            "status": "mined" if receipt["status"] == 1 else "failed",
+        }))
+    scheduler.run(timeout=float(params["wait"]))
+    yield from confirmations
+    for tx_hash in scheduler.receipts:
+        yield {"hash": tx_hash, "status": "pending"}
+
+
+def cmd_send(ctx: Context, params: Record) -> typing.Iterator[Record]:
+    w3 = ctx.web3(params)
+    chain_id = w3.eth.chain_id
+    to_address = Web3.to_checksum_address(params["to"])
+    amount = to_wei(params["amount"])
+    gas_limit = int(params.get("gas_limit") or 21000)
+    fees = _fees(ctx, params)
+    keys = ctx.private_keys(params)
+    addresses = address_map(keys)
+    nonces = batch_call(w3, [(w3.eth.get_transaction_count, (address, "pending")) for address in addresses.values()])
+
+    txs = {}
+    for (name, key), nonce in zip(keys.items(), nonces):
+        if isinstance(nonce, Exception):
+            yield {"account": name, "from": addresses[name], "to": to_address, "value": amount, "error": str(nonce)}
+            continue
+        txs[name] = SendTransaction(w3, chain_id, key, addresses[name], to_address, amount, gas_limit, fees.get("gasPrice"), fees, nonce=nonce)
+    checks = _preflight(w3, params, [{"from": tx.from_address, **tx.build()} for tx in txs.values()])
+
+    def send():
+        for (name, tx), check in zip(txs.items(), checks):
+            record = {"account": name, "from": addresses[name], "to": to_address, "value": amount}
+            if check["status"] != "ok":
+                yield {**record, "status": check["status"], "error": check["reason"]}
+                continue
+            try:
+                yield {**record, "hash": "0x" + tx.send().hex().removeprefix("0x")}
+            except Exception as e:
+                yield {**record, "error": str(e)}
+
+    yield from _confirm(ctx, params, w3, send())
+
+
+def cmd_erc20(ctx: Context, params: Record) -> typing.Iterator[Record]:
+    w3 = ctx.web3(params)
+    abi = get_abi(params["contract"], w3.eth.chain_id)
+    if not abi:
+        raise ValueError(f"No ABI for {params['contract']} in data/{w3.eth.chain_id}/")
+    invoker = FunctionInvoker.from_abi(abi, "transfer")
+    to_address = Web3.to_checksum_address(params["to"])
+    amount = to_wei(params["amount"], w3.eth.contract(address=invoker.address, abi=abi.abi).functions.decimals().call())
+    rows = [(name, key, [to_address, amount]) for name, key in ctx.private_keys(params).items()]
+
+    def send():
+        for record in invoker.send(w3, rows, _fees(ctx, params), preflight=not params.get("no_preflight")):
+            record = {key: value for key, value in record.items() if key not in ("contract", "function", "args")}
+            yield {**record, "to": to_address, "value": amount}
+
+    yield from _confirm(ctx, params, w3, send())
+
+
+def cmd_invoke(ctx: Context, params: Record) -> typing.Iterator[Record]:
+    w3 = ctx.web3(params)
+    abi = get_abi(params["contract"], w3.eth.chain_id)
+    if not abi:
+        raise ValueError(f"No ABI for {params['contract']} in data/{w3.eth.chain_id}/")
+    invoker = FunctionInvoker.from_abi(abi, params["function"])
+    decimals = None
+    if not params.get("raw") and any(is_amount(arg.name, arg.type) for arg in invoker.function.inputs):
+        decimals = w3.eth.contract(address=invoker.address, abi=abi.abi).functions.decimals().call()
+
+    keys = ctx.private_keys(params)
+    if params.get("rows"):
+        # JSON lines of {"account": name, "args": [...]}, many rows may share an account
+        with open(params["rows"], 'r') as file:
+            entries = [json.loads(line) for line in file if line.strip()]
+        missing = {entry["account"] for entry in entries} - set(keys)
+        if missing:
+            raise ValueError(f"Unknown or unselected account(s): {', '.join(sorted(missing))}")
+    else:
+        entries = [{"account": name, "args": params.get("args") or []} for name in keys]
+    addresses = address_map(keys)
+    rows = [(entry["account"], invoker.parse_args(entry["args"], decimals, addresses[entry["account"]])) for entry in entries]
+
+    if invoker.read_only:
+        results = invoker.call(w3, [(addresses[name], args) for name, args in rows], params.get("block") or "latest")
+        for (name, _), record in zip(rows, results):
+            yield {"account": name, **record}
+        return
+    value = to_wei(params["value"]) if params.get("value") else 0
+    records = invoker.send(w3, [(name, keys[name], args) for name, args in rows], _fees(ctx, params), value, not params.get("no_preflight"))
+    yield from _confirm(ctx, params, w3, records)
+
+
+def cmd_replace(ctx: Context, params: Record) -> typing.Iterator[Record]:
+    w3 = ctx.web3(params)
+    rows = replace_stuck(
+        w3, ctx.private_keys(params), _fees(ctx, params),
+        mode=params.get("mode") or SPEED_UP,
+        bump=float(params.get("bump") or DEFAULT_BUMP),
+    )
+    if params.get("wait"):
+        rows = track(w3, rows, timeout=float(params["wait"]))
+    yield from rows
+
+
+def cmd_distribute(ctx: Context, params: Record) -> typing.Iterator[Record]:
+    w3 = ctx.web3(params)
+    keys = ctx.private_keys({"accounts": [params["account"]]})
+    distributor = Distributor(w3, keys[params["account"]], _fees(ctx, params), params.get("contract") or DISPERSE_ADDRESS, params.get("token"))
+    decimals = distributor.token.functions.decimals().call() if distributor.token is not None else 18
+    recipients = load_recipients(params["file"], decimals)
+    yield from distributor.distribute(
+        recipients,
+        batch_size=int(params["batch_size"]) if params.get("batch_size") else None,
+        wait=not params.get("no_wait"),
+    )
+
+
+def cmd_dataset(ctx: Context, params: Record) -> typing.Iterator[Record]:
+    if params.get("rows"):
+        # JSON lines of a previous portfolio or balances run
+        with open(params["rows"], 'r') as file:
+            rows = [json.loads(line) for line in file if line.strip()]
+        dataset = BalanceDataset.from_rows(row for row in rows if not row.get("timing"))
+    else:
+        addresses = address_map(ctx.private_keys(params))
+        symbols = {int(network["chainId"]): network.get("symbol") for kind in ctx.chains.networks.values() for network in kind}
+        store = SnapshotStore(str(Path(ctx.cache_path) / SNAPSHOT_FILE))
+        try:
+            dataset = BalanceDataset.from_snapshots(store, addresses, params.get("chain_id"), symbols)
+        finally:
+            store.close()
+    if params.get("path"):
+        if params.get("format") == "parquet":
+            yield {"file": dataset.to_parquet(params["path"]), "rows": len(dataset)}
+        else:
+            yield {"file": dataset.to_npz(params["path"]), "rows": len(dataset)}
+    if params.get("report"):
+        by = params.get("by") or ["chainId", "asset"]
+        for row in dataset.totals(by):
+            yield {"total": True, **row}
+        for row in dataset.top(int(params.get("top") or 10)):
+            yield {"top": True, **row}
+        if params.get("dust"):
+            for row in dataset.dust(float(params["dust"]), by):
+                yield {"dust": True, **row}
+
+
+def cmd_export(ctx: Context, params: Record) -> typing.Iterator[Record]:
+    template = params.get("template") or "PRIVATEKEY_ADDRESS"
+    if template not in TEMPLATES:
+        raise ValueError(f"Unknown template: {template}")
+    export_data, paths = {}, {}
+    keys = ctx.private_keys(params)
+    for (name, key), address in zip(keys.items(), address_map(keys).values()):
+        if "SEEDPHRASE" in template:
+            mnemonic = ctx.km.get_mnemonic(name)
+            if mnemonic is None:
+                yield {"account": name, "error": "No mnemonic found"}
+                continue
+            export_data[address] = mnemonic
+            paths[address] = ctx.km.get_derivation_path(name)
+        else:
+            export_data[address] = key.removeprefix("0x")
+
+    _export = Export(params.get("path") or ".", export_data, template, paths)
+    file_name = _export.to_csv() if params.get("format") == "csv" else _export.to_txt()
+    yield {"file": file_name, "count": len(export_data)}
+
+
+def cmd_rotate(ctx: Context, params: Record) -> typing.Iterator[Record]:
+    from utils.account import new_encrypt_token
+    old_token, new_token = ctx.config["ENCRYPTION_TOKEN"], new_encrypt_token().decode()
+    summary = rotate_token(
+        ctx.config["KEYS_PATH"], params.get("env") or ".env", old_token, new_token,
+        [ctx.config.get("ENCRYPTION_TOKEN_PREVIOUS")], workers=params.get("workers"),
+    )
+    ctx.config["ENCRYPTION_TOKEN"], ctx.config["ENCRYPTION_TOKEN_PREVIOUS"] = new_token, old_token
+    ctx.km.set_encryption_key(new_token, [old_token])
+    ctx.km.keys = ctx.km.load_keys()
+    ctx.km.seeds = ctx.km.load_seeds()
+    yield summary
+
+
+def cmd_keystore(ctx: Context, params: Record) -> typing.Iterator[Record]:
+    source = ctx.config["KEYS_PATH"]
+    stem = str(Path(source).with_suffix(""))
+    if params.get("format") == "json":
+        if not is_mapped(source):
+            raise ValueError(f"{source} is already a JSON keystore")
+        output = params.get("output") or stem + ".json"
+        count = keystore_to_json(source, output)
+    else:
+        if is_mapped(source):
+            raise ValueError(f"{source} is already a mapped keystore")
+        output = params.get("output") or stem + MAPPED_SUFFIX
+        derive = None
+        if params.get("addresses"):
+            def derive(name: str, ciphertext: str) -> str:
+                key = ctx.km.cipher_suite.decrypt(ciphertext.encode()).decode()
+                return to_address(key)
+        count = to_mapped(source, output, derive)
+    # The seeds file is found next to the keystore, by its name without extension
+    yield {"file": output, "keys": count, "format": params.get("format") or "mapped", "set": f"KEYS_PATH={output}"}
+
+
+def cmd_chains(ctx: Context, params: Record) -> typing.Iterator[Record]:
+    kind = params.get("type") or "all"
+    kinds = ["mainnet", "testnet", "mixed"] if kind == "all" else [kind]
+    search = (params.get("search") or "").lower()
+    for kind in kinds:
+        for network in ctx.chains.networks.get(kind, []):
+            if search in network.get("name", "").lower() or search == network.get("chainId"):
+                yield {"type": kind, **network}
+
+
+COMMANDS: typing.Dict[str, typing.Callable[[Context, Record], typing.Iterator[Record]]] = {
+    "generate": cmd_generate,
+    "import": cmd_import,
+    "balances": cmd_balances,
+    "portfolio": cmd_portfolio,
+    "send": cmd_send,
+    "erc20": cmd_erc20,
+    "invoke": cmd_invoke,
+    "distribute": cmd_distribute,
+    "replace": cmd_replace,
+    "dataset": cmd_dataset,
+    "export": cmd_export,
+    "rotate": cmd_rotate,
+    "keystore": cmd_keystore,
+    "chains": cmd_chains,
+}
+
+
+def load_jobs(path: str) -> typing.List[Record]:
+    """
+    Load a job file: a list of {"command": ..., **params}, or {"jobs": [...]}.
+
+    YAML is accepted when PyYAML is installed.
+    """
+    with open(path, 'r') as file:
+        if path.endswith((".yaml", ".yml")):
+            try:
+                import yaml
+            except ImportError:
+                raise ValueError("PyYAML is required for YAML job files.")
+            jobs = yaml.safe_load(file)
+        else:
+            jobs = json.load(file)
+    if isinstance(jobs, dict):
+        jobs = jobs.get("jobs", [])
+    return jobs
+
+
+def run_job(ctx: Context, command: str, params: Record) -> typing.Iterator[Record]:
+    """
+    Run one command and yield its records, errors included as {"error": ...} records.
+    """
+    handler = COMMANDS.get(command)
+    if handler is None:
+        yield {"command": command, "error": f"Unknown command: {command}"}
+        return
+    metrics.set_action(command)
+    try:
+        with Profiler().profile(command):
+            for record in handler(ctx, params):
+                yield {"command": command, **record}
+    except Exception as e:
+        yield {"command": command, "error": str(e)}
+
+
+def build_parser() -> argparse.ArgumentParser:
+    connection = argparse.ArgumentParser(add_help=False)
+    connection.add_argument("--endpoint", help="RPC URL or 'auto' for the fastest endpoint of --chain, ENDPOINT from .env by default")
+    connection.add_argument("--chain", help="Network name or chain ID from the chain registry")
+    selection = argparse.ArgumentParser(add_help=False)
+    selection.add_argument("--accounts", nargs="*", help="Account names, all by default")
+    fees = argparse.ArgumentParser(add_help=False)
+    fees.add_argument("--gas-price", dest="gas_price", help="Legacy gas price in wei, EIP-1559 fees by default")
+    fees.add_argument("--no-preflight", dest="no_preflight", action="store_true", help="Send without simulating first")
+    confirmation = argparse.ArgumentParser(add_help=False)
+    confirmation.add_argument("--wait", type=float, help="Seconds to wait for receipts, checked once per new block")
+    confirmation.add_argument("--ws", help="WebSocket URL for new blocks, WS_ENDPOINT from .env by default")
+
+    parser = argparse.ArgumentParser(prog="main.py", description="Headless mode, results are JSON lines on stdout.")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    p = sub.add_parser("generate", help="Generate new accounts")
+    p.add_argument("--count", type=int, default=1)
+    p.add_argument("--prefix", default="acc")
+    p.add_argument("--hd", action="store_true", help="Derive from a new mnemonic")
+    p.add_argument("--mnemonic", help="Derive from this mnemonic")
+    p.add_argument("--start", type=int, default=0, help="First derivation index")
+
+    p = sub.add_parser("import", help="Import accounts from a txt file")
+    p.add_argument("file")
+    p.add_argument("--prefix", default="imported")
+
+    p = sub.add_parser("balances", parents=[connection, selection], help="Native balances of accounts")
+    p.add_argument("--nonzero", action="store_true", help="Only accounts with a balance")
+    p.add_argument("--snapshot", action="store_true", help="Refresh the local snapshot and read the balances from it")
+    p.add_argument("--scan-native", dest="scan_native", action="store_true", help="With --snapshot, only read native balances touched in recent blocks")
+
+    p = sub.add_parser("portfolio", parents=[selection], help="Native and token balances on many chains at once")
+    p.add_argument("--chains", nargs="*", help="Network names or chain IDs")
+    p.add_argument("--type", choices=["mainnet", "testnet", "mixed"], help="Scan every network of this type")
+    p.add_argument("--nonzero", action="store_true", help="Only non-zero balances")
+    p.add_argument("--auto", action="store_true", help="Use the fastest endpoint of each chain")
+    p.add_argument("--max-chains", dest="max_chains", type=int, default=8, help="Chains scanned at the same time")
+    p.add_argument("--concurrency", type=int, default=4, help="Connections per chain")
+    p.add_argument("--snapshot", action="store_true", help="Also store the balances in the local snapshot")
+
+    p = sub.add_parser("send", parents=[connection, selection, fees, confirmation], help="Native token transfers")
+    p.add_argument("--to", required=True)
+    p.add_argument("--amount", required=True, help="Amount in ether or native token")
+    p.add_argument("--gas-limit", dest="gas_limit", type=int, default=21000)
+
+    p = sub.add_parser("erc20", parents=[connection, selection, fees, confirmation], help="ERC20 transfers")
+    p.add_argument("--contract", required=True)
+    p.add_argument("--to", required=True)
+    p.add_argument("--amount", required=True, help="Amount in tokens")
+
+    p = sub.add_parser("invoke", parents=[connection, selection, fees, confirmation], help="Call any contract function for many accounts")
+    p.add_argument("--contract", required=True, help="Contract with an ABI in data/<chainId>/")
+    p.add_argument("--function", required=True)
+    p.add_argument("--args", nargs="*", help="Arguments of every account, 'self' for the account's address")
+    p.add_argument("--rows", help="JSON lines of {\"account\": ..., \"args\": [...]} instead of --args")
+    p.add_argument("--raw", action="store_true", help="Amounts in base units, in tokens (scaled by decimals) by default")
+    p.add_argument("--value", help="Native token sent with each call, in ether")
+    p.add_argument("--block", help="Block of read calls, latest by default")
+
+    p = sub.add_parser("distribute", parents=[connection, fees], help="One-to-many transfers through a disperse contract")
+    p.add_argument("--account", required=True, help="Funding account")
+    p.add_argument("--file", required=True, help="Lines of 'address amount', amounts in ether or tokens")
+    p.add_argument("--token", help="ERC20 token address, native token by default")
+    p.add_argument("--contract", default=DISPERSE_ADDRESS, help="Disperse contract address")
+    p.add_argument("--batch-size", dest="batch_size", type=int, help="Recipients per call, fitted to the block gas limit by default")
+    p.add_argument("--no-wait", dest="no_wait", action="store_true", help="Do not wait for receipts between chunks")
+
+    p = sub.add_parser("replace", parents=[connection, selection], help="Speed up or cancel stuck transactions")
+    p.add_argument("--mode", choices=[SPEED_UP, CANCEL], default=SPEED_UP)
+    p.add_argument("--bump", type=float, default=DEFAULT_BUMP, help="Minimum fee multiplier over the stuck version")
+    p.add_argument("--gas-price", dest="gas_price", help="Legacy gas price in wei, EIP-1559 fees by default")
+    p.add_argument("--wait", type=float, help="Seconds to wait for the nonces to be mined")
+
+    p = sub.add_parser("dataset", parents=[selection], help="Columnar balance dataset with totals, top holders and dust")
+    p.add_argument("--rows", help="JSON lines of balances/portfolio output, the local snapshots by default")
+    p.add_argument("--chain-id", dest="chain_id", type=int, help="Only snapshots of this chain")
+    p.add_argument("--format", choices=["npz", "parquet"], default="npz")
+    p.add_argument("--path", help="Write the dataset to this file")
+    p.add_argument("--report", action="store_true", help="Yield totals, top holders and dust records")
+    p.add_argument("--by", nargs="*", choices=["account", "batch", "chainId", "token", "asset"], help="Totals grouping, chainId asset by default")
+    p.add_argument("--top", type=int, default=10, help="Number of top holders")
+    p.add_argument("--dust", type=float, help="Count balances below this amount as dust")
+
+    p = sub.add_parser("export", parents=[selection], help="Unsafe export of keys to a file")
+    p.add_argument("--template", choices=list(TEMPLATES), default="PRIVATEKEY_ADDRESS")
+    p.add_argument("--format", choices=["txt", "csv"], default="txt")
+    p.add_argument("--path", default=".", help="Directory the export file is written to")
+
+    p = sub.add_parser("rotate", help="Re-encrypt the keystore with a new ENCRYPTION_TOKEN")
+    p.add_argument("--env", default=".env", help="File holding ENCRYPTION_TOKEN")
+    p.add_argument("--workers", type=int, help="Worker processes, all CPUs by default")
+
+    p = sub.add_parser("keystore", help="Convert the keystore between JSON and the memory-mapped format")
+    p.add_argument("--format", choices=["mapped", "json"], default="mapped", help="Format to convert to")
+    p.add_argument("--output", help="File to write, the keystore name with the new extension by default")
+    p.add_argument("--addresses", action="store_true", help="Decrypt every key once to store its address in the mapped records")
+
+    p = sub.add_parser("chains", help="List configured networks")
+    p.add_argument("--type", choices=["all", "mainnet", "testnet", "mixed"], default="all")
+    p.add_argument("--search", default="")
+
+    p = sub.add_parser("run", help="Run a JSON/YAML job file")
+    p.add_argument("job_file")
+
+    p = sub.add_parser("daemon", help="Keep keys and connections warm behind a Unix socket")
+    p.add_argument("--socket", help="Socket path, see utils/daemon.py for the default")
+    p.add_argument("--idle-timeout", dest="idle_timeout", type=float, help="Seconds before keys are locked, 0 to disable")
+    return parser
+
+
+def main(argv: typing.List[str], km, chains, config, out: typing.TextIO = sys.stdout) -> int:
+    """
+    Run headless commands and stream JSON lines to out.
+
+    Returns:
+    int: Exit code, 1 if any record reported an error.
+    """
+    args = vars(build_parser().parse_args(argv))
+    command = args.pop("command")
+    ctx = Context(km, chains, config)
+    if command == "daemon":
+        from utils.daemon import Daemon, DEFAULT_SOCKET, DEFAULT_IDLE_TIMEOUT
+        idle_timeout = args["idle_timeout"] if args["idle_timeout"] is not None else DEFAULT_IDLE_TIMEOUT
+        Daemon(ctx, config["KEYS_PATH"], args["socket"] or DEFAULT_SOCKET, idle_timeout).serve()
+        return 0
+    if command == "run":
+        jobs = [(job.get("command"), job) for job in load_jobs(args["job_file"])]
+    else:
+        jobs = [(command, args)]
+
+    failed = False
+    for job_command, params in jobs:
+        for record in run_job(ctx, job_command, params):
+            failed = failed or "error" in record
+            out.write(json.dumps(record) + "\n")
+            out.flush()
+    return 1 if failed else 0
@@ -0,0 +1,218 @@
+import os
+import typing
+
+from eth_keys import keys
+from eth_utils import keccak as _eth_keccak
+
+try:
+    from Crypto.Hash import keccak as _keccak_module
+except ImportError:  # pycryptodome is optional, eth_hash picks another implementation
+    _keccak_module = None
+
+try:
+    import coincurve
+except ImportError:
+    coincurve = None
+
+
+# secp256k1
+P = 0xFFFFFFFFFFFFFFFFFFFFFFFFFFFFFFFFFFFFFFFFFFFFFFFFFFFFFFFEFFFFFC2F
+N = 0xFFFFFFFFFFFFFFFFFFFFFFFFFFFFFFFEBAAEDCE6AF48A03BBFD25E8CD0364141
+G = (
+    0x79BE667EF9DCBBAC55A06295CE870B07029BFCDB2DCE28D959F2815B16F81798,
+    0x483ADA7726A3C4655DA4FBFC0E1108A8FD17B448A68554199C47D08FFB10D4B8,
+)
+# Bits per window of the fixed-base table of the Python backend, 32 windows of 255 points
+WINDOW = 8
+# Overrides the backend chosen by default
+BACKEND_ENV = "EVMACCS_CRYPTO_BACKEND"
+
+Point = typing.Tuple[int, int]
+PublicKeys = typing.Callable[[typing.Sequence[bytes]], typing.List[bytes]]
+
+
+def keccak(data: bytes) -> bytes:
+    if _keccak_module is not None:
+        return _keccak_module.new(digest_bits=256, data=data).digest()
+    return _eth_keccak(data)
+
+
+def private_key_bytes(private_key: typing.Union[str, bytes]) -> bytes:
+    """
+    Return the 32 bytes of a hex (with or without 0x) or raw private key, checked against the curve order.
+    """
+    if isinstance(private_key, str):
+        private_key = bytes.fromhex(private_key.removeprefix("0x"))
+    private_key = bytes(private_key)
+    if len(private_key) != 32 or not 0 < int.from_bytes(private_key, "big") < N:
+        raise ValueError("Invalid private key.")
+    return private_key
+
+
+def new_private_key() -> str:
+    """
+    Return a random private key as hex without 0x, like LocalAccount.key.hex().
+    """
+    while True:
+        private_key = os.urandom(32)
+        # Out of the curve order, ~2^-128 chance
+        if 0 < int.from_bytes(private_key, "big") < N:
+            return private_key.hex()
+
+
+def checksum_address(address: bytes) -> str:
+    """
+    EIP-55 address of 20 raw bytes.
+    """
+    lower = address.hex()
+    digest = keccak(lower.encode()).hex()
+    return "0x" + "".join(c.upper() if int(h, 16) >= 8 else c for c, h in zip(lower, digest))
+
+
+# -- backends: private keys -> 64-byte uncompressed public keys -- #
+
+def _coincurve_public_keys(private_keys: typing.Sequence[bytes]) -> typing.List[bytes]:
+    from_secret = coincurve.PublicKey.from_valid_secret
+    return [from_secret(private_key).format(compressed=False)[1:] for private_key in private_keys]
+
+
+def _eth_keys_public_keys(private_keys: typing.Sequence[bytes]) -> typing.List[bytes]:
+    return [keys.PrivateKey(private_key).public_key.to_bytes() for private_key in private_keys]
+
+
+def _add(a: typing.Optional[Point], b: typing.Optional[Point]) -> typing.Optional[Point]:
+    # Affine addition, only used to build the table
+    if a is None:
+        return b
+    if b is None:
+        return a
+    if a[0] == b[0]:
+        if (a[1] + b[1]) % P == 0:
+            return None
+        slope = 3 * a[0] * a[0] * pow(2 * a[1], -1, P) % P
+    else:
+        slope = (b[1] - a[1]) * pow(b[0] - a[0], -1, P) % P
+    x = (slope * slope - a[0] - b[0]) % P
+    return x, (slope * (a[0] - x) - a[1]) % P
+
+
+_table: typing.List[typing.List[typing.Optional[Point]]] = []
+
+
+def _fixed_base_table() -> typing.List[typing.List[typing.Optional[Point]]]:
+    # table[i][d] = d * 2^(WINDOW * i) * G, built once (~8k additions)
+    if not _table:
+        base: typing.Optional[Point] = G
+        for _ in range(256 // WINDOW):
+            row = [None, base]
+            for _ in range(2, 1 << WINDOW):
+                row.append(_add(row[-1], base))
+            _table.append(row)
+            base = _add(row[-1], base)
+    return _table
+
+
+def _python_public_keys(private_keys: typing.Sequence[bytes]) -> typing.List[bytes]:
+    """
+    Pure Python: one mixed Jacobian + affine addition per non-zero window, no
+    doublings, and one modular inversion for the whole batch (Montgomery's trick).
+    """
+    table = _fixed_base_table()
+    mask = (1 << WINDOW) - 1
+    points = []
+    for private_key in private_keys:
+        scalar = int.from_bytes(private_key, "big")
+        X = Y = Z = None
+        i = 0
+        while scalar:
+            digit = scalar & mask
+            scalar >>= WINDOW
+            if digit:
+                x2, y2 = table[i][digit]
+                if Z is None:
+                    X, Y, Z = x2, y2, 1
+                else:
+                    Z1Z1 = Z * Z % P
+                    H = (x2 * Z1Z1 - X) % P
+                    r = (y2 * Z * Z1Z1 - Y) % P
+                    if H == 0:
+                        # Same x as the accumulated point, impossible for scalars below N, kept for safety
+                        inverse = pow(Z, -1, P)
+                        x, y = _add((X * inverse * inverse % P, Y * inverse ** 3 % P), (x2, y2))
+                        X, Y, Z = x, y, 1
+                    else:
+                        HH = H * H % P
+                        HHH = H * HH % P
+                        V = X * HH % P
+                        X = (r * r - HHH - 2 * V) % P
+                        Y = (r * (V - X) - Y * HHH) % P
+                        Z = Z * H % P
+            i += 1
+        points.append((X, Y, Z))
+
+    # Batch inversion of every Z
+    prefix = [1]
+    for _, _, Z in points:
+        prefix.append(prefix[-1] * Z % P)
+    inverse = pow(prefix[-1], -1, P)
+    public_keys = [b""] * len(points)
+    for j in range(len(points) - 1, -1, -1):
+        X, Y, Z = points[j]
+        z_inverse = inverse * prefix[j] % P
+        inverse = inverse * Z % P
+        zz = z_inverse * z_inverse % P
+        public_keys[j] = (X * zz % P).to_bytes(32, "big") + (Y * zz * z_inverse % P).to_bytes(32, "big")
+    return public_keys
+
+
+# Fastest first
+BACKENDS: typing.Dict[str, PublicKeys] = {}
+if coincurve is not None:
+    BACKENDS["coincurve"] = _coincurve_public_keys
+BACKENDS["python"] = _python_public_keys
+# eth_keys uses coincurve when it is installed, its own pure Python code otherwise
+BACKENDS["eth_keys"] = _eth_keys_public_keys
+
+
+def get_backend(name: typing.Optional[str] = None) -> typing.Tuple[str, PublicKeys]:
+    """
+    Return (name, public key function) of a backend: name, EVMACCS_CRYPTO_BACKEND, or the fastest available.
+    """
+    name = name or os.getenv(BACKEND_ENV) or next(iter(BACKENDS))
+    if name not in BACKENDS:
+        raise ValueError(f"Unknown or unavailable crypto backend: {name} (available: {', '.join(BACKENDS)})")
+    return name, BACKENDS[name]
+
+
+def derive_addresses(
+    private_keys: typing.Iterable[typing.Union[str, bytes]],
+    backend: typing.Optional[str] = None,
+    checksum: bool = True,
+) -> typing.List[str]:
+    """
+    Derive the addresses of many private keys without building LocalAccount objects.
+
+    Args:
+    private_keys (Iterable): Hex (with or without 0x) or raw private keys.
+    backend (Optional[str]): Backend name, see get_backend().
+    checksum (bool): EIP-55 addresses, lowercase hex with 0x otherwise.
+
+    Returns:
+    List[str]: Addresses in the order of private_keys.
+    """
+    _, public_keys = get_backend(backend)
+    raw = [keccak(public_key)[12:] for public_key in public_keys([private_key_bytes(key) for key in private_keys])]
+    if checksum:
+        return [checksum_address(address) for address in raw]
+    return ["0x" + address.hex() for address in raw]
+
+
+def to_address(private_key: typing.Union[str, bytes], backend: typing.Optional[str] = None) -> str:
+    return derive_addresses([private_key], backend)[0]
+
+
+def address_map(private_keys: typing.Mapping[str, typing.Union[str, bytes]], backend: typing.Optional[str] = None) -> typing.Dict[str, str]:
+    """
+    Return name -> checksum address of name -> private key, derived in one batch.
+    """
+    return dict(zip(private_keys, derive_addresses(private_keys.values(), backend)))
@@ -0,0 +1,202 @@
+import json
+import os
+import socket
+import socketserver
+import sys
+import tempfile
+import threading
+import time
+import typing
+
+
+DEFAULT_SOCKET = os.path.join(tempfile.gettempdir(), f"evmaccs-{os.getuid() if hasattr(os, 'getuid') else 0}.sock")
+DEFAULT_IDLE_TIMEOUT = 900
+# Secrets dropped from the context config on lock
+TOKEN_KEYS = ("ENCRYPTION_TOKEN", "ENCRYPTION_TOKEN_PREVIOUS")
+
+
+class Daemon:
+    def __init__(self, ctx, keys_path: str, socket_path: str = DEFAULT_SOCKET, idle_timeout: float = DEFAULT_IDLE_TIMEOUT):
+        """
+        Initialize the daemon around an unlocked headless context.
+
+        The key manager, the chain registry and Web3 connections stay in memory
+        between requests. Commands run one at a time: they share the Web3
+        connection, the global metrics and the profiler. After idle_timeout
+        seconds without requests the key manager and the encryption token
+        are dropped, and the daemon has to be unlocked again with the current
+        token. Locking waits for the command in flight, a command never loses
+        its key manager halfway.
+
+        Args:
+        ctx (cli.Context): Context with an unlocked KeyManager.
+        keys_path (str): Keystore path, to reload the key manager on unlock.
+        socket_path (str): Unix socket to listen on.
+        idle_timeout (float): Seconds of inactivity before auto-lock, 0 disables it.
+        """
+        self.ctx = ctx
+        self.keys_path = keys_path
+        self.socket_path = socket_path
+        self.idle_timeout = idle_timeout
+        self.last_activity = time.monotonic()
+        self.command_lock = threading.Lock()
+        # Commands in flight, the key manager is only dropped when there are none
+        self.active = 0
+        self.idle = threading.Condition()
+        self.server: typing.Optional[socketserver.ThreadingUnixStreamServer] = None
+
+    @property
+    def locked(self) -> bool:
+        return self.ctx.km is None
+
+    def _drop_keys(self):
+        self.ctx.km = None
+        for key in TOKEN_KEYS:
+            self.ctx.config.pop(key, None)
+
+    def lock(self):
+        with self.idle:
+            self.idle.wait_for(lambda: self.active == 0)
+            self._drop_keys()
+
+    def _lock_if_idle(self) -> bool:
+        with self.idle:
+            if self.active or self.locked or time.monotonic() - self.last_activity <= self.idle_timeout:
+                return False
+            self._drop_keys()
+            return True
+
+    def unlock(self, token: str):
+        from utils.account import KeyManager
+        if not token:
+            raise ValueError("unlock needs the encryption token.")
+        with self.command_lock:
+            # Only the current token unlocks, a previous one must not
+            km = KeyManager(self.keys_path, token)
+            # A wrong token is only noticed on decrypt
+            name = next(iter(km.keys), None)
+            if name is not None and km.get_decrypted_key(name) is None:
+                raise ValueError("Invalid encryption token.")
+            with self.idle:
+                self.ctx.km = km
+                self.ctx.config["ENCRYPTION_TOKEN"] = token
+
+    def handle(self, request: typing.Dict[str, typing.Any]) -> typing.Any:
+        from utils.cli import COMMANDS, run_job
+
+        self.last_activity = time.monotonic()
+        method = request.get("method")
+        params = request.get("params") or {}
+        match method:
+            case "status":
+                return {"locked": self.locked, "pid": os.getpid(), "idle_timeout": self.idle_timeout}
+            case "lock":
+                self.lock()
+                return {"locked": True}
+            case "unlock":
+                self.unlock(params.get("token"))
+                return {"locked": False}
+            case "shutdown":
+                threading.Thread(target=self.server.shutdown, daemon=True).start()
+                return {"shutdown": True}
+        if method not in COMMANDS:
+            raise ValueError(f"Unknown method: {method}")
+        with self.idle:
+            if self.locked and method != "chains":
+                raise ValueError("Daemon is locked, call unlock first.")
+            self.active += 1
+        try:
+            with self.command_lock:
+                return list(run_job(self.ctx, method, params))
+        finally:
+            with self.idle:
+                self.active -= 1
+                self.last_activity = time.monotonic()
+                self.idle.notify_all()
+
+    def _watch_idle(self):
+        while True:
+            time.sleep(1)
+            if self.idle_timeout and self._lock_if_idle():
+                print("Idle timeout, keys locked.")
+
+    def serve(self):
+        daemon = self
+
+        class Handler(socketserver.StreamRequestHandler):
+            def handle(self):
+                for line in self.rfile:
+                    if not line.strip():
+                        continue
+                    request_id = None
+                    try:
+                        request = json.loads(line)
+                        request_id = request.get("id")
+                        response = {"jsonrpc": "2.0", "id": request_id, "result": daemon.handle(request)}
+                    except Exception as e:
+                        response = {"jsonrpc": "2.0", "id": request_id, "error": {"code": -32000, "message": str(e)}}
+                    self.wfile.write((json.dumps(response) + "\n").encode())
+                    self.wfile.flush()
+
+        if os.path.exists(self.socket_path):
+            os.unlink(self.socket_path)
+        # Owner only from bind on, chmod after listen would leave a window for other users
+        umask = os.umask(0o177)
+        try:
+            self.server = socketserver.ThreadingUnixStreamServer(self.socket_path, Handler)
+        finally:
+            os.umask(umask)
+        self.server.daemon_threads = True
+        threading.Thread(target=self._watch_idle, daemon=True).start()
+        print(f"Listening on {self.socket_path}")
+        try:
+            self.server.serve_forever()
+        finally:
+            self.server.server_close()
+            if os.path.exists(self.socket_path):
+                os.unlink(self.socket_path)
+
+
+def call(method: str, params: typing.Optional[typing.Dict[str, typing.Any]] = None, socket_path: str = DEFAULT_SOCKET) -> typing.Any:
+    """
+    Send one request to a running daemon and return its result.
+    """
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+        sock.connect(socket_path)
+        request = {"jsonrpc": "2.0", "id": 1, "method": method, "params": params or {}}
+        sock.sendall((json.dumps(request) + "\n").encode())
+        with sock.makefile("r") as file:
+            response = json.loads(file.readline())
+    if "error" in response:
+        raise RuntimeError(response["error"]["message"])
+    return response["result"]
+
+
+def client(argv: typing.List[str]) -> int:
+    """
+    Thin client: python -m utils.daemon <method> [params JSON] [--socket path]
+
+    Only needs the standard library, so it starts in milliseconds.
+    """
+    socket_path = DEFAULT_SOCKET
+    if "--socket" in argv:
+        i = argv.index("--socket")
+        socket_path = argv[i + 1]
+        argv = argv[:i] + argv[i + 2:]
+    if not argv:
+        print(client.__doc__.strip(), file=sys.stderr)
+        return 2
+    params = json.loads(argv[1]) if len(argv) > 1 else {}
+    try:
+        result = call(argv[0], params, socket_path)
+    except (OSError, RuntimeError) as e:
+        print(json.dumps({"error": str(e)}))
+        return 1
+    records = result if isinstance(result, list) else [result]
+    for record in records:
+        print(json.dumps(record))
+    return 1 if any("error" in record for record in records) else 0
+
+
+if __name__ == "__main__":
+    sys.exit(client(sys.argv[1:]))
@@ -0,0 +1,329 @@
+import json
+import typing
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+
+# Balances are kept exact as 4 little-endian 32-bit limbs, sums of limbs fit uint64 up to 2**32 rows
+LIMBS = 4
+LIMB_BITS = 32
+LIMB_MASK = (1 << LIMB_BITS) - 1
+MAX_BALANCE = (1 << (LIMBS * LIMB_BITS)) - 1
+NATIVE = ""
+# Columns stored as codes into a list of labels
+LABELS = ("account", "batch", "chain", "token", "asset")
+GROUP_KEYS = ("account", "batch", "chainId", "token", "asset")
+
+Row = typing.Dict[str, typing.Any]
+
+
+def _require_numpy():
+    if np is None:
+        raise ValueError("numpy is required for balance datasets, install it with: pip install numpy")
+
+
+def _to_limbs(values: typing.Sequence[int]):
+    if values and (min(values) < 0 or max(values) > MAX_BALANCE):
+        raise ValueError("Balance out of the 128-bit range")
+    # Object arrays shift Python ints in a C loop
+    objects = np.array(values, dtype=object)
+    return np.stack([((objects >> (j * LIMB_BITS)) & LIMB_MASK).astype(np.uint32) for j in range(LIMBS)], axis=1).reshape(-1, LIMBS)
+
+
+def _decimals(row: Row) -> int:
+    return 18 if row.get("decimals") is None else int(row["decimals"])
+
+
+def _from_limb_sums(sums, bits: int = LIMB_BITS) -> typing.List[int]:
+    # sums: (groups, limbs), carries are resolved with Python ints once per group
+    return [sum(int(limb) << (j * bits) for j, limb in enumerate(row)) for row in sums.tolist()]
+
+
+def _sum_by_group(limbs, inverse, groups: int):
+    # bincount sums in float64, 16-bit halves of the limbs keep every sum below 2**53 up to 2**37 rows
+    halves = [half for j in range(limbs.shape[1]) for half in (limbs[:, j] & 0xFFFF, limbs[:, j] >> 16)]
+    return np.stack([np.bincount(inverse, weights=half, minlength=groups) for half in halves], axis=1)
+
+
+def _encode(values: typing.Sequence[typing.Any]) -> typing.Tuple[typing.Any, typing.List[typing.Any]]:
+    labels: typing.Dict[typing.Any, int] = {}
+    codes = np.fromiter((labels.setdefault(value, len(labels)) for value in values), dtype=np.int32, count=len(values))
+    return codes, list(labels)
+
+
+class BalanceDataset:
+    def __init__(self, columns: typing.Dict[str, typing.Any], labels: typing.Dict[str, typing.List[typing.Any]]):
+        """
+        Column arrays of account balances across chains and tokens, one row per (account, chain, token).
+
+        Columns: account, batch, chain, token, asset (int32 codes into labels),
+        chainId (int64), address ((n, 20) uint8), balance ((n, 4) uint32 limbs, exact
+        wei), decimals (uint8), amount (float64, balance in token units) and
+        block (int64, 0 when unknown). Aggregations work on whole columns and
+        only go back to Python per group.
+
+        Args:
+        columns (dict): Column name -> numpy array.
+        labels (dict): Coded column name -> labels.
+        """
+        _require_numpy()
+        self.columns = columns
+        self.labels = labels
+
+    def __len__(self) -> int:
+        return len(self.columns["chainId"])
+
+    # -- build -- #
+
+    @classmethod
+    def from_rows(cls, rows: typing.Iterable[Row], chain_names: typing.Optional[typing.Dict[int, str]] = None) -> "BalanceDataset":
+        """
+        Build a dataset from balance rows, e.g. portfolio scan results.
+
+        Rows need account, address, chainId and balance, and may have token
+        (native when empty), asset, decimals (18 by default) and block. Rows
+        with an error are skipped.
+        """
+        _require_numpy()
+        rows = [row for row in rows if "error" not in row and row.get("balance") is not None]
+        chain_names = chain_names or {}
+        chain_ids = [int(row["chainId"]) for row in rows]
+        accounts, account_labels = _encode([row.get("account") or row["address"] for row in rows])
+        batches, batch_labels = _encode([(row.get("account") or "").split("_")[0] for row in rows])
+        chains, chain_labels = _encode([row.get("chain") or chain_names.get(chain_id) or str(chain_id) for row, chain_id in zip(rows, chain_ids)])
+        tokens, token_labels = _encode([(row.get("token") or NATIVE).lower() for row in rows])
+        assets, asset_labels = _encode([row.get("asset") or row.get("symbol") or "" for row in rows])
+        balances = [int(row["balance"]) for row in rows]
+        decimals = [_decimals(row) for row in rows]
+        columns = {
+            "account": accounts,
+            "batch": batches,
+            "chain": chains,
+            "chainId": np.array(chain_ids, dtype=np.int64),
+            "token": tokens,
+            "asset": assets,
+            # Not S20, numpy strips trailing zero bytes of fixed-width strings
+            "address": np.frombuffer(b"".join(bytes.fromhex(row["address"][2:]) for row in rows), dtype=np.uint8).reshape(-1, 20),
+            "balance": _to_limbs(balances),
+            "decimals": np.array(decimals, dtype=np.uint8),
+            "amount": np.array([balance / 10 ** digits for balance, digits in zip(balances, decimals)], dtype=np.float64),
+            "block": np.fromiter((int(row.get("block") or 0) for row in rows), dtype=np.int64, count=len(rows)),
+        }
+        labels = {"account": account_labels, "batch": batch_labels, "chain": chain_labels, "token": token_labels, "asset": asset_labels}
+        return cls(columns, labels)
+
+    @classmethod
+    def from_snapshots(
+        cls,
+        store,
+        addresses: typing.Dict[str, str],
+        chain_id: typing.Optional[int] = None,
+        symbols: typing.Optional[typing.Dict[int, str]] = None,
+        decimals: typing.Optional[typing.Dict[typing.Tuple[int, str], int]] = None,
+    ) -> "BalanceDataset":
+        """
+        Build a dataset from the snapshot store joined with the account registry.
+
+        Args:
+        store (SnapshotStore): Local balance snapshots.
+        addresses (dict): Account name -> address, rows of other addresses are skipped.
+        chain_id (Optional[int]): Only this chain, every stored chain by default.
+        symbols (Optional[dict]): chainId -> native symbol.
+        decimals (Optional[dict]): (chainId, token) -> decimals of tokens, 18 by default.
+        """
+        names = {address.lower(): name for name, address in addresses.items()}
+        symbols = symbols or {}
+        decimals = decimals or {}
+        rows = []
+        for row_chain, address, token, balance, block in store.rows(chain_id):
+            if address not in names:
+                continue
+            rows.append({
+                "account": names[address],
+                "address": address,
+                "chainId": row_chain,
+                "token": token,
+                "asset": symbols.get(row_chain, "") if token == NATIVE else token,
+                "balance": balance,
+                "decimals": decimals.get((row_chain, token), 18),
+                "block": block,
+            })
+        return cls.from_rows(rows)
+
+    # -- files -- #
+
+    def to_npz(self, path: str) -> str:
+        """
+        Write every column and the labels (as JSON) to a compressed .npz file.
+        """
+        np.savez_compressed(path, labels=np.array(json.dumps(self.labels)), **self.columns)
+        return path if path.endswith(".npz") else path + ".npz"
+
+    @classmethod
+    def from_npz(cls, path: str) -> "BalanceDataset":
+        _require_numpy()
+        with np.load(path, allow_pickle=False) as data:
+            labels = json.loads(str(data["labels"]))
+            columns = {name: data[name] for name in data.files if name != "labels"}
+        return cls(columns, labels)
+
+    def to_parquet(self, path: str) -> str:
+        """
+        Write a Parquet file, coded columns as dictionary arrays and balance as decimal wei strings.
+
+        Needs pyarrow.
+        """
+        try:
+            import pyarrow as pa
+            import pyarrow.parquet as pq
+        except ImportError:
+            raise ValueError("pyarrow is required for Parquet export, install it with: pip install pyarrow")
+        arrays = {}
+        for name in LABELS:
+            arrays[name] = pa.DictionaryArray.from_arrays(pa.array(self.columns[name]), pa.array(self.labels[name]))
+        arrays["chainId"] = pa.array(self.columns["chainId"])
+        arrays["address"] = pa.array(["0x" + address.tobytes().hex() for address in self.columns["address"]])
+        arrays["balance"] = pa.array([str(value) for value in self.balances()])
+        for name in ("decimals", "amount", "block"):
+            arrays[name] = pa.array(self.columns[name])
+        pq.write_table(pa.table(arrays), path)
+        return path
+
+    @classmethod
+    def from_parquet(cls, path: str) -> "BalanceDataset":
+        try:
+            import pyarrow.parquet as pq
+        except ImportError:
+            raise ValueError("pyarrow is required for Parquet import, install it with: pip install pyarrow")
+        table = pq.read_table(path).to_pydict()
+        rows = [dict(zip(table, values)) for values in zip(*table.values())]
+        return cls.from_rows(rows)
+
+    # -- aggregations -- #
+
+    def balances(self) -> typing.List[int]:
+        """
+        Return the exact balances as Python ints, for export only.
+        """
+        return _from_limb_sums(self.columns["balance"].astype(np.uint64))
+
+    def _group(self, by: typing.Sequence[str], mask=None):
+        """
+        Return (values per key, inverse) of the distinct combinations of the by columns.
+
+        Each column is reduced to dense codes and the codes are packed into
+        one int64, so grouping is a single 1-D unique.
+        """
+        for key in by:
+            if key not in GROUP_KEYS:
+                raise ValueError(f"Unknown group key: {key}")
+        packed = np.zeros(int(mask.sum()) if mask is not None else len(self), dtype=np.int64)
+        uniques = []
+        for key in by:
+            column = self.columns[key] if mask is None else self.columns[key][mask]
+            unique, codes = np.unique(column, return_inverse=True)
+            packed = packed * len(unique) + codes.reshape(-1)
+            uniques.append(unique)
+        groups, inverse = np.unique(packed, return_inverse=True)
+        values = []
+        for unique in reversed(uniques):
+            values.append(unique[groups % len(unique)])
+            groups = groups // len(unique)
+        return list(reversed(values)), inverse.reshape(-1)
+
+    def _label(self, key: str, values) -> typing.List[typing.Any]:
+        if key in LABELS:
+            return [self.labels[key][code] for code in values.tolist()]
+        return values.tolist()
+
+    def _mask(self, chain_id: typing.Optional[int] = None, token: typing.Optional[str] = None):
+        mask = np.ones(len(self), dtype=bool)
+        if chain_id is not None:
+            mask &= self.columns["chainId"] == int(chain_id)
+        if token is not None:
+            codes = [code for code, label in enumerate(self.labels["token"]) if label == token.lower()]
+            mask &= np.isin(self.columns["token"], codes)
+        return mask
+
+    def totals(self, by: typing.Sequence[str] = ("chainId", "asset")) -> typing.List[Row]:
+        """
+        Return exact totals, amounts and holder counts per group.
+
+        Args:
+        by (Sequence[str]): Group keys among account, batch, chainId, token, asset.
+        Totals across different assets only make sense for counts.
+
+        Returns:
+        List[dict]: One row per group, largest amount first.
+        """
+        if not len(self):
+            return []
+        values, inverse = self._group(by)
+        groups = len(values[0])
+        sums = _sum_by_group(self.columns["balance"], inverse, groups)
+        amounts = np.bincount(inverse, weights=self.columns["amount"], minlength=groups)
+        holders = np.bincount(inverse[self.columns["amount"] > 0], minlength=groups)
+        counts = np.bincount(inverse, minlength=groups)
+        labels = [self._label(key, column) for key, column in zip(by, values)]
+        rows = [
+            {
+                **{key: labels[k][i] for k, key in enumerate(by)},
+                "balance": total,
+                "amount": float(amounts[i]),
+                "holders": int(holders[i]),
+                "accounts": int(counts[i]),
+            }
+            for i, total in enumerate(_from_limb_sums(sums, 16))
+        ]
+        return sorted(rows, key=lambda row: row["amount"], reverse=True)
+
+    def top(self, n: int = 10, chain_id: typing.Optional[int] = None, token: typing.Optional[str] = None) -> typing.List[Row]:
+        """
+        Return the n largest holdings, optionally of one chain and token.
+        """
+        positions = np.flatnonzero(self._mask(chain_id, token))
+        if not len(positions):
+            return []
+        amounts = self.columns["amount"][positions]
+        if len(positions) > n:
+            # Partial selection, only the n winners get sorted
+            chosen = np.argpartition(-amounts, n - 1)[:n]
+        else:
+            chosen = np.arange(len(positions))
+        chosen = chosen[np.argsort(-amounts[chosen], kind="stable")]
+        return [self.row(int(positions[i])) for i in chosen]
+
+    def dust(self, threshold: float, by: typing.Sequence[str] = ("chainId", "asset")) -> typing.List[Row]:
+        """
+        Count holdings above zero but below threshold (in token units) per group.
+        """
+        mask = (self.columns["amount"] > 0) & (self.columns["amount"] < threshold)
+        if not mask.any():
+            return []
+        values, inverse = self._group(by, mask)
+        counts = np.bincount(inverse, minlength=len(values[0]))
+        amounts = np.bincount(inverse, weights=self.columns["amount"][mask], minlength=len(values[0]))
+        labels = [self._label(key, column) for key, column in zip(by, values)]
+        return [
+            {**{key: labels[k][i] for k, key in enumerate(by)}, "count": int(counts[i]), "amount": float(amounts[i])}
+            for i in range(len(values[0]))
+        ]
+
+    def row(self, i: int) -> Row:
+        balance = _from_limb_sums(self.columns["balance"][i:i + 1].astype(np.uint64))[0]
+        return {
+            "account": self.labels["account"][self.columns["account"][i]],
+            "batch": self.labels["batch"][self.columns["batch"][i]],
+            "chainId": int(self.columns["chainId"][i]),
+            "chain": self.labels["chain"][self.columns["chain"][i]],
+            "token": self.labels["token"][self.columns["token"][i]],
+            "asset": self.labels["asset"][self.columns["asset"][i]],
+            "address": "0x" + self.columns["address"][i].tobytes().hex(),
+            "balance": balance,
+            "decimals": int(self.columns["decimals"][i]),
+            "amount": float(self.columns["amount"][i]),
+            "block": int(self.columns["block"][i]),
+        }
@@ -0,0 +1,234 @@
+import typing
+from decimal import Decimal
+
+from eth_account import Account
+from web3 import Web3
+
+from utils.abi import get_abi
+from utils.journal import journal
+
+
+# Disperse (disperse.app), deployed at the same address on most EVM chains
+DISPERSE_ADDRESS = "0xD152f549545093347A162Dce210e7293f1452150"
+DISPERSE_ABI = [
+    {
+        "name": "disperseEther",
+        "type": "function",
+        "stateMutability": "payable",
+        "inputs": [
+            {"name": "recipients", "type": "address[]"},
+            {"name": "values", "type": "uint256[]"},
+        ],
+        "outputs": [],
+    },
+    {
+        "name": "disperseToken",
+        "type": "function",
+        "stateMutability": "nonpayable",
+        "inputs": [
+            {"name": "token", "type": "address"},
+            {"name": "recipients", "type": "address[]"},
+            {"name": "values", "type": "uint256[]"},
+        ],
+        "outputs": [],
+    },
+]
+ERC20_ABI = [
+    {
+        "name": "allowance",
+        "type": "function",
+        "stateMutability": "view",
+        "inputs": [{"name": "owner", "type": "address"}, {"name": "spender", "type": "address"}],
+        "outputs": [{"name": "", "type": "uint256"}],
+    },
+    {
+        "name": "approve",
+        "type": "function",
+        "stateMutability": "nonpayable",
+        "inputs": [{"name": "spender", "type": "address"}, {"name": "amount", "type": "uint256"}],
+        "outputs": [{"name": "", "type": "bool"}],
+    },
+    {
+        "name": "decimals",
+        "type": "function",
+        "stateMutability": "view",
+        "inputs": [],
+        "outputs": [{"name": "", "type": "uint8"}],
+    },
+]
+# Share of the block gas limit a single chunk may use
+GAS_FILL = 0.5
+MAX_BATCH_SIZE = 500
+# Chunk size used to measure the gas cost of one more recipient
+PROBE_SIZE = 10
+GAS_BUFFER = 1.2
+
+Recipient = typing.Tuple[str, int]
+
+
+def load_recipients(path: str, decimals: int = 18) -> typing.List[Recipient]:
+    """
+    Read "address amount" or "address,amount" lines, amounts in ether or tokens.
+    Empty lines and lines starting with # are ignored.
+    """
+    recipients = []
+    with open(path, 'r') as file:
+        for number, line in enumerate(file, start=1):
+            line = line.strip()
+            if not line or line.startswith("#"):
+                continue
+            parts = line.replace(",", " ").split()
+            if len(parts) != 2 or not Web3.is_address(parts[0]):
+                raise ValueError(f"Invalid line {number}: {line}")
+            recipients.append((Web3.to_checksum_address(parts[0]), int(Decimal(parts[1]) * 10 ** decimals)))
+    return recipients
+
+
+def _abi(w3, address: str, function: str, default: typing.List[dict]) -> typing.List[dict]:
+    # ABIs in data/<chainId>/ win over the built-in ones
+    abi = get_abi(address, w3.eth.chain_id)
+    if abi and function in abi.list_functions():
+        return abi.abi
+    return default
+
+
+class Distributor:
+    def __init__(
+        self,
+        w3,
+        private_key: str,
+        fees: typing.Dict[str, int],
+        contract_address: str = DISPERSE_ADDRESS,
+        token: typing.Optional[str] = None,
+    ):
+        """
+        One-to-many transfers packed into disperse contract calls.
+
+        Args:
+        w3 (Web3): Connected Web3 instance.
+        private_key (str): Key of the funding account.
+        fees (dict): Fee fields, from FeeOracle.fees().
+        contract_address (str): Disperse-style contract with disperseEther/disperseToken.
+        token (Optional[str]): ERC20 token address, native token when None.
+        """
+        self.w3 = w3
+        self.account = Account.from_key(private_key)
+        self.fees = fees
+        self.chain_id = w3.eth.chain_id
+        self.contract_address = Web3.to_checksum_address(contract_address)
+        function = "disperseToken" if token else "disperseEther"
+        self.contract = w3.eth.contract(address=self.contract_address, abi=_abi(w3, contract_address, function, DISPERSE_ABI))
+        self.token = None
+        if token:
+            self.token = w3.eth.contract(address=Web3.to_checksum_address(token), abi=_abi(w3, token, "approve", ERC20_ABI))
+        self.nonce = w3.eth.get_transaction_count(self.account.address, "pending")
+
+    def _function(self, chunk: typing.Sequence[Recipient]):
+        recipients = [address for address, _ in chunk]
+        values = [value for _, value in chunk]
+        if self.token is not None:
+            return self.contract.functions.disperseToken(self.token.address, recipients, values)
+        return self.contract.functions.disperseEther(recipients, values)
+
+    def _params(self, chunk: typing.Sequence[Recipient]) -> typing.Dict[str, typing.Any]:
+        value = 0 if self.token is not None else sum(value for _, value in chunk)
+        return {"from": self.account.address, "value": value, "chainId": self.chain_id, **self.fees}
+
+    def estimate(self, chunk: typing.Sequence[Recipient]) -> int:
+        return self._function(chunk).estimate_gas(self._params(chunk))
+
+    def fit_batch_size(self, recipients: typing.Sequence[Recipient], gas_fill: float = GAS_FILL, max_size: int = MAX_BATCH_SIZE) -> int:
+        """
+        Return the number of recipients per call that fits gas_fill of the block gas limit.
+
+        The base cost and the cost per recipient come from two gas estimates.
+        """
+        if len(recipients) <= 1:
+            return max(len(recipients), 1)
+        probe = recipients[:min(PROBE_SIZE, len(recipients))]
+        one = self.estimate(probe[:1])
+        many = self.estimate(probe)
+        per_recipient = max((many - one) / (len(probe) - 1), 1)
+        budget = self.w3.eth.get_block("latest")["gasLimit"] * gas_fill
+        size = int((budget - (one - per_recipient)) / per_recipient)
+        return max(1, min(size, max_size, len(recipients)))
+
+    def _send(self, function, params: typing.Dict[str, typing.Any]) -> str:
+        params = {**params, "nonce": self.nonce}
+        tx = function.build_transaction(params)
+        tx["gas"] = int(self.w3.eth.estimate_gas(tx) * GAS_BUFFER)
+        signed = self.account.sign_transaction(tx)
+        tx_hash = self.w3.eth.send_raw_transaction(signed.raw_transaction)
+        journal.record(self.chain_id, self.account.address, tx, tx_hash)
+        self.nonce += 1
+        return "0x" + tx_hash.hex().removeprefix("0x")
+
+    def approve(self, total: int, timeout: float = 120) -> typing.Optional[str]:
+        """
+        Let the contract spend total tokens, only when the allowance is too low.
+        """
+        if self.token is None:
+            return None
+        if self.token.functions.allowance(self.account.address, self.contract_address).call() >= total:
+            return None
+        tx_hash = self._send(self.token.functions.approve(self.contract_address, total), {
+            "from": self.account.address, "chainId": self.chain_id, **self.fees
+        })
+        receipt = self.w3.eth.wait_for_transaction_receipt(tx_hash, timeout=timeout)
+        if receipt["status"] != 1:
+            raise ValueError(f"Approve transaction {tx_hash} failed")
+        return tx_hash
+
+    def distribute(
+        self,
+        recipients: typing.Sequence[Recipient],
+        batch_size: typing.Optional[int] = None,
+        wait: bool = True,
+        timeout: float = 120,
+        on_chunk: typing.Optional[typing.Callable[[typing.Dict[str, typing.Any]], None]] = None,
+    ) -> typing.List[typing.Dict[str, typing.Any]]:
+        """
+        Send all transfers in as few contract calls as fit the block gas limit.
+
+        A chunk that fails or reverts stops the distribution, the remaining
+        chunks are reported as skipped.
+
+        Args:
+        recipients (Sequence): (address, amount in wei or token units) pairs.
+        batch_size (Optional[int]): Recipients per call, fitted to the block gas limit by default.
+        wait (bool): Wait for each chunk receipt before sending the next one.
+        timeout (float): Seconds to wait for a receipt.
+        on_chunk (Callable): Called with each chunk row, for progress.
+
+        Returns:
+        List[dict]: One row per chunk with status mined, sent, failed or skipped.
+        """
+        recipients = list(recipients)
+        if not recipients:
+            return []
+        self.approve(sum(value for _, value in recipients), timeout)
+        batch_size = batch_size or self.fit_batch_size(recipients)
+        chunks = [recipients[i:i + batch_size] for i in range(0, len(recipients), batch_size)]
+
+        rows = []
+        stopped = False
+        for index, chunk in enumerate(chunks, start=1):
+            row = {"chunk": index, "chunks": len(chunks), "recipients": len(chunk), "value": sum(value for _, value in chunk)}
+            if stopped:
+                row["status"] = "skipped"
+            else:
+                try:
+                    row["hash"] = self._send(self._function(chunk), self._params(chunk))
+                    row["status"] = "sent"
+                    if wait:
+                        receipt = self.w3.eth.wait_for_transaction_receipt(row["hash"], timeout=timeout)
+                        row["gasUsed"] = receipt["gasUsed"]
+                        row["status"] = "mined" if receipt["status"] == 1 else "failed"
+                except Exception as e:
+                    row["status"] = "failed"
+                    row["error"] = str(e)
+                stopped = row["status"] == "failed"
+            rows.append(row)
+            if on_chunk:
+                on_chunk(row)
+        return rows
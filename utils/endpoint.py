@@ -0,0 +1,133 @@
+import os
+import re
+import threading
+import time
+import typing
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+
+from utils.mixed_chains_loader import SOURCE
+
+
+PROBE_TIMEOUT = 3.0
+# Endpoints this many blocks behind the best head are considered stale
+STALE_BLOCKS = 5
+TEMPLATE_REGEX = re.compile(r"\$\{(\w+)\}")
+
+
+class ProbeResult(typing.NamedTuple):
+    url: str
+    latency: typing.Optional[float] = None
+    chain_id: typing.Optional[int] = None
+    block: typing.Optional[int] = None
+    error: typing.Optional[str] = None
+
+
+# Probe results of this session, by chain ID
+_session_probes: typing.Dict[str, typing.List[ProbeResult]] = {}
+_registry_rpcs: typing.Optional[typing.Dict[str, typing.List[str]]] = None
+_lock = threading.Lock()
+
+
+def expand_url(url: str) -> typing.Optional[str]:
+    """
+    Fill ${VAR} templates from the environment, None if a variable is missing.
+    """
+    missing = [name for name in TEMPLATE_REGEX.findall(url) if not os.getenv(name)]
+    if missing:
+        return None
+    return TEMPLATE_REGEX.sub(lambda m: os.getenv(m.group(1)), url)
+
+
+def registry_rpcs(timeout: float = PROBE_TIMEOUT) -> typing.Dict[str, typing.List[str]]:
+    """
+    Return the public RPC lists of chainid.network by chain ID, fetched once per session.
+    """
+    global _registry_rpcs
+    with _lock:
+        if _registry_rpcs is None:
+            try:
+                response = requests.get(SOURCE, timeout=timeout)
+                response.raise_for_status()
+                _registry_rpcs = {str(chain.get("chainId")): chain.get("rpc", []) for chain in response.json()}
+            except (requests.RequestException, ValueError) as e:
+                print(f"Error fetching public RPC list: {e}")
+                _registry_rpcs = {}
+        return _registry_rpcs
+
+
+def candidates(chains, chain_id: str, include_registry: bool = True) -> typing.List[str]:
+    """
+    Return every usable HTTP endpoint known for a chain, configured ones first.
+    """
+    urls = chains.get_rpc_urls(chain_id)
+    if include_registry:
+        urls += registry_rpcs().get(str(chain_id), [])
+    result = []
+    for url in urls:
+        url = expand_url(url) if url else None
+        if url and url.startswith("http") and url not in result:
+            result.append(url)
+    return result
+
+
+def probe(url: str, timeout: float = PROBE_TIMEOUT) -> ProbeResult:
+    """
+    Ask an endpoint for eth_chainId and eth_blockNumber in one batch and time the round trip.
+    """
+    payload = [
+        {"jsonrpc": "2.0", "id": 1, "method": "eth_chainId", "params": []},
+        {"jsonrpc": "2.0", "id": 2, "method": "eth_blockNumber", "params": []},
+    ]
+    started = time.perf_counter()
+    try:
+        response = requests.post(url, json=payload, timeout=timeout)
+        response.raise_for_status()
+        body = response.json()
+        if not isinstance(body, list):
+            # No batch support, ask one by one
+            body = [requests.post(url, json=item, timeout=timeout).json() for item in payload]
+        latency = time.perf_counter() - started
+        results = {item.get("id"): item.get("result") for item in body}
+        return ProbeResult(url, latency, int(results[1], 16), int(results[2], 16))
+    except (requests.RequestException, ValueError, KeyError, TypeError) as e:
+        return ProbeResult(url, error=str(e) or type(e).__name__)
+
+
+def race(urls: typing.List[str], chain_id: str, timeout: float = PROBE_TIMEOUT, max_workers: int = 32) -> typing.List[ProbeResult]:
+    """
+    Probe endpoints in parallel and rank them.
+
+    Endpoints with another chain ID or a head more than STALE_BLOCKS behind
+    the best one get an error, the others are sorted by latency.
+    """
+    if not urls:
+        return []
+    with ThreadPoolExecutor(max_workers=min(max_workers, len(urls))) as executor:
+        results = list(executor.map(lambda url: probe(url, timeout), urls))
+
+    healthy = [r for r in results if r.error is None]
+    best_block = max((r.block for r in healthy if r.chain_id == int(chain_id)), default=0)
+    ranked = []
+    for r in results:
+        if r.error is None and r.chain_id != int(chain_id):
+            r = r._replace(error=f"wrong chain ID {r.chain_id}")
+        elif r.error is None and r.block < best_block - STALE_BLOCKS:
+            r = r._replace(error=f"stale head, {best_block - r.block} blocks behind")
+        ranked.append(r)
+    return sorted(ranked, key=lambda r: (r.error is not None, r.latency or 0))
+
+
+def fastest(chains, chain_id: str, refresh: bool = False, include_registry: bool = True) -> typing.Tuple[typing.Optional[str], typing.List[ProbeResult]]:
+    """
+    Return the lowest-latency healthy endpoint of a chain and all probe results.
+
+    Results are remembered for the session, pass refresh=True to probe again.
+    """
+    chain_id = str(chain_id)
+    if refresh or chain_id not in _session_probes:
+        _session_probes[chain_id] = race(candidates(chains, chain_id, include_registry), chain_id)
+    results = _session_probes[chain_id]
+    best = next((r.url for r in results if r.error is None), None)
+    return best, results
@@ -7,20 +7,31 @@ TEMPLATES = {
     "PRIVATEKEY_ADDRESS": "Private Key +[space]+ Address",
     "ADDRESS_PRIVATEKEY": "Address +[space]+ Private Key",
     "0XPRIVATEKEY_ADDRESS": "0x + Private Key +[space]+ Address",
-    "ADDRESS_SEEDPHRASE": "Address +[space]+ Mnemonic",
-    "SEEDPHRASE_ADDRESS": "Mnemonic +[space]+ Address"
+    "ADDRESS_SEEDPHRASE": "Address +[space]+ Mnemonic +[space]+ Derivation path",
+    "SEEDPHRASE_ADDRESS": "Mnemonic +[space]+ Derivation path +[space]+ Address"
 }
 class Export:
-    def __init__(self, file_path: str, keys: dict, template: str):
+    def __init__(self, file_path: str, keys: dict, template: str, paths: dict = None):
         self.file_path = file_path
         self.keys = keys
         self.template = template
+        # Address -> derivation path of HD accounts, a shared mnemonic alone does not identify the account
+        self.paths = paths or {}
 
+    def _open(self, extension: str):
+        # Keys in clear text, readable by the owner only
+        os.makedirs(self.file_path or ".", exist_ok=True)
+        timestamp = datetime.now().strftime("%Y-%m-%d_%H-%M-%S")
+        file_name = os.path.join(self.file_path or ".", f"{timestamp}_export.{extension}")
+        fd = os.open(file_name, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+        if hasattr(os, "fchmod"):
+            # The mode above only applies to new files
+            os.fchmod(fd, 0o600)
+        return file_name, os.fdopen(fd, 'w')
 
     def to_txt(self):
-        timestamp = datetime.now().strftime("%Y-%m-%d_%H-%M-%S")
-        file_name = f"{timestamp}_export.txt"
-        with open(file_name, 'w') as file:
+        file_name, file = self._open("txt")
+        with file:
             for key, value in self.keys.items():
                 match self.template:
                     case "PRIVATEKEY_ADDRESS":
@@ -31,18 +42,16 @@ class Export:
                         file.write(f"0x{value} {key}\n")
 
                     case "ADDRESS_SEEDPHRASE":
-                        #todo
-                        file.write(f"{key} {value}\n")
+                        file.write(f"{key} {value} {self.paths.get(key, '')}".rstrip() + "\n")
                     case "SEEDPHRASE_ADDRESS":
-                        #todo
-                        file.write(f"{value} {key}\n")
+                        file.write(" ".join(filter(None, [value, self.paths.get(key), key])) + "\n")
                     case _:
                         print(f"Unknown template: {self.template}")
+        return file_name
 
     def to_csv(self):
-        timestamp = datetime.now().strftime("%Y-%m-%d_%H-%M-%S")
-        file_name = f"{timestamp}_export.csv"
-        with open(file_name, 'w') as file:
+        file_name, file = self._open("csv")
+        with file:
             writer = csv.writer(file)
             match self.template:
                 case "PRIVATEKEY_ADDRESS":
@@ -58,13 +67,16 @@ class Export:
                     for key, value in self.keys.items():
                         writer.writerow([f"0x{value}", key])
                 case "ADDRESS_SEEDPHRASE":
-                    #todo
-                    pass
+                    writer.writerow(['Address', 'Mnemonic', 'Derivation Path'])
+                    for key, value in self.keys.items():
+                        writer.writerow([key, value, self.paths.get(key, '')])
                 case "SEEDPHRASE_ADDRESS":
-                    #todo
-                    pass
+                    writer.writerow(['Mnemonic', 'Derivation Path', 'Address'])
+                    for key, value in self.keys.items():
+                        writer.writerow([value, self.paths.get(key, ''), key])
                 case _:
                     print(f"Unknown template: {self.template}")
+        return file_name
 
 class Reader:
     def __init__(self, file_path: str):
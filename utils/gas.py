@@ -0,0 +1,69 @@
+import statistics
+import threading
+import time
+import typing
+
+
+class FeeOracle:
+    def __init__(self, w3, ttl: float = 12.0, blocks: int = 10, percentile: float = 50, base_fee_multiplier: float = 2.0):
+        """
+        Initialize the fee oracle.
+
+        Fee suggestions come from a single eth_feeHistory call and are reused
+        by every transaction built within ttl seconds.
+
+        Args:
+        w3 (Web3): Connected Web3 instance.
+        ttl (float): Seconds a fetched fee history stays valid.
+        blocks (int): Number of recent blocks to look at.
+        percentile (float): Priority fee percentile paid in those blocks.
+        base_fee_multiplier (float): Headroom over the next base fee, 2x survives ~6 full blocks.
+        """
+        self.w3 = w3
+        self.ttl = ttl
+        self.blocks = blocks
+        self.percentile = percentile
+        self.base_fee_multiplier = base_fee_multiplier
+        self._fees: typing.Optional[typing.Dict[str, int]] = None
+        self._fetched_at = 0.0
+        self._lock = threading.Lock()
+
+    def _fetch(self) -> typing.Dict[str, int]:
+        try:
+            history = self.w3.eth.fee_history(self.blocks, "latest", [self.percentile])
+        except Exception:
+            # Node without eth_feeHistory
+            return {"gasPrice": self.w3.eth.gas_price}
+
+        # The last item is the base fee of the next (pending) block
+        base_fees = history.get("baseFeePerGas") or []
+        if not base_fees or base_fees[-1] == 0:
+            return {"gasPrice": self.w3.eth.gas_price}
+        base_fee = base_fees[-1]
+
+        rewards = [reward[0] for reward in history.get("reward") or [] if reward and reward[0] > 0]
+        if rewards:
+            priority_fee = int(statistics.median(rewards))
+        else:
+            priority_fee = self.w3.eth.max_priority_fee
+        return {
+            "maxFeePerGas": int(base_fee * self.base_fee_multiplier) + priority_fee,
+            "maxPriorityFeePerGas": priority_fee,
+        }
+
+    def fees(self) -> typing.Dict[str, int]:
+        """
+        Return fee fields to merge into a transaction.
+
+        Returns:
+        Dict[str, int]: maxFeePerGas and maxPriorityFeePerGas, or gasPrice on chains without EIP-1559.
+        """
+        with self._lock:
+            if self._fees is None or time.monotonic() - self._fetched_at > self.ttl:
+                self._fees = self._fetch()
+                self._fetched_at = time.monotonic()
+            return dict(self._fees)
+
+    def invalidate(self):
+        with self._lock:
+            self._fees = None
@@ -0,0 +1,171 @@
+import hashlib
+import hmac
+import os
+import typing
+from concurrent.futures import ProcessPoolExecutor
+
+from eth_keys import keys
+from mnemonic import Mnemonic
+
+from utils.crypto import derive_addresses
+
+
+DEFAULT_BASE_PATH = "m/44'/60'/0'/0"
+HARDENED = 0x80000000
+SECP256K1_N = 0xFFFFFFFFFFFFFFFFFFFFFFFFFFFFFFFEBAAEDCE6AF48A03BBFD25E8CD0364141
+
+# Below this amount of children a process pool costs more than it saves
+MIN_PARALLEL_BATCH = 256
+
+
+class HDNode(typing.NamedTuple):
+    """
+    Extended private key of a BIP-32 node.
+
+    The compressed public key is kept alongside the private key, so that
+    non-hardened children can be derived without another EC multiplication
+    on the parent.
+    """
+    private_key: bytes
+    chain_code: bytes
+    public_key: bytes
+
+
+def parse_path(path: str) -> typing.List[int]:
+    """
+    Convert a derivation path like m/44'/60'/0'/0 to a list of child indexes.
+
+    Args:
+    path (str): The BIP-32 derivation path.
+
+    Returns:
+    List[int]: Child indexes, hardened ones offset by 2^31.
+    """
+    parts = path.strip().split("/")
+    if not parts or parts[0] != "m":
+        raise ValueError(f"Invalid derivation path: {path}")
+    indexes = []
+    for part in parts[1:]:
+        hardened = part.endswith("'") or part.endswith("h")
+        digits = part[:-1] if hardened else part
+        if not digits.isdigit() or int(digits) >= HARDENED:
+            raise ValueError(f"Invalid derivation path: {path}")
+        indexes.append(int(digits) + (HARDENED if hardened else 0))
+    return indexes
+
+
+def _make_node(private_key: bytes, chain_code: bytes) -> HDNode:
+    public_key = keys.PrivateKey(private_key).public_key.to_compressed_bytes()
+    return HDNode(private_key, chain_code, public_key)
+
+
+def _child_key(parent: HDNode, index: int) -> typing.Tuple[bytes, bytes]:
+    if index >= HARDENED:
+        data = b"\x00" + parent.private_key + index.to_bytes(4, "big")
+    else:
+        data = parent.public_key + index.to_bytes(4, "big")
+    digest = hmac.new(parent.chain_code, data, hashlib.sha512).digest()
+    tweak = int.from_bytes(digest[:32], "big")
+    child = (tweak + int.from_bytes(parent.private_key, "big")) % SECP256K1_N
+    if tweak >= SECP256K1_N or child == 0:
+        # Probability is below 2^-127, BIP-32 says to skip such index
+        raise ValueError(f"Invalid child index: {index}")
+    return child.to_bytes(32, "big"), digest[32:]
+
+
+def derive_child(parent: HDNode, index: int) -> HDNode:
+    private_key, chain_code = _child_key(parent, index)
+    return _make_node(private_key, chain_code)
+
+
+def _derive_range(parent: HDNode, start: int, stop: int) -> typing.List[typing.Tuple[int, str, str]]:
+    # Leaf keys never get children, so skip building a full HDNode for them
+    private_keys = [_child_key(parent, index)[0] for index in range(start, stop)]
+    addresses = derive_addresses(private_keys)
+    return [(index, private_key.hex(), address) for index, private_key, address in zip(range(start, stop), private_keys, addresses)]
+
+
+class HDWallet:
+    def __init__(self, mnemonic: str, passphrase: str = ""):
+        """
+        Initialize the HD wallet from a BIP-39 mnemonic.
+
+        The seed and the master node are computed once, intermediate nodes
+        are cached on first use.
+
+        Args:
+        mnemonic (str): The BIP-39 mnemonic phrase.
+        passphrase (str): Optional BIP-39 passphrase.
+        """
+        mnemonic = " ".join(mnemonic.split())
+        if not Mnemonic("english").check(mnemonic):
+            raise ValueError("Invalid mnemonic phrase.")
+        self.mnemonic = mnemonic
+        seed = Mnemonic.to_seed(mnemonic, passphrase)
+        digest = hmac.new(b"Bitcoin seed", seed, hashlib.sha512).digest()
+        master = _make_node(digest[:32], digest[32:])
+        self.seed_id = hashlib.sha256(master.public_key).hexdigest()[:16]
+        self._nodes: typing.Dict[typing.Tuple[int, ...], HDNode] = {(): master}
+
+    @staticmethod
+    def generate_mnemonic(strength: int = 128) -> str:
+        return Mnemonic("english").generate(strength)
+
+    def node(self, path: str) -> HDNode:
+        """
+        Return the node at the given path, deriving and caching every missing parent.
+        """
+        indexes = tuple(parse_path(path))
+        depth = len(indexes)
+        while indexes[:depth] not in self._nodes:
+            depth -= 1
+        node = self._nodes[indexes[:depth]]
+        for i in range(depth, len(indexes)):
+            node = derive_child(node, indexes[i])
+            self._nodes[indexes[:i + 1]] = node
+        return node
+
+    def derive(self, index: int, base_path: str = DEFAULT_BASE_PATH) -> typing.Tuple[str, str]:
+        """
+        Return (private_key, address) of a single child of base_path.
+        """
+        _, private_key, address = _derive_range(self.node(base_path), index, index + 1)[0]
+        return private_key, address
+
+    def derive_batch(
+        self,
+        start: int,
+        count: int,
+        base_path: str = DEFAULT_BASE_PATH,
+        workers: typing.Optional[int] = None,
+    ) -> typing.List[typing.Tuple[int, str, str]]:
+        """
+        Derive a range of children of base_path, in parallel for large batches.
+
+        Args:
+        start (int): First child index.
+        count (int): Number of children to derive.
+        base_path (str): Parent path, m/44'/60'/0'/0 by default.
+        workers (Optional[int]): Number of worker processes, CPU count by default.
+
+        Returns:
+        List[Tuple[int, str, str]]: (index, private key hex, checksum address) ordered by index.
+        """
+        parent = self.node(base_path)
+        stop = start + count
+        workers = workers or os.cpu_count() or 1
+        if workers == 1 or count < MIN_PARALLEL_BATCH:
+            return _derive_range(parent, start, stop)
+
+        chunk = max(MIN_PARALLEL_BATCH // 4, -(-count // (workers * 4)))
+        bounds = [(i, min(i + chunk, stop)) for i in range(start, stop, chunk)]
+        result = []
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            futures = [executor.submit(_derive_range, parent, lo, hi) for lo, hi in bounds]
+            for future in futures:
+                result.extend(future.result())
+        return result
+
+
+def account_path(index: int, base_path: str = DEFAULT_BASE_PATH) -> str:
+    return f"{base_path}/{index}"
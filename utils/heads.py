@@ -0,0 +1,172 @@
+import asyncio
+import time
+import typing
+
+from web3 import AsyncWeb3, WebSocketProvider
+
+from utils.batch import batch_call
+
+
+Callback = typing.Callable[..., None]
+
+
+def ws_endpoint(config: typing.Dict[str, typing.Any], endpoint: typing.Optional[str] = None) -> typing.Optional[str]:
+    """
+    Return the WebSocket URL to subscribe to: WS_ENDPOINT from .env, or the endpoint itself when it is ws(s)://.
+    """
+    if config.get("WS_ENDPOINT"):
+        return config["WS_ENDPOINT"]
+    if endpoint and endpoint.startswith(("ws://", "wss://")):
+        return endpoint
+    return None
+
+
+class HeadScheduler:
+    def __init__(self, w3, ws_url: typing.Optional[str] = None, poll: float = 2.0, store=None, on_balance: typing.Optional[Callback] = None):
+        """
+        Run receipt checks and balance refreshes once per new block, in batches.
+
+        New heads come from a newHeads subscription when ws_url is set, from
+        eth_blockNumber every poll seconds otherwise. Reads go through w3, so
+        its cache and metrics still apply, and the cache takes its head from
+        the subscription instead of asking the node.
+
+        Args:
+        w3 (Web3): Connected Web3 instance used for the batched reads.
+        ws_url (Optional[str]): ws:// or wss:// URL of the same chain.
+        poll (float): Seconds between head checks without a subscription.
+        store (Optional[SnapshotStore]): Refreshed native balances are written there.
+        on_balance (Optional[Callable]): on_balance(address, balance, block) for reads without their own callback.
+        """
+        self.w3 = w3
+        self.ws_url = ws_url
+        self.poll = poll
+        self.store = store
+        self.on_balance = on_balance
+        self.chain_id = w3.eth.chain_id
+        self.receipts: typing.Dict[str, typing.Tuple[typing.Optional[Callback], bool]] = {}
+        self.balances: typing.Dict[str, typing.Optional[Callback]] = {}
+        # Addresses refreshed after every head, not only once
+        self.followed: typing.Dict[str, typing.Optional[Callback]] = {}
+        self.heads = 0
+        self.head: typing.Optional[int] = None
+
+    def watch_receipt(self, tx_hash, on_receipt: typing.Optional[Callback] = None, refresh: bool = True):
+        """
+        Check for the receipt of tx_hash on every head until it is mined.
+
+        on_receipt(tx_hash, receipt) is called once. With refresh, the
+        balances of its sender and recipient are read at the mining block.
+        """
+        if not isinstance(tx_hash, str):
+            tx_hash = "0x" + bytes(tx_hash).hex()
+        self.receipts[tx_hash] = (on_receipt, refresh)
+
+    def watch_balance(self, address: str, on_balance: typing.Optional[Callback] = None, follow: bool = False):
+        """
+        Read the native balance of address at the next head, or after every head with follow.
+
+        on_balance(address, balance, block) is called with each read.
+        """
+        address = self.w3.to_checksum_address(address)
+        if follow:
+            self.followed[address] = on_balance
+        else:
+            self.balances[address] = on_balance
+
+    def pending(self) -> bool:
+        return bool(self.receipts or self.balances)
+
+    def on_head(self, number: int):
+        """
+        Run the work due at block number: one batch of receipts, then one batch of balances.
+        """
+        self.heads += 1
+        self.head = number
+        cache = getattr(self.w3, "rpc_cache", None)
+        if cache is not None:
+            cache.set_head(number)
+
+        if self.receipts:
+            hashes = list(self.receipts)
+            results = batch_call(self.w3, [(self.w3.eth.get_transaction_receipt, (tx_hash,)) for tx_hash in hashes])
+            for tx_hash, receipt in zip(hashes, results):
+                # Not mined yet: TransactionNotFound or None, try again next head
+                if isinstance(receipt, Exception) or receipt is None:
+                    continue
+                on_receipt, refresh = self.receipts.pop(tx_hash)
+                if on_receipt:
+                    on_receipt(tx_hash, receipt)
+                if refresh:
+                    for address in (receipt.get("from"), receipt.get("to")):
+                        if address and address not in self.followed:
+                            self.balances.setdefault(self.w3.to_checksum_address(address), None)
+
+        due = {**self.balances, **self.followed}
+        self.balances = {}
+        if due:
+            addresses = list(due)
+            results = batch_call(self.w3, [(self.w3.eth.get_balance, (address, number)) for address in addresses])
+            read = {}
+            for address, balance in zip(addresses, results):
+                if isinstance(balance, Exception):
+                    # Node behind the head we were told about, read again next head
+                    if address not in self.followed:
+                        self.balances[address] = due[address]
+                    continue
+                read[address] = balance
+                callback = due[address] or self.on_balance
+                if callback:
+                    callback(address, balance, number)
+            if self.store is not None and read:
+                self.store.update(self.chain_id, read, number)
+
+    def _poll(self, deadline: typing.Optional[float]):
+        last = None
+        while self.pending() or self.followed:
+            number = self.w3.eth.block_number
+            if number != last:
+                last = number
+                self.on_head(number)
+                if not self.pending() and not self.followed:
+                    break
+            if deadline is not None and time.monotonic() >= deadline:
+                break
+            time.sleep(self.poll)
+
+    async def _subscribe(self):
+        async with AsyncWeb3(WebSocketProvider(self.ws_url)) as w3:
+            await w3.eth.subscribe("newHeads")
+            async for message in w3.socket.process_subscriptions():
+                number = message["result"]["number"]
+                number = int(number, 16) if isinstance(number, str) else number
+                # Reads are batched over HTTP, keep the socket free for heads
+                await asyncio.to_thread(self.on_head, number)
+                if not self.pending() and not self.followed:
+                    break
+
+    def run(self, timeout: typing.Optional[float] = None) -> bool:
+        """
+        Process heads until all receipts and one-off balances are done, or timeout.
+
+        Followed addresses keep the loop running until timeout.
+
+        Returns:
+        bool: True when no work is left.
+        """
+        deadline = time.monotonic() + timeout if timeout is not None else None
+        # Work that is already due does not wait for the next block
+        self.on_head(self.w3.eth.block_number)
+        if not self.pending() and not self.followed:
+            return True
+        if self.ws_url:
+            try:
+                asyncio.run(asyncio.wait_for(self._subscribe(), timeout))
+            except asyncio.TimeoutError:
+                pass
+            except Exception as e:
+                print(f"Subscription to {self.ws_url} failed ({e}), polling for new blocks.")
+                self._poll(deadline)
+        else:
+            self._poll(deadline)
+        return not self.pending()
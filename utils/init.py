@@ -3,6 +3,7 @@ from os.path import exists
 import json
 from pathlib import Path
 import requests
+import re
 
 MAINNET_JSON_URL = "https://raw.githubusercontent.com/0ndrec/cli-evm-accs/refs/heads/main/chains/mainnet.json"
 TESTNET_JSON_URL = "https://raw.githubusercontent.com/0ndrec/cli-evm-accs/refs/heads/main/chains/testnet.json"
@@ -68,9 +69,10 @@ def load_chains(chains_path: str):
 
     return True
 
-def load_contracts(chain_id)-> list:
+def load_contracts(chain_id, data_path: str = DATA_PATH)-> list:
     contracts = []
-    for file in Path(f"{DATA_PATH}/{chain_id}").iterdir():
-        if file.suffix == ".json":
+    for file in Path(f"{data_path}/{chain_id}").iterdir():
+        # Only ABI files named by contract address, the directory also holds caches
+        if file.suffix == ".json" and re.fullmatch(r"0x[a-fA-F0-9]{40}", file.stem):
             contracts.append(file.name)
     return contracts
@@ -0,0 +1,216 @@
+import json
+import typing
+from decimal import Decimal
+
+from eth_abi import decode
+from eth_abi.registry import registry
+from eth_account import Account
+from eth_utils import keccak, to_checksum_address
+
+from utils.abi import ABIDecoder, ABIFunction
+from utils.batch import batch_call
+from utils.crypto import derive_addresses
+from utils.journal import journal as default_journal, TxJournal
+from utils.preflight import simulate
+
+
+# Address argument replaced by the address of each account
+SELF = "self"
+# Integer inputs under these names are amounts in tokens, scaled by the contract decimals
+AMOUNT_NAMES = {"amount", "value", "wad", "rawamount", "_amount", "_value"}
+
+Row = typing.Dict[str, typing.Any]
+
+
+def is_amount(name: typing.Optional[str], type_: str) -> bool:
+    return type_.startswith(("uint", "int")) and (name or "").lower() in AMOUNT_NAMES
+
+
+def parse_value(type_: str, value: typing.Any, decimals: typing.Optional[int] = None, sender: typing.Optional[str] = None) -> typing.Any:
+    """
+    Convert a prompt or command line value to what the ABI encoder expects.
+
+    Args:
+    type_ (str): Solidity type, e.g. address, uint256, bytes32, address[].
+    value (Any): Text, or an already typed value. Arrays are JSON lists or comma separated.
+    decimals (Optional[int]): Scale integers by 10 ** decimals, for amounts in tokens.
+    sender (Optional[str]): Address used for "self".
+    """
+    if isinstance(value, str):
+        value = value.strip()
+    if type_.endswith("]"):
+        base = type_[:type_.rindex("[")]
+        if isinstance(value, str):
+            value = json.loads(value) if value.startswith("[") else [item for item in value.split(",") if item.strip()]
+        return [parse_value(base, item, decimals, sender) for item in value]
+    if type_ == "address":
+        return to_checksum_address(sender if value == SELF else value)
+    if type_ == "bool":
+        return value.lower() in ("true", "1", "yes") if isinstance(value, str) else bool(value)
+    if type_.startswith(("uint", "int")):
+        if decimals is not None:
+            return int(Decimal(str(value)) * 10 ** decimals)
+        return int(value, 0) if isinstance(value, str) else int(value)
+    if type_.startswith("bytes"):
+        return bytes.fromhex(value.removeprefix("0x")) if isinstance(value, str) else bytes(value)
+    if type_ == "string":
+        return str(value)
+    raise ValueError(f"Unsupported argument type: {type_}")
+
+
+def plain(value: typing.Any) -> typing.Any:
+    # Decoded values as JSON, bytes become hex strings
+    if isinstance(value, (bytes, bytearray)):
+        return "0x" + bytes(value).hex()
+    if isinstance(value, (list, tuple)):
+        return [plain(item) for item in value]
+    return value
+
+
+class FunctionInvoker:
+    def __init__(self, function: ABIFunction, contract_address: str, decoder: typing.Optional[ABIDecoder] = None):
+        """
+        Call one contract function for many accounts.
+
+        The selector and the argument encoder are resolved once, encoding a
+        row is then a single encoder call. View and pure functions are read
+        with batched eth_call, others are simulated, signed and sent.
+
+        Args:
+        function (ABIFunction): Function from ABIDecoder.get_function().
+        contract_address (str): Contract address.
+        decoder (Optional[ABIDecoder]): Decodes custom revert errors of the contract.
+        """
+        types = [arg.type for arg in function.inputs]
+        if any(type_.startswith("tuple") for type_ in types):
+            raise ValueError(f"{function.name} takes tuple arguments, which are not supported.")
+        self.function = function
+        self.address = to_checksum_address(contract_address)
+        self.decoder = decoder
+        self.types = types
+        self.output_types = [output.type for output in function.outputs]
+        self.signature = f"{function.name}({','.join(types)})"
+        self.selector = keccak(text=self.signature)[:4]
+        self._encode = registry.get_tuple_encoder(*types)
+        self.read_only = function.stateMutability in ("view", "pure")
+
+    @classmethod
+    def from_abi(cls, decoder: ABIDecoder, name: str) -> "FunctionInvoker":
+        function = decoder.get_function(name)
+        if function is None:
+            raise ValueError(f"No function {name} in the ABI of {decoder.contract_address}")
+        return cls(function, decoder.contract_address, decoder)
+
+    def parse_args(
+        self,
+        values: typing.Sequence[typing.Any],
+        decimals: typing.Optional[int] = None,
+        sender: typing.Optional[str] = None,
+    ) -> typing.List[typing.Any]:
+        """
+        Parse one value per input, amounts (see AMOUNT_NAMES) in tokens when decimals is given.
+        """
+        if len(values) != len(self.types):
+            raise ValueError(f"{self.signature} takes {len(self.types)} argument(s), got {len(values)}")
+        return [
+            parse_value(arg.type, value, decimals if is_amount(arg.name, arg.type) else None, sender)
+            for arg, value in zip(self.function.inputs, values)
+        ]
+
+    def encode(self, args: typing.Sequence[typing.Any]) -> str:
+        return "0x" + (self.selector + self._encode(args)).hex()
+
+    def encode_many(self, rows: typing.Iterable[typing.Sequence[typing.Any]]) -> typing.List[str]:
+        selector, encode = self.selector, self._encode
+        return ["0x" + (selector + encode(args)).hex() for args in rows]
+
+    def decode(self, data: bytes) -> typing.Any:
+        values = decode(self.output_types, bytes(data))
+        return values[0] if len(values) == 1 else values
+
+    def call(self, w3, rows: typing.Sequence[typing.Tuple[str, typing.Sequence[typing.Any]]], block="latest") -> typing.List[Row]:
+        """
+        Read the function for every (from address, args) row in batched eth_call rounds.
+
+        Returns:
+        List[dict]: One row each, with the decoded result or the error.
+        """
+        data = self.encode_many(args for _, args in rows)
+        results = batch_call(w3, [
+            (w3.eth.call, ({"from": sender, "to": self.address, "data": calldata}, block))
+            for (sender, _), calldata in zip(rows, data)
+        ])
+        records = []
+        for (sender, args), result in zip(rows, results):
+            record = {"from": sender, "contract": self.address, "function": self.function.name, "args": plain(args)}
+            if isinstance(result, Exception):
+                records.append({**record, "error": str(result)})
+                continue
+            try:
+                records.append({**record, "result": plain(self.decode(result))})
+            except Exception as e:
+                records.append({**record, "error": f"Cannot decode the result: {e}"})
+        return records
+
+    def send(
+        self,
+        w3,
+        rows: typing.Sequence[typing.Tuple[str, str, typing.Sequence[typing.Any]]],
+        fees: typing.Dict[str, int],
+        value: int = 0,
+        preflight: bool = True,
+        journal: TxJournal = default_journal,
+    ) -> typing.Iterator[Row]:
+        """
+        Sign and send the function for every (account name, private key, args) row.
+
+        Calldata is encoded for all rows first. Transactions are simulated in
+        one batch (gas is only estimated without preflight), nonces are read
+        in one batch and rows of the same account get consecutive nonces.
+
+        Args:
+        w3 (Web3): Connected Web3 instance.
+        rows (Sequence): (account name, private key, args) rows.
+        fees (dict): Fee fields, from FeeOracle.fees().
+        value (int): Wei sent with each call, for payable functions.
+        preflight (bool): Simulate before signing, rows that would fail are not sent.
+        journal (TxJournal): Where sent txs are logged.
+
+        Returns:
+        Iterator[dict]: One record per row with its hash, or error (and the preflight status when it failed).
+        """
+        chain_id = w3.eth.chain_id
+        senders = derive_addresses(key for _, key, _ in rows)
+        data = self.encode_many(args for _, _, args in rows)
+        txs = [
+            {'from': sender, 'to': self.address, 'value': value, 'data': calldata, 'chainId': chain_id, **fees}
+            for sender, calldata in zip(senders, data)
+        ]
+        if preflight:
+            checks = simulate(w3, txs, self.decoder)
+        else:
+            estimates = batch_call(w3, [(w3.eth.estimate_gas, (tx,)) for tx in txs])
+            checks = [
+                {"status": "error", "reason": str(gas)} if isinstance(gas, Exception) else {"status": "ok", "gas": gas}
+                for gas in estimates
+            ]
+        unique = list(dict.fromkeys(senders))
+        nonces = dict(zip(unique, batch_call(w3, [(w3.eth.get_transaction_count, (sender, "pending")) for sender in unique])))
+
+        for (name, key, args), tx, check in zip(rows, txs, checks):
+            record = {"account": name, "from": tx["from"], "contract": self.address, "function": self.function.name, "args": plain(args)}
+            if check["status"] != "ok":
+                yield {**record, "status": check["status"], "error": check["reason"]}
+                continue
+            try:
+                nonce = nonces[tx["from"]]
+                if isinstance(nonce, Exception):
+                    raise nonce
+                tx.update(nonce=nonce, gas=check["gas"])
+                signed_tx = Account.sign_transaction(tx, key)
+                tx_hash = w3.eth.send_raw_transaction(signed_tx.raw_transaction)
+                nonces[tx["from"]] = nonce + 1
+                journal.record(chain_id, tx["from"], tx, tx_hash)
+                yield {**record, "hash": "0x" + tx_hash.hex().removeprefix("0x")}
+            except Exception as e:
+                yield {**record, "error": str(e)}
@@ -0,0 +1,70 @@
+import json
+import os
+import threading
+import time
+import typing
+
+from utils.init import DATA_PATH
+
+
+JOURNAL_FILE = "sent.jsonl"
+TX_FIELDS = ("to", "value", "data", "gas", "gasPrice", "maxFeePerGas", "maxPriorityFeePerGas")
+
+
+class TxJournal:
+    def __init__(self, path: str = os.path.join(DATA_PATH, JOURNAL_FILE)):
+        """
+        Append-only log of sent transactions, one JSON line per broadcast.
+
+        Replacements are logged like any other tx, so every version sent for
+        a (chain, sender, nonce) can be looked up later.
+
+        Args:
+        path (str): JSON lines file.
+        """
+        self.path = path
+        self._lock = threading.Lock()
+
+    def record(self, chain_id: int, sender: str, tx: typing.Dict[str, typing.Any], tx_hash) -> None:
+        if not isinstance(tx_hash, str):
+            tx_hash = "0x" + bytes(tx_hash).hex()
+        fields = {field: tx[field] for field in TX_FIELDS if field in tx}
+        if isinstance(fields.get("data"), (bytes, bytearray)):
+            fields["data"] = "0x" + bytes(fields["data"]).hex()
+        line = json.dumps({
+            "chainId": int(chain_id),
+            "from": sender.lower(),
+            "nonce": int(tx["nonce"]),
+            "hash": tx_hash,
+            "tx": fields,
+            "time": time.time(),
+        })
+        try:
+            os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+            # Single appends of a line are atomic between processes
+            with self._lock, open(self.path, 'a') as file:
+                file.write(line + "\n")
+        except OSError as e:
+            print(f"Error writing the tx journal: {e}")
+
+    def versions(self, chain_id: int, senders: typing.Optional[typing.Iterable[str]] = None) -> typing.Dict[typing.Tuple[str, int], typing.List[typing.Dict[str, typing.Any]]]:
+        """
+        Return every logged version by (sender, nonce), oldest first.
+        """
+        senders = {sender.lower() for sender in senders} if senders is not None else None
+        versions: typing.Dict[typing.Tuple[str, int], typing.List[typing.Dict[str, typing.Any]]] = {}
+        if not os.path.exists(self.path):
+            return versions
+        with open(self.path, 'r') as file:
+            for line in file:
+                try:
+                    record = json.loads(line)
+                except json.JSONDecodeError:
+                    continue
+                if record.get("chainId") != int(chain_id) or (senders is not None and record["from"] not in senders):
+                    continue
+                versions.setdefault((record["from"], record["nonce"]), []).append(record)
+        return versions
+
+
+journal = TxJournal()
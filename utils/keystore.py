@@ -0,0 +1,273 @@
+import hashlib
+import json
+import mmap
+import os
+import struct
+import typing
+from array import array
+from collections.abc import MutableMapping
+
+from eth_utils import to_checksum_address
+
+from utils.filelock import atomic_write
+
+
+MAGIC = b"EVMKEYS\x00"
+VERSION = 1
+MAPPED_SUFFIX = ".evk"
+# magic, version, count, records offset, index offset
+HEADER = struct.Struct("<8sIQQQ")
+# name hash, address, name offset, name length, ciphertext offset, ciphertext length
+RECORD = struct.Struct("<8s20sQHQI")
+# name hash, record position, sorted by hash
+INDEX = struct.Struct("<8sI")
+NO_ADDRESS = bytes(20)
+
+# (name, ciphertext, address or None)
+Entry = typing.Tuple[str, str, typing.Optional[str]]
+
+
+def name_hash(name: str) -> bytes:
+    return hashlib.blake2b(name.encode(), digest_size=8).digest()
+
+
+def is_mapped(path: str) -> bool:
+    """
+    Tell whether path holds a keystore in the mapped format, JSON keystores (and empty files) do not.
+    """
+    try:
+        with open(path, 'rb') as file:
+            return file.read(len(MAGIC)) == MAGIC
+    except FileNotFoundError:
+        return False
+
+
+def write_keystore(file: typing.BinaryIO, entries: typing.Iterable[Entry]) -> int:
+    """
+    Write entries to file in the mapped format and return their number.
+
+    Ciphertexts are streamed first, the names, records and index follow and
+    the header is written last, so only a few dozen bytes per entry are held
+    in memory.
+
+    Layout: header | ciphertexts | names | records (keystore order) | index (sorted by name hash)
+    """
+    file.write(bytes(HEADER.size))
+    cipher_offsets, cipher_lengths = array("Q"), array("I")
+    names, name_offsets, name_lengths = bytearray(), array("Q"), array("H")
+    hashes, addresses = [], bytearray()
+    seen = set()
+    for name, ciphertext, address in entries:
+        if name in seen:
+            raise ValueError(f"Duplicate account name: {name}")
+        seen.add(name)
+        data = ciphertext.encode()
+        cipher_offsets.append(file.tell())
+        cipher_lengths.append(len(data))
+        file.write(data)
+        encoded = name.encode()
+        name_offsets.append(len(names))
+        name_lengths.append(len(encoded))
+        names += encoded
+        hashes.append(name_hash(name))
+        addresses += bytes.fromhex(address[2:]) if address else NO_ADDRESS
+
+    names_offset = file.tell()
+    file.write(names)
+    records_offset = file.tell()
+    count = len(hashes)
+    for i in range(count):
+        file.write(RECORD.pack(
+            hashes[i], bytes(addresses[i * 20:(i + 1) * 20]), names_offset + name_offsets[i], name_lengths[i],
+            cipher_offsets[i], cipher_lengths[i],
+        ))
+    index_offset = file.tell()
+    for i in sorted(range(count), key=hashes.__getitem__):
+        file.write(INDEX.pack(hashes[i], i))
+    file.seek(0)
+    file.write(HEADER.pack(MAGIC, VERSION, count, records_offset, index_offset))
+    return count
+
+
+class MappedKeystore(MutableMapping):
+    def __init__(self, path: str):
+        """
+        Keystore file of fixed-width records, read through a memory map.
+
+        Behaves like the name -> ciphertext dict of a JSON keystore, but
+        nothing is parsed up front: names, ciphertexts and addresses are read
+        from the map when they are used, and a lookup is a binary search over
+        the index of name hashes. Changes stay in memory until the owner
+        writes the store again with write_keystore.
+
+        On Windows the file is read in full instead, a mapped file could not
+        be replaced while it is open.
+
+        Args:
+        path (str): Keystore file in the mapped format.
+        """
+        self.path = path
+        with open(path, 'rb') as file:
+            if os.name == "nt":
+                self._buffer = file.read()
+            else:
+                self._buffer = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, version, self._count, self._records, self._index = HEADER.unpack_from(self._buffer, 0)
+        if magic != MAGIC or version != VERSION:
+            raise ValueError(f"{path} is not a mapped keystore of version {VERSION}.")
+        # Names of the base file replaced or deleted in memory, and names not in it
+        self._replaced: typing.Dict[str, Entry] = {}
+        self._deleted: typing.Set[str] = set()
+        self._appended: typing.Dict[str, Entry] = {}
+
+    def close(self):
+        if isinstance(self._buffer, mmap.mmap):
+            self._buffer.close()
+
+    def _record(self, position: int) -> typing.Tuple[bytes, bytes, int, int, int, int]:
+        return RECORD.unpack_from(self._buffer, self._records + position * RECORD.size)
+
+    def _name(self, position: int) -> str:
+        _, _, offset, length, _, _ = self._record(position)
+        return self._buffer[offset:offset + length].decode()
+
+    def _find(self, name: str) -> typing.Optional[int]:
+        target = name_hash(name)
+        low, high = 0, self._count
+        while low < high:
+            middle = (low + high) // 2
+            if INDEX.unpack_from(self._buffer, self._index + middle * INDEX.size)[0] < target:
+                low = middle + 1
+            else:
+                high = middle
+        # Names sharing a hash sit next to each other
+        while low < self._count:
+            found, position = INDEX.unpack_from(self._buffer, self._index + low * INDEX.size)
+            if found != target:
+                break
+            if self._name(position) == name:
+                return position
+            low += 1
+        return None
+
+    def _entry(self, position: int) -> Entry:
+        _, address, name_offset, name_length, offset, length = self._record(position)
+        name = self._buffer[name_offset:name_offset + name_length].decode()
+        ciphertext = self._buffer[offset:offset + length].decode()
+        return name, ciphertext, None if address == NO_ADDRESS else to_checksum_address(address)
+
+    def _get(self, name: str) -> typing.Optional[Entry]:
+        if name in self._appended:
+            return self._appended[name]
+        if name in self._replaced:
+            return self._replaced[name]
+        if name in self._deleted:
+            return None
+        position = self._find(name)
+        return None if position is None else self._entry(position)
+
+    def __getitem__(self, name: str) -> str:
+        entry = self._get(name)
+        if entry is None:
+            raise KeyError(name)
+        return entry[1]
+
+    def __contains__(self, name) -> bool:
+        return isinstance(name, str) and self._get(name) is not None
+
+    def set(self, name: str, ciphertext: str, address: typing.Optional[str] = None):
+        """
+        Add or replace an entry, with the address of its key when it is known.
+        """
+        if name in self._appended or (name not in self._replaced and self._find(name) is None):
+            self._appended[name] = (name, ciphertext, address)
+        else:
+            self._replaced[name] = (name, ciphertext, address)
+            self._deleted.discard(name)
+
+    def __setitem__(self, name: str, ciphertext: str):
+        self.set(name, ciphertext)
+
+    def __delitem__(self, name: str):
+        if name in self._appended:
+            del self._appended[name]
+            return
+        if name in self._deleted or self._find(name) is None:
+            raise KeyError(name)
+        self._replaced.pop(name, None)
+        self._deleted.add(name)
+
+    def __len__(self) -> int:
+        return self._count - len(self._deleted) + len(self._appended)
+
+    def __iter__(self) -> typing.Iterator[str]:
+        for position in range(self._count):
+            name = self._name(position)
+            if name not in self._deleted:
+                yield name
+        yield from list(self._appended)
+
+    def entries(self) -> typing.Iterator[Entry]:
+        """
+        Yield (name, ciphertext, address) in keystore order, with the changes made in memory.
+        """
+        for position in range(self._count):
+            entry = self._entry(position)
+            if entry[0] in self._deleted:
+                continue
+            yield self._replaced.get(entry[0], entry)
+        yield from list(self._appended.values())
+
+    def names(self, start: int = 0, stop: typing.Optional[int] = None) -> typing.List[str]:
+        """
+        Return the names of the stored records start to stop, without the changes made in memory.
+        """
+        return [self._name(position) for position in range(start, min(stop if stop is not None else self._count, self._count))]
+
+    def address(self, name: str) -> typing.Optional[str]:
+        entry = self._get(name)
+        return entry[2] if entry else None
+
+    def addresses(self) -> typing.Dict[str, str]:
+        """
+        Return name -> checksum address of every entry stored with its address.
+        """
+        return {name: address for name, _, address in self.entries() if address}
+
+
+def to_mapped(
+    json_path: str,
+    path: str,
+    addresses: typing.Optional[typing.Callable[[str, str], typing.Optional[str]]] = None,
+) -> int:
+    """
+    Convert a JSON keystore to the mapped format and return the number of entries.
+
+    Args:
+    json_path (str): JSON keystore, name -> ciphertext.
+    path (str): Mapped keystore to write.
+    addresses (Optional[Callable]): addresses(name, ciphertext) -> address, stored with each record.
+    Without it, addresses are left out and found by decrypting the keys as before.
+    """
+    with open(json_path, 'r') as file:
+        try:
+            keys = json.load(file)
+        except json.JSONDecodeError:
+            keys = {}
+    entries = ((name, ciphertext, addresses(name, ciphertext) if addresses else None) for name, ciphertext in keys.items())
+    result = {}
+    atomic_write(path, lambda file: result.update(count=write_keystore(file, entries)), mode='wb')
+    return result["count"]
+
+
+def to_json(path: str, json_path: str) -> int:
+    """
+    Convert a mapped keystore back to a JSON keystore and return the number of entries.
+    """
+    store = MappedKeystore(path)
+    try:
+        keys = {name: ciphertext for name, ciphertext, _ in store.entries()}
+    finally:
+        store.close()
+    atomic_write(json_path, lambda file: json.dump(keys, file))
+    return len(keys)
@@ -0,0 +1,278 @@
+import json
+import os
+import threading
+import time
+import typing
+from contextlib import contextmanager
+from datetime import datetime
+
+from web3.middleware import Web3Middleware
+
+
+# Latency samples kept per method, older ones are overwritten round-robin
+MAX_SAMPLES = 10000
+PROFILE_DIR = "profiles"
+PROFILE_MODES = ("cprofile", "pyinstrument")
+# EVMACCS_PROFILE values that mean off, other unknown values mean cProfile
+PROFILE_OFF = ("", "0", "false", "no", "off")
+
+
+def _percentile(samples: typing.List[float], q: float) -> float:
+    if not samples:
+        return 0.0
+    ordered = sorted(samples)
+    return ordered[min(int(q / 100 * len(ordered)), len(ordered) - 1)]
+
+
+class Metrics:
+    def __init__(self):
+        """
+        Collect RPC calls and timed sections of the current process.
+
+        RPC stats are kept per method and per action (menu item or headless
+        command), timed sections per category: crypto, network, disk.
+        """
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self.action = "startup"
+            self.rpc: typing.Dict[str, typing.Dict[str, typing.Any]] = {}
+            self.actions: typing.Dict[str, typing.Dict[str, int]] = {}
+            self.sections: typing.Dict[str, typing.Dict[str, float]] = {}
+            self.limits: typing.Dict[str, typing.Dict[str, float]] = {}
+
+    def set_action(self, action: str):
+        self.action = action
+
+    def record_rpc(self, method: str, seconds: float, sent: int, received: int, error: bool = False):
+        with self._lock:
+            stats = self.rpc.setdefault(method, {"count": 0, "errors": 0, "sent": 0, "received": 0, "samples": []})
+            stats["count"] += 1
+            stats["errors"] += int(error)
+            stats["sent"] += sent
+            stats["received"] += received
+            if len(stats["samples"]) < MAX_SAMPLES:
+                stats["samples"].append(seconds)
+            else:
+                stats["samples"][stats["count"] % MAX_SAMPLES] = seconds
+            per_action = self.actions.setdefault(self.action, {})
+            per_action[method] = per_action.get(method, 0) + 1
+        self.record_section("network", seconds)
+
+    def record_section(self, category: str, seconds: float):
+        with self._lock:
+            section = self.sections.setdefault(category, {"count": 0, "seconds": 0.0})
+            section["count"] += 1
+            section["seconds"] += seconds
+
+    def record_limit(self, endpoint: str, event: str, seconds: float = 0.0, rate: typing.Optional[float] = None):
+        """
+        Count a rate limiter event of an endpoint: throttled, timeout, retries, or waited seconds.
+        """
+        with self._lock:
+            stats = self.limits.setdefault(endpoint, {"throttled": 0, "timeout": 0, "retries": 0, "waited": 0.0})
+            if event == "waited":
+                stats["waited"] += seconds
+            else:
+                stats[event] = stats.get(event, 0) + 1
+            if rate is not None:
+                stats["rate"] = rate
+
+    @contextmanager
+    def timer(self, category: str):
+        """
+        Time a block of code under a category, e.g. with metrics.timer("crypto"): ...
+        """
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record_section(category, time.perf_counter() - started)
+
+    def report(self) -> typing.Dict[str, typing.Any]:
+        with self._lock:
+            rpc = {
+                method: {
+                    "count": stats["count"],
+                    "errors": stats["errors"],
+                    "bytes_sent": stats["sent"],
+                    "bytes_received": stats["received"],
+                    "p50": _percentile(stats["samples"], 50),
+                    "p90": _percentile(stats["samples"], 90),
+                    "p99": _percentile(stats["samples"], 99),
+                    "max": max(stats["samples"], default=0.0),
+                }
+                for method, stats in self.rpc.items()
+            }
+            return {
+                "rpc": rpc,
+                "actions": {action: dict(methods) for action, methods in self.actions.items()},
+                "sections": {category: dict(section) for category, section in self.sections.items()},
+                "limits": {endpoint: dict(stats) for endpoint, stats in self.limits.items()},
+            }
+
+    def to_json(self) -> str:
+        return json.dumps(self.report(), indent=2)
+
+    def to_prometheus(self) -> str:
+        report = self.report()
+        lines = [
+            "# TYPE evmaccs_rpc_calls_total counter",
+            "# TYPE evmaccs_rpc_errors_total counter",
+            "# TYPE evmaccs_rpc_bytes_total counter",
+            "# TYPE evmaccs_rpc_latency_seconds summary",
+        ]
+        for method, stats in report["rpc"].items():
+            lines.append(f'evmaccs_rpc_calls_total{{method="{method}"}} {stats["count"]}')
+            lines.append(f'evmaccs_rpc_errors_total{{method="{method}"}} {stats["errors"]}')
+            lines.append(f'evmaccs_rpc_bytes_total{{method="{method}",direction="sent"}} {stats["bytes_sent"]}')
+            lines.append(f'evmaccs_rpc_bytes_total{{method="{method}",direction="received"}} {stats["bytes_received"]}')
+            for q, quantile in (("p50", "0.5"), ("p90", "0.9"), ("p99", "0.99")):
+                lines.append(f'evmaccs_rpc_latency_seconds{{method="{method}",quantile="{quantile}"}} {stats[q]}')
+        lines.append("# TYPE evmaccs_action_rpc_calls_total counter")
+        for action, methods in report["actions"].items():
+            for method, count in methods.items():
+                lines.append(f'evmaccs_action_rpc_calls_total{{action="{action}",method="{method}"}} {count}')
+        lines.append("# TYPE evmaccs_section_seconds_total counter")
+        for category, section in report["sections"].items():
+            lines.append(f'evmaccs_section_seconds_total{{category="{category}"}} {section["seconds"]}')
+        lines.append("# TYPE evmaccs_limit_events_total counter")
+        lines.append("# TYPE evmaccs_limit_wait_seconds_total counter")
+        lines.append("# TYPE evmaccs_limit_rate gauge")
+        for endpoint, stats in report["limits"].items():
+            for event in ("throttled", "timeout", "retries"):
+                lines.append(f'evmaccs_limit_events_total{{endpoint="{endpoint}",event="{event}"}} {stats[event]}')
+            lines.append(f'evmaccs_limit_wait_seconds_total{{endpoint="{endpoint}"}} {stats["waited"]}')
+            if "rate" in stats:
+                lines.append(f'evmaccs_limit_rate{{endpoint="{endpoint}"}} {stats["rate"]}')
+        return "\n".join(lines) + "\n"
+
+    def export(self, path: str):
+        """
+        Write the report to path, as Prometheus text for .prom/.txt files and JSON otherwise.
+        """
+        content = self.to_prometheus() if path.endswith((".prom", ".txt")) else self.to_json()
+        with open(path, 'w') as file:
+            file.write(content)
+
+
+metrics = Metrics()
+
+
+def _size(value: typing.Any) -> int:
+    try:
+        return len(json.dumps(value, default=str))
+    except (TypeError, ValueError):
+        return 0
+
+
+class InstrumentationMiddleware(Web3Middleware):
+    """
+    Record every RPC call, with its latency and JSON size, in the global metrics.
+    """
+
+    def wrap_make_request(self, make_request):
+        def middleware(method, params):
+            started = time.perf_counter()
+            try:
+                response = make_request(method, params)
+            except Exception:
+                metrics.record_rpc(method, time.perf_counter() - started, _size(params), 0, error=True)
+                raise
+            metrics.record_rpc(
+                method, time.perf_counter() - started, _size(params), _size(response), error="error" in response
+            )
+            return response
+
+        return middleware
+
+    def wrap_make_batch_request(self, make_batch_request):
+        def middleware(requests_info):
+            started = time.perf_counter()
+            response = make_batch_request(requests_info)
+            elapsed = time.perf_counter() - started
+            # Spread the round trip over the calls of the batch
+            responses = response if isinstance(response, list) else [response] * len(requests_info)
+            for (method, params), item in zip(requests_info, responses):
+                metrics.record_rpc(method, elapsed / len(requests_info), _size(params), _size(item), error="error" in item)
+            return response
+
+        return middleware
+
+
+def instrument(w3):
+    """
+    Add the instrumentation middleware to a Web3 instance once.
+    """
+    if "instrumentation" not in w3.middleware_onion:
+        w3.middleware_onion.add(InstrumentationMiddleware, "instrumentation")
+    return w3
+
+
+class Profiler:
+    def __init__(self, mode: typing.Optional[str] = None, output_dir: str = PROFILE_DIR):
+        """
+        Opt-in profiler of single actions.
+
+        Args:
+        mode (Optional[str]): "cprofile", "pyinstrument" or None to disable, EVMACCS_PROFILE by default.
+        Other values such as "1" use cProfile.
+        output_dir (str): Where profiles are written, one file per action.
+        """
+        mode = (mode if mode is not None else os.getenv("EVMACCS_PROFILE", "")).strip().lower()
+        if mode in PROFILE_OFF:
+            mode = None
+        elif mode not in PROFILE_MODES:
+            if mode not in ("1", "true", "yes", "on"):
+                print(f"Unknown profiler {mode!r}, using cProfile ({' or '.join(PROFILE_MODES)}).")
+            mode = "cprofile"
+        self.mode = mode
+        self.output_dir = output_dir
+        self._profiler = None
+        self._label = None
+
+    def start(self, label: str):
+        if self.mode is None:
+            return
+        self.stop()
+        if self.mode == "pyinstrument":
+            try:
+                from pyinstrument import Profiler as PyInstrumentProfiler
+            except ImportError:
+                print("pyinstrument is not installed, falling back to cProfile.")
+                self.mode = "cprofile"
+            else:
+                self._profiler = PyInstrumentProfiler()
+        if self.mode == "cprofile":
+            import cProfile
+            self._profiler = cProfile.Profile()
+        self._label = label
+        self._profiler.start() if self.mode == "pyinstrument" else self._profiler.enable()
+
+    def stop(self) -> typing.Optional[str]:
+        if self._profiler is None:
+            return None
+        os.makedirs(self.output_dir, exist_ok=True)
+        name = "".join(c if c.isalnum() else "_" for c in self._label).strip("_")
+        timestamp = datetime.now().strftime("%Y-%m-%d_%H-%M-%S")
+        if self.mode == "pyinstrument":
+            self._profiler.stop()
+            path = os.path.join(self.output_dir, f"{timestamp}_{name}.html")
+            with open(path, 'w') as file:
+                file.write(self._profiler.output_html())
+        else:
+            self._profiler.disable()
+            path = os.path.join(self.output_dir, f"{timestamp}_{name}.prof")
+            self._profiler.dump_stats(path)
+        self._profiler = None
+        return path
+
+    @contextmanager
+    def profile(self, label: str):
+        self.start(label)
+        try:
+            yield
+        finally:
+            self.stop()
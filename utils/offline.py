@@ -0,0 +1,232 @@
+import json
+import os
+import queue
+import threading
+import typing
+from concurrent.futures import ProcessPoolExecutor
+
+from eth_account import Account
+
+from utils.crypto import address_map
+
+
+BUNDLE_VERSION = 1
+DEFAULT_GAS = 21000
+FEE_FIELDS = ("gasPrice", "maxFeePerGas", "maxPriorityFeePerGas")
+
+
+def load_plan(path: str) -> typing.Dict[str, typing.Any]:
+    """
+    Load a signing plan.
+
+    A plan is a JSON object:
+    {
+        "chainId": 1,
+        "gas": 21000,                                   # default gas limit
+        "fees": {"maxFeePerGas": ..., "maxPriorityFeePerGas": ...} or {"gasPrice": ...},
+        "nonces": {"account_name": 0},                  # first nonce of each sender
+        "txs": [{"from": "account_name", "to": "0x...", "value": 1, "data": "0x", "nonce": 0, "gas": 21000}]
+    }
+    nonce, gas, data and fee fields of a tx are optional. Missing nonces
+    continue from "nonces" in order of appearance.
+    """
+    with open(path, 'r') as file:
+        plan = json.load(file)
+    for key in ("chainId", "txs"):
+        if key not in plan:
+            raise ValueError(f"Plan is missing '{key}'.")
+    return plan
+
+
+def build_transactions(plan: typing.Dict[str, typing.Any]) -> typing.List[typing.Dict[str, typing.Any]]:
+    """
+    Expand a plan to complete transaction dicts, still keyed by sender name in "from".
+    """
+    chain_id = int(plan["chainId"])
+    default_fees = plan.get("fees") or {}
+    default_gas = int(plan.get("gas", DEFAULT_GAS))
+    nonces = {name: int(nonce) for name, nonce in (plan.get("nonces") or {}).items()}
+
+    txs = []
+    for i, item in enumerate(plan["txs"]):
+        sender = item["from"]
+        nonce = item.get("nonce", nonces.get(sender))
+        if nonce is None:
+            raise ValueError(f"No nonce for tx #{i} from '{sender}'.")
+        nonces[sender] = int(nonce) + 1
+
+        tx = {
+            "from": sender,
+            "to": item["to"],
+            "value": int(item.get("value", 0)),
+            "gas": int(item.get("gas", default_gas)),
+            "nonce": int(nonce),
+            "chainId": chain_id,
+        }
+        if item.get("data"):
+            tx["data"] = item["data"]
+        fees = {k: int(item[k]) for k in FEE_FIELDS if k in item} or {k: int(v) for k, v in default_fees.items()}
+        if not fees:
+            raise ValueError(f"No fee fields for tx #{i} from '{sender}'.")
+        tx.update(fees)
+        txs.append(tx)
+    return txs
+
+
+def _sign_chunk(
+    txs: typing.List[typing.Dict[str, typing.Any]],
+    private_keys: typing.Dict[str, str],
+    addresses: typing.Optional[typing.Dict[str, str]] = None,
+) -> typing.List[typing.Dict[str, typing.Any]]:
+    if addresses is None:
+        addresses = address_map(private_keys)
+    records = []
+    for tx in txs:
+        tx = dict(tx)
+        sender = tx.pop("from")
+        signed = Account.sign_transaction(tx, private_keys[sender])
+        records.append({
+            "from": addresses[sender],
+            "nonce": tx["nonce"],
+            "hash": "0x" + signed.hash.hex().removeprefix("0x"),
+            "raw": "0x" + signed.raw_transaction.hex().removeprefix("0x"),
+        })
+    return records
+
+
+def sign_bundle(
+    plan: typing.Dict[str, typing.Any],
+    private_keys: typing.Dict[str, str],
+    output_path: str,
+    workers: typing.Optional[int] = None,
+    chunk_size: int = 1000,
+) -> int:
+    """
+    Sign every transaction of the plan without any RPC and write them to a bundle file.
+
+    The bundle is JSON lines: a header {"bundle": 1, "chainId": ..., "count": ...}
+    followed by one {"from", "nonce", "hash", "raw"} record per transaction,
+    in plan order.
+
+    Args:
+    plan (dict): The signing plan, see load_plan.
+    private_keys (dict): Private key of every sender name used in the plan.
+    output_path (str): Where to write the bundle.
+    workers (Optional[int]): Number of signing processes, CPU count by default.
+    chunk_size (int): Transactions signed per task.
+
+    Returns:
+    int: Number of signed transactions.
+    """
+    txs = build_transactions(plan)
+    missing = {tx["from"] for tx in txs} - set(private_keys)
+    if missing:
+        raise ValueError(f"No private key for: {', '.join(sorted(missing))}")
+
+    chunks = [txs[i:i + chunk_size] for i in range(0, len(txs), chunk_size)]
+    workers = min(workers or os.cpu_count() or 1, max(len(chunks), 1))
+    with open(output_path, 'w') as file:
+        file.write(json.dumps({"bundle": BUNDLE_VERSION, "chainId": int(plan["chainId"]), "count": len(txs)}) + "\n")
+        if workers == 1:
+            # Derive each sender address once, not once per chunk
+            keys = {sender: private_keys[sender] for sender in dict.fromkeys(tx["from"] for tx in txs)}
+            addresses = address_map(keys)
+            results = (_sign_chunk(chunk, keys, addresses) for chunk in chunks)
+            for records in results:
+                file.writelines(json.dumps(record) + "\n" for record in records)
+        else:
+            with ProcessPoolExecutor(max_workers=workers) as executor:
+                # Only ship the keys a chunk needs to its worker
+                futures = [
+                    executor.submit(_sign_chunk, chunk, {tx["from"]: private_keys[tx["from"]] for tx in chunk})
+                    for chunk in chunks
+                ]
+                for future in futures:
+                    file.writelines(json.dumps(record) + "\n" for record in future.result())
+    return len(txs)
+
+
+def read_bundle(path: str) -> typing.Tuple[typing.Dict[str, typing.Any], typing.Iterator[typing.Dict[str, typing.Any]]]:
+    """
+    Return the bundle header and a lazy iterator over its records.
+    """
+    file = open(path, 'r')
+    header = json.loads(file.readline())
+    if header.get("bundle") != BUNDLE_VERSION:
+        file.close()
+        raise ValueError(f"Unsupported bundle file: {path}")
+
+    def records():
+        with file:
+            for line in file:
+                if line.strip():
+                    yield json.loads(line)
+
+    return header, records()
+
+
+def broadcast_bundle(
+    w3,
+    path: str,
+    concurrency: int = 8,
+    on_result: typing.Optional[typing.Callable[[typing.Dict[str, typing.Any]], None]] = None,
+) -> typing.Dict[str, int]:
+    """
+    Stream a bundle to the connected endpoint with bounded concurrency.
+
+    Each sender is pinned to one lane, so its transactions reach the node in
+    nonce order while different senders are sent in parallel.
+
+    Args:
+    w3 (Web3): Connected Web3 instance on the bundle chain.
+    path (str): The bundle file.
+    concurrency (int): Number of parallel senders.
+    on_result (Callable): Called with every record plus "error" or "sent". The first
+        exception it raises is raised again once the whole bundle is sent.
+
+    Returns:
+    Dict[str, int]: Counts of sent and failed transactions.
+    """
+    header, records = read_bundle(path)
+    chain_id = w3.eth.chain_id
+    if int(header["chainId"]) != chain_id:
+        raise ValueError(f"Bundle is for chain {header['chainId']}, connected to {chain_id}.")
+
+    summary = {"sent": 0, "failed": 0}
+    callback_errors: typing.List[Exception] = []
+    lock = threading.Lock()
+    lanes = [queue.Queue(maxsize=256) for _ in range(concurrency)]
+
+    def lane_worker(lane: queue.Queue):
+        while True:
+            record = lane.get()
+            if record is None:
+                return
+            try:
+                w3.eth.send_raw_transaction(record["raw"])
+                record["sent"] = True
+            except Exception as e:
+                record["error"] = str(e)
+            with lock:
+                summary["failed" if "error" in record else "sent"] += 1
+                if on_result is not None:
+                    # A failing callback must not stop the lane, or put() blocks on its full queue
+                    try:
+                        on_result(record)
+                    except Exception as e:
+                        callback_errors.append(e)
+
+    threads = [threading.Thread(target=lane_worker, args=(lane,), daemon=True) for lane in lanes]
+    for thread in threads:
+        thread.start()
+    try:
+        for record in records:
+            lanes[hash(record["from"]) % concurrency].put(record)
+    finally:
+        for lane in lanes:
+            lane.put(None)
+        for thread in threads:
+            thread.join()
+    if callback_errors:
+        raise callback_errors[0]
+    return summary
@@ -0,0 +1,175 @@
+import time
+import typing
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+import requests
+from requests.adapters import HTTPAdapter
+from web3 import Web3
+
+from utils.abi import get_abi
+from utils.batch import batch_call
+from utils.cache import enable_cache, RPCCache
+from utils.endpoint import expand_url, fastest
+from utils.init import DATA_PATH, load_contracts
+from utils.metrics import instrument
+from utils.ratelimit import rate_limit
+from utils.snapshot import NATIVE
+
+
+Row = typing.Dict[str, typing.Any]
+
+
+def connect(endpoint: str, concurrency: int, timeout: float = 10.0, data_path: str = DATA_PATH) -> Web3:
+    """
+    Return a Web3 instance with its own connection pool sized to its concurrency budget.
+    """
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=1, pool_maxsize=concurrency)
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    w3 = rate_limit(instrument(Web3(Web3.HTTPProvider(endpoint, request_kwargs={"timeout": timeout}, session=session))))
+    w3.rpc_cache = enable_cache(w3, RPCCache(data_path=data_path))
+    return w3
+
+
+def token_contracts(w3: Web3, chain_id: str, data_path: str = DATA_PATH) -> typing.List[typing.Any]:
+    """
+    Return contracts of the tokens registered under <data_path>/<chainId>/.
+    """
+    if not (Path(data_path) / str(chain_id)).is_dir():
+        return []
+    contracts = []
+    for file_name in load_contracts(chain_id, data_path):
+        address = Path(file_name).stem
+        abi = get_abi(address, chain_id, data_path)
+        if abi and "balanceOf" in abi.list_functions():
+            contracts.append(w3.eth.contract(address=Web3.to_checksum_address(address), abi=abi.abi))
+    return contracts
+
+
+def scan_chain(
+    network: typing.Dict[str, str],
+    addresses: typing.Dict[str, str],
+    concurrency: int = 4,
+    auto_endpoint: bool = False,
+    chains=None,
+    data_path: str = DATA_PATH,
+    store=None,
+) -> typing.Tuple[typing.List[Row], Row]:
+    """
+    Scan native and token balances of every address on one chain.
+
+    Args:
+    network (dict): Network configuration from Networks.
+    addresses (dict): Account name -> address.
+    concurrency (int): Connections and fallback threads used for this chain.
+    auto_endpoint (bool): Use the fastest endpoint of the chain instead of the configured one.
+    chains (Networks): Chain registry, needed by auto_endpoint.
+    data_path (str): Root of the per-chain token ABIs and RPC caches.
+    store (Optional[SnapshotStore]): Balances read are written there, tagged with the head seen before reading them.
+
+    Returns:
+    Tuple[List[dict], dict]: Balance rows and the timing row of the chain.
+    """
+    chain_id = network["chainId"]
+    timing = {"chainId": chain_id, "chain": network.get("name"), "endpoint": None, "calls": 0, "seconds": 0.0}
+    started = time.perf_counter()
+    try:
+        if auto_endpoint and chains is not None:
+            endpoint, _ = fastest(chains, chain_id)
+        else:
+            endpoint = expand_url(network.get("rpcUrl") or "")
+        if not endpoint:
+            raise ValueError("No usable RPC URL")
+        timing["endpoint"] = endpoint
+        w3 = connect(endpoint, concurrency, data_path=data_path)
+        head = w3.eth.block_number if store is not None else None
+
+        tokens = token_contracts(w3, chain_id, data_path)
+        metadata = batch_call(
+            w3, [(call, ()) for token in tokens for call in (token.functions.decimals, token.functions.symbol)],
+            max_workers=concurrency,
+        )
+        calls = [(w3.eth.get_balance, (address, "latest")) for address in addresses.values()]
+        for token in tokens:
+            calls += [(token.functions.balanceOf, (address,)) for address in addresses.values()]
+        balances = batch_call(w3, calls, max_workers=concurrency)
+        timing["calls"] = len(metadata) + len(calls)
+    except Exception as e:
+        timing["seconds"] = time.perf_counter() - started
+        timing["error"] = str(e)
+        return [], timing
+
+    assets = [(None, network.get("symbol"), 18)]
+    for i, token in enumerate(tokens):
+        decimals, symbol = metadata[2 * i], metadata[2 * i + 1]
+        assets.append((
+            token.address,
+            symbol if not isinstance(symbol, Exception) else token.address,
+            decimals if not isinstance(decimals, Exception) else 18,
+        ))
+
+    rows = []
+    balances = iter(balances)
+    for token, symbol, decimals in assets:
+        for name, address in addresses.items():
+            balance = next(balances)
+            row = {"chainId": chain_id, "chain": network.get("name"), "account": name, "address": address, "asset": symbol, "token": token}
+            if isinstance(balance, Exception):
+                row["error"] = str(balance)
+            else:
+                row.update(balance=balance, decimals=decimals)
+            rows.append(row)
+    if store is not None:
+        read: typing.Dict[str, typing.Dict[str, int]] = {}
+        for row in rows:
+            if "error" not in row:
+                read.setdefault(row["token"] or NATIVE, {})[row["address"]] = row["balance"]
+        # Rows only, the snapshot block of each asset still belongs to SnapshotStore.refresh
+        for token, balances in read.items():
+            store.update(int(chain_id), balances, head, token=token)
+    timing["seconds"] = time.perf_counter() - started
+    return rows, timing
+
+
+def scan(
+    networks: typing.List[typing.Dict[str, str]],
+    addresses: typing.Dict[str, str],
+    max_chains: int = 8,
+    concurrency: int = 4,
+    auto_endpoint: bool = False,
+    chains=None,
+    data_path: str = DATA_PATH,
+    store=None,
+) -> typing.Tuple[typing.List[Row], typing.List[Row]]:
+    """
+    Scan many chains concurrently, each with its own connection pool.
+
+    Args:
+    networks (list): Network configurations from Networks.
+    addresses (dict): Account name -> address.
+    max_chains (int): Chains scanned at the same time.
+    concurrency (int): Concurrency budget of each chain.
+    auto_endpoint (bool): Use the fastest endpoint of each chain.
+    chains (Networks): Chain registry, needed by auto_endpoint.
+    data_path (str): Root of the per-chain token ABIs and RPC caches.
+    store (Optional[SnapshotStore]): Balances read on every chain are written there.
+
+    Returns:
+    Tuple[List[dict], List[dict]]: Balance rows of all chains and one timing row per chain.
+    """
+    rows, timings = [], []
+    if not networks:
+        return rows, timings
+    with ThreadPoolExecutor(max_workers=min(max_chains, len(networks))) as executor:
+        results = executor.map(lambda network: scan_chain(network, addresses, concurrency, auto_endpoint, chains, data_path, store), networks)
+        for chain_rows, timing in results:
+            rows.extend(chain_rows)
+            timings.append(timing)
+    return rows, timings
+
+
+def format_amount(balance: int, decimals: int) -> str:
+    value = f"{balance / 10 ** decimals:.6f}".rstrip("0").rstrip(".")
+    return value or "0"
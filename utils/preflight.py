@@ -0,0 +1,115 @@
+import typing
+
+from web3.exceptions import ContractLogicError
+
+from utils.abi import ABIDecoder
+from utils.batch import batch_call
+
+
+OK = "ok"
+INSUFFICIENT_FUNDS = "insufficient_funds"
+REVERTED = "reverted"
+OUT_OF_GAS = "out_of_gas"
+ERROR = "error"
+
+# Decodes Error(string) and Panic(uint256) reverts of any contract
+BUILTIN_DECODER = ABIDecoder([], "0x" + "00" * 20)
+
+# Fields eth_estimateGas and eth_call accept
+CALL_FIELDS = ("from", "to", "value", "data", "gasPrice", "maxFeePerGas", "maxPriorityFeePerGas")
+
+
+def _call_params(tx: typing.Dict[str, typing.Any]) -> typing.Dict[str, typing.Any]:
+    return {field: tx[field] for field in CALL_FIELDS if field in tx}
+
+
+def _revert_data(error: Exception) -> typing.Optional[str]:
+    data = getattr(error, "data", None)
+    if isinstance(data, dict):
+        data = data.get("data")
+    if isinstance(data, str) and data.startswith("0x") and len(data) >= 10:
+        return data
+    return None
+
+
+def _classify(error: Exception, decoder=None) -> typing.Tuple[str, str]:
+    message = str(error)
+    if "insufficient funds" in message.lower():
+        return INSUFFICIENT_FUNDS, message
+    if isinstance(error, ContractLogicError):
+        data = _revert_data(error)
+        reason = (decoder or BUILTIN_DECODER).decode_error(data) if data else None
+        return REVERTED, reason or getattr(error, "message", None) or message
+    if "gas required exceeds" in message.lower() or "out of gas" in message.lower():
+        return OUT_OF_GAS, message
+    return ERROR, message
+
+
+def max_cost(tx: typing.Dict[str, typing.Any], gas: int) -> int:
+    return tx.get("value", 0) + gas * tx.get("maxFeePerGas", tx.get("gasPrice", 0))
+
+
+def simulate(w3, txs: typing.Sequence[typing.Dict[str, typing.Any]], decoder=None) -> typing.List[typing.Dict[str, typing.Any]]:
+    """
+    Simulate transactions before signing them.
+
+    Every tx is estimated in one batched eth_estimateGas round, reverts
+    without revert data are replayed with a batched eth_call to get it.
+    Senders must afford value + gas * max fee of all their transactions,
+    checked against one batched eth_getBalance round.
+
+    Args:
+    w3 (Web3): Connected Web3 instance.
+    txs (Sequence[dict]): Transactions with at least from and to, gas is the limit to check against.
+    decoder (ABIDecoder): ABI of the called contract, used to decode custom errors.
+
+    Returns:
+    List[dict]: One row per tx: status (ok, insufficient_funds, reverted, out_of_gas, error), gas and reason.
+    """
+    estimates = batch_call(w3, [(w3.eth.estimate_gas, (_call_params(tx),)) for tx in txs])
+    senders = list(dict.fromkeys(tx["from"] for tx in txs))
+    balances = dict(zip(senders, batch_call(w3, [(w3.eth.get_balance, (sender, "latest")) for sender in senders])))
+
+    results = []
+    for index, (tx, estimate) in enumerate(zip(txs, estimates)):
+        row = {"index": index, "from": tx["from"]}
+        if isinstance(estimate, Exception):
+            row["status"], row["reason"] = _classify(estimate, decoder)
+        elif tx.get("gas") and estimate > tx["gas"]:
+            row.update(status=OUT_OF_GAS, gas=estimate, reason=f"needs {estimate} gas, limit is {tx['gas']}")
+        else:
+            row.update(status=OK, gas=estimate)
+        results.append(row)
+
+    # Custom errors of nodes that drop revert data from eth_estimateGas
+    replay = [
+        row for row in results
+        if row["status"] == REVERTED and decoder is not None and _revert_data(estimates[row["index"]]) is None
+    ]
+    if replay:
+        calls = batch_call(w3, [(w3.eth.call, (_call_params(txs[row["index"]]), "latest")) for row in replay])
+        for row, result in zip(replay, calls):
+            if isinstance(result, ContractLogicError):
+                row["reason"] = _classify(result, decoder)[1]
+
+    # Funds are spent in order, a sender can afford its first txs but not the later ones
+    spent: typing.Dict[str, int] = {}
+    for tx, row in zip(txs, results):
+        if row["status"] != OK:
+            continue
+        balance = balances[tx["from"]]
+        if isinstance(balance, Exception):
+            continue
+        cost = max_cost(tx, tx.get("gas") or row["gas"])
+        if spent.get(tx["from"], 0) + cost > balance:
+            row.update(status=INSUFFICIENT_FUNDS, reason=f"needs {cost} wei, balance is {balance - spent.get(tx['from'], 0)}")
+        else:
+            spent[tx["from"]] = spent.get(tx["from"], 0) + cost
+    return results
+
+
+def summary(results: typing.List[typing.Dict[str, typing.Any]]) -> typing.Dict[str, int]:
+    counts: typing.Dict[str, int] = {}
+    for row in results:
+        counts[row["status"]] = counts.get(row["status"], 0) + 1
+    return counts
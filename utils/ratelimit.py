@@ -0,0 +1,290 @@
+import os
+import random
+import threading
+import time
+import typing
+from email.utils import parsedate_to_datetime
+from urllib.parse import urlparse
+
+import requests
+from web3.middleware import Web3Middleware
+
+from utils.metrics import metrics
+
+
+MIN_RATE = 0.5
+# Seconds over which the request rate of an uncapped endpoint is observed
+OBSERVE_WINDOW = 1.0
+# AIMD: halve on throttling, add INCREASE requests/s per rate-worth of successes
+DECREASE = 0.5
+INCREASE = 1.0
+# Throttling events closer than this count as one, concurrent 429s halve the rate once
+DECREASE_COOLDOWN = 1.0
+MAX_RETRIES = 4
+BACKOFF = 0.25
+MAX_BACKOFF = 10.0
+# Sends may have reached the node before the error, retrying them is up to the caller
+NON_IDEMPOTENT_METHODS = {
+    "eth_sendRawTransaction",
+    "eth_sendTransaction",
+    "eth_sign",
+    "eth_signTransaction",
+    "personal_sendTransaction",
+}
+THROTTLE_STATUSES = {429, 503}
+# JSON-RPC error codes providers use for rate limits, -32005 also means "response too large"
+THROTTLE_CODES = {-32029, -32090, 429}
+THROTTLE_MESSAGES = ("rate limit", "too many requests", "request count exceeded", "compute units per second")
+
+
+def _retry_after(response) -> typing.Optional[float]:
+    value = response.headers.get("Retry-After") if response is not None else None
+    if not value:
+        return None
+    try:
+        return max(float(value), 0.0)
+    except ValueError:
+        pass
+    try:
+        return max(parsedate_to_datetime(value).timestamp() - time.time(), 0.0)
+    except (TypeError, ValueError):
+        return None
+
+
+def _throttled(response) -> bool:
+    # Some providers answer 200 with a rate limit error in the JSON-RPC body
+    items = response if isinstance(response, list) else [response]
+    for item in items:
+        error = item.get("error") if isinstance(item, dict) else None
+        if not isinstance(error, dict):
+            continue
+        message = str(error.get("message", "")).lower()
+        if error.get("code") in THROTTLE_CODES or any(text in message for text in THROTTLE_MESSAGES):
+            return True
+    return False
+
+
+class EndpointLimiter:
+    def __init__(self, endpoint: str, rate: typing.Optional[float] = None, burst: typing.Optional[float] = None, min_rate: float = MIN_RATE):
+        """
+        Token bucket of one endpoint with an AIMD-adjusted rate.
+
+        A configured rate is where the bucket starts and also its ceiling.
+        Without one the endpoint is uncapped until its first 429, rate limit
+        error or timeout, the bucket then starts at half the rate observed
+        and has no ceiling. Either way the rate is halved on throttling and
+        grows back by INCREASE requests/s for every rate-worth of successful
+        calls. Retry-After pauses every caller of the endpoint.
+
+        Args:
+        endpoint (str): RPC URL, only its host is reported in metrics.
+        rate (Optional[float]): Allowed requests per second, uncapped until throttled by default.
+        burst (Optional[float]): Bucket size, one second worth of rate by default.
+        min_rate (float): Floor of the adjusted rate.
+        """
+        self.endpoint = endpoint
+        # URLs often embed API keys
+        self.host = urlparse(endpoint).hostname or endpoint
+        self.max_rate = rate
+        self.rate = rate
+        self.min_rate = min(min_rate, rate) if rate else min_rate
+        self.burst_size = burst
+        self.tokens = self.burst
+        self.updated = time.monotonic()
+        self.blocked_until = 0.0
+        self.decreased = 0.0
+        # Requests of the current and the last observation window, while uncapped
+        self.window = self.updated
+        self.sent = 0.0
+        self.observed = 0.0
+        self._lock = threading.Lock()
+
+    @property
+    def burst(self) -> float:
+        return self.burst_size or max(self.rate or 0.0, 1.0)
+
+    def _refill(self, now: float):
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def _observe(self, now: float, cost: float):
+        if now - self.window >= OBSERVE_WINDOW:
+            self.observed = self.sent / (now - self.window)
+            self.window, self.sent = now, 0.0
+        self.sent += cost
+
+    def acquire(self, cost: float = 1) -> float:
+        """
+        Block until cost requests are allowed and return the seconds waited.
+
+        A batch larger than the bucket goes out once the bucket is full and
+        leaves it in debt, so it never waits forever.
+        """
+        waited = 0.0
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                if self.rate is None:
+                    delay = self.blocked_until - now
+                    if delay <= 0:
+                        self._observe(now, cost)
+                        break
+                else:
+                    self._refill(now)
+                    needed = min(cost, self.burst)
+                    delay = max(self.blocked_until - now, (needed - self.tokens) / self.rate if self.tokens < needed else 0.0)
+                    if delay <= 0:
+                        self.tokens -= cost
+                        break
+            time.sleep(min(delay, 1.0))
+            waited += min(delay, 1.0)
+        if waited:
+            metrics.record_limit(self.host, "waited", waited)
+        return waited
+
+    def succeeded(self, cost: float = 1):
+        with self._lock:
+            if self.rate is not None:
+                self.rate = min(self.max_rate or float("inf"), self.rate + INCREASE * cost / self.rate)
+
+    def throttled(self, retry_after: typing.Optional[float] = None, event: str = "throttled"):
+        """
+        Cut the rate after a 429, a rate limit error or a timeout, and honour Retry-After.
+        """
+        with self._lock:
+            now = time.monotonic()
+            if self.rate is None:
+                # First throttling of an uncapped endpoint, start below what it was sent
+                current = self.sent / max(now - self.window, OBSERVE_WINDOW)
+                self.rate = max(self.min_rate, max(self.observed, current) * DECREASE)
+                self.updated = now
+                self.decreased = now
+            elif now - self.decreased >= DECREASE_COOLDOWN:
+                self.rate = max(self.min_rate, self.rate * DECREASE)
+                self.decreased = now
+            self.tokens = min(self.tokens, 0.0)
+            if retry_after is not None:
+                self.blocked_until = max(self.blocked_until, now + retry_after)
+        metrics.record_limit(self.host, event, rate=self.rate)
+
+    def stats(self) -> typing.Dict[str, typing.Any]:
+        with self._lock:
+            if self.rate is None:
+                return {"endpoint": self.host, "rate": None, "max_rate": None, "tokens": None}
+            return {"endpoint": self.host, "rate": round(self.rate, 2), "max_rate": self.max_rate, "tokens": round(self.tokens, 2)}
+
+
+def parse_limits(spec: typing.Optional[str]) -> typing.Dict[str, typing.Tuple[float, typing.Optional[float]]]:
+    """
+    Parse "host=rate[:burst],..." e.g. "publicnode.com=20,infura.io=10:20" into host -> (rate, burst).
+    """
+    limits = {}
+    for entry in (spec or "").split(","):
+        if "=" not in entry:
+            continue
+        host, value = entry.split("=", 1)
+        rate, _, burst = value.partition(":")
+        try:
+            limits[host.strip().lower()] = (float(rate), float(burst) if burst else None)
+        except ValueError:
+            print(f"Invalid RATE_LIMITS entry: {entry}")
+    return limits
+
+
+_limiters: typing.Dict[str, EndpointLimiter] = {}
+_limiters_lock = threading.Lock()
+
+
+def limiter_for(endpoint: str, rate: typing.Optional[float] = None, burst: typing.Optional[float] = None) -> EndpointLimiter:
+    """
+    Return the limiter shared by every Web3 instance of endpoint.
+
+    Without an explicit rate, the longest host suffix in RATE_LIMITS (.env)
+    decides, the endpoint is uncapped until throttled otherwise.
+    """
+    with _limiters_lock:
+        if endpoint in _limiters:
+            return _limiters[endpoint]
+        if rate is None:
+            host = (urlparse(endpoint).hostname or "").lower()
+            limits = parse_limits(os.getenv("RATE_LIMITS"))
+            matches = [suffix for suffix in limits if host == suffix or host.endswith("." + suffix)]
+            if matches:
+                rate, burst = limits[max(matches, key=len)]
+        limiter = EndpointLimiter(endpoint, rate, burst)
+        _limiters[endpoint] = limiter
+        return limiter
+
+
+class RateLimitMiddleware(Web3Middleware):
+    limiter: EndpointLimiter
+    retries: int = MAX_RETRIES
+
+    def _send(self, send: typing.Callable[[], typing.Any], methods: typing.List[str]):
+        idempotent = not any(method in NON_IDEMPOTENT_METHODS for method in methods)
+        attempt = 0
+        while True:
+            self.limiter.acquire(len(methods))
+            error = None
+            try:
+                response = send()
+            except requests.HTTPError as e:
+                if e.response is None or e.response.status_code not in THROTTLE_STATUSES:
+                    raise
+                error = e
+                self.limiter.throttled(_retry_after(e.response))
+            except (requests.Timeout, requests.ConnectionError) as e:
+                error = e
+                self.limiter.throttled(event="timeout")
+            else:
+                if not _throttled(response):
+                    self.limiter.succeeded(len(methods))
+                    return response
+                self.limiter.throttled()
+
+            if not idempotent or attempt >= self.retries:
+                if error is not None:
+                    raise error
+                return response
+            attempt += 1
+            metrics.record_limit(self.limiter.host, "retries")
+            # Full jitter keeps the callers of a throttled endpoint from retrying in lockstep
+            time.sleep(random.uniform(0, min(MAX_BACKOFF, BACKOFF * 2 ** attempt)))
+
+    def wrap_make_request(self, make_request):
+        def middleware(method, params):
+            return self._send(lambda: make_request(method, params), [method])
+
+        return middleware
+
+    def wrap_make_batch_request(self, make_batch_request):
+        def middleware(requests_info):
+            return self._send(lambda: make_batch_request(requests_info), [method for method, _ in requests_info])
+
+        return middleware
+
+
+def rate_limit(w3, rate: typing.Optional[float] = None, burst: typing.Optional[float] = None, retries: int = MAX_RETRIES):
+    """
+    Add the rate limiter of the provider endpoint to a Web3 instance once.
+
+    Add it after instrument() and before enable_cache(), so every attempt is
+    measured and cache hits do not use tokens. The provider's own blind
+    retries are turned off, the limiter retries with backoff instead.
+    """
+    if "rate_limit" in w3.middleware_onion:
+        return w3
+    endpoint = getattr(w3.provider, "endpoint_uri", None) or str(w3.provider)
+    limiter = limiter_for(str(endpoint), rate, burst)
+
+    def build(w3):
+        middleware = RateLimitMiddleware(w3)
+        middleware.limiter = limiter
+        middleware.retries = retries
+        return middleware
+
+    w3.middleware_onion.add(build, "rate_limit")
+    if hasattr(w3.provider, "exception_retry_configuration"):
+        w3.provider.exception_retry_configuration = None
+    w3.rate_limiter = limiter
+    return w3
@@ -0,0 +1,180 @@
+import time
+import typing
+from concurrent.futures import ThreadPoolExecutor
+
+from eth_account import Account
+
+from utils.batch import batch_call
+from utils.crypto import address_map
+from utils.journal import journal as default_journal, TxJournal
+
+
+# Nodes accept a replacement paying at least 10% more, bump a bit over it
+DEFAULT_BUMP = 1.125
+CANCEL_GAS = 21000
+SPEED_UP = "speed_up"
+CANCEL = "cancel"
+
+Row = typing.Dict[str, typing.Any]
+
+
+def find_stuck(w3, addresses: typing.Dict[str, str]) -> typing.List[Row]:
+    """
+    Return one row per nonce between the latest and the pending nonce of each address.
+    """
+    latest = batch_call(w3, [(w3.eth.get_transaction_count, (address, "latest")) for address in addresses.values()])
+    pending = batch_call(w3, [(w3.eth.get_transaction_count, (address, "pending")) for address in addresses.values()])
+    stuck = []
+    for (name, address), first, last in zip(addresses.items(), latest, pending):
+        if isinstance(first, Exception) or isinstance(last, Exception):
+            stuck.append({"account": name, "address": address, "status": "failed", "error": str(first if isinstance(first, Exception) else last)})
+            continue
+        for nonce in range(first, last):
+            stuck.append({"account": name, "address": address, "nonce": nonce})
+    return stuck
+
+
+def _txpool_versions(w3, address: str) -> typing.Dict[int, Row]:
+    # Geth-style nodes expose the pending txs of a sender, others do not
+    try:
+        response = w3.provider.make_request("txpool_contentFrom", [address])
+        content = response.get("result") or {}
+    except Exception:
+        return {}
+    txs = {}
+    for pool in ("queued", "pending"):
+        for nonce, tx in (content.get(pool) or {}).items():
+            txs[int(nonce)] = {
+                "to": tx.get("to"),
+                "value": int(tx.get("value", "0x0"), 16),
+                "data": tx.get("input", "0x"),
+                "gas": int(tx.get("gas", "0x0"), 16),
+                **{
+                    field: int(tx[field], 16)
+                    for field in ("gasPrice", "maxFeePerGas", "maxPriorityFeePerGas")
+                    if tx.get(field) and (field != "gasPrice" or "maxFeePerGas" not in tx)
+                },
+            }
+    return txs
+
+
+def bump_fees(previous: Row, current: typing.Dict[str, int], bump: float = DEFAULT_BUMP) -> typing.Dict[str, int]:
+    """
+    Return fee fields paying at least bump times the previous version and no less than current fees.
+    """
+    previous_price = previous.get("maxFeePerGas", previous.get("gasPrice", 0))
+    previous_tip = previous.get("maxPriorityFeePerGas", previous.get("gasPrice", 0))
+    if "gasPrice" in current:
+        return {"gasPrice": max(int(previous_price * bump) + 1, current["gasPrice"])}
+    max_fee = max(int(previous_price * bump) + 1, current["maxFeePerGas"])
+    tip = max(int(previous_tip * bump) + 1, current["maxPriorityFeePerGas"])
+    return {"maxFeePerGas": max(max_fee, tip), "maxPriorityFeePerGas": tip}
+
+
+def replace_stuck(
+    w3,
+    private_keys: typing.Dict[str, str],
+    fees: typing.Dict[str, int],
+    mode: str = SPEED_UP,
+    bump: float = DEFAULT_BUMP,
+    concurrency: int = 8,
+    journal: TxJournal = default_journal,
+) -> typing.List[Row]:
+    """
+    Re-sign every stuck transaction of the accounts at the same nonce with higher fees.
+
+    speed_up sends the same call again, taken from the tx journal or from
+    txpool_contentFrom, cancel sends 0 to the sender itself. Stuck txs
+    whose content is unknown are cancelled. Replacements are broadcast
+    concurrently and logged in the journal.
+
+    Args:
+    w3 (Web3): Connected Web3 instance.
+    private_keys (dict): Account name -> private key.
+    fees (dict): Current fee fields, from FeeOracle.fees().
+    mode (str): "speed_up" or "cancel".
+    bump (float): Minimum fee multiplier over the replaced version.
+    concurrency (int): Replacements in flight.
+    journal (TxJournal): Where sent txs are looked up and replacements logged.
+
+    Returns:
+    List[dict]: One row per stuck nonce with status replaced or failed, and every known hash of the nonce.
+    """
+    chain_id = w3.eth.chain_id
+    addresses = address_map(private_keys)
+    rows = find_stuck(w3, addresses)
+    versions = journal.versions(chain_id, addresses.values())
+    pools: typing.Dict[str, typing.Dict[int, Row]] = {}
+
+    signed = []
+    for row in rows:
+        if "nonce" not in row:
+            continue
+        sent = versions.get((row["address"].lower(), row["nonce"]), [])
+        row["hashes"] = [record["hash"] for record in sent]
+        previous = sent[-1]["tx"] if sent else None
+        if previous is None:
+            if row["address"] not in pools:
+                pools[row["address"]] = _txpool_versions(w3, row["address"])
+            previous = pools[row["address"]].get(row["nonce"])
+        if mode == SPEED_UP and previous is not None:
+            tx = {field: previous[field] for field in ("to", "value", "data", "gas") if field in previous}
+            row["action"] = SPEED_UP
+        else:
+            tx = {"to": row["address"], "value": 0, "data": "0x", "gas": CANCEL_GAS}
+            row["action"] = CANCEL
+        # Unknown fees of the stuck version: outbid the current fees
+        tx.update(bump_fees(previous or fees, fees, bump))
+        tx.update(nonce=row["nonce"], chainId=chain_id)
+        try:
+            raw = Account.sign_transaction(tx, private_keys[row["account"]]).raw_transaction
+            signed.append((row, tx, raw))
+        except Exception as e:
+            row.update(status="failed", error=str(e))
+
+    def broadcast(item):
+        row, tx, raw = item
+        try:
+            tx_hash = w3.eth.send_raw_transaction(raw)
+            journal.record(chain_id, row["address"], tx, tx_hash)
+            row["hash"] = "0x" + tx_hash.hex().removeprefix("0x")
+            row["hashes"].append(row["hash"])
+            row["status"] = "replaced"
+        except Exception as e:
+            row.update(status="failed", error=str(e))
+
+    if signed:
+        with ThreadPoolExecutor(max_workers=concurrency) as executor:
+            list(executor.map(broadcast, signed))
+    return rows
+
+
+def track(w3, rows: typing.List[Row], timeout: float = 300, poll: float = 3.0) -> typing.List[Row]:
+    """
+    Wait until the stuck nonces are mined and tell which version made it.
+
+    Sets status to mined with the mined hash, "replacement" when it is the
+    one sent by replace_stuck, or to pending after timeout.
+    """
+    waiting = [row for row in rows if row.get("status") == "replaced"]
+    deadline = time.monotonic() + timeout
+    while waiting:
+        addresses = list(dict.fromkeys(row["address"] for row in waiting))
+        nonces = dict(zip(addresses, batch_call(w3, [(w3.eth.get_transaction_count, (address, "latest")) for address in addresses])))
+        mined = [row for row in waiting if not isinstance(nonces[row["address"]], Exception) and nonces[row["address"]] > row["nonce"]]
+        candidates = [(row, tx_hash) for row in mined for tx_hash in row["hashes"]]
+        receipts = batch_call(w3, [(w3.eth.get_transaction_receipt, (tx_hash,)) for _, tx_hash in candidates])
+        for (row, tx_hash), receipt in zip(candidates, receipts):
+            if not isinstance(receipt, Exception) and receipt is not None:
+                row.update(status="mined", mined=tx_hash, replacement=tx_hash == row.get("hash"))
+        # A nonce taken by a tx we never logged is mined too, by an unknown version
+        for row in mined:
+            if row.get("status") != "mined":
+                row.update(status="mined", mined=None, replacement=False)
+        waiting = [row for row in waiting if row.get("status") != "mined"]
+        if not waiting or time.monotonic() > deadline:
+            break
+        time.sleep(poll)
+    for row in waiting:
+        row["status"] = "pending"
+    return rows
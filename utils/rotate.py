@@ -0,0 +1,157 @@
+import json
+import os
+import typing
+from concurrent.futures import ProcessPoolExecutor
+
+from cryptography.fernet import Fernet, MultiFernet, InvalidToken
+from dotenv import set_key
+
+from utils.filelock import lock, atomic_write
+from utils.keystore import MappedKeystore, is_mapped, write_keystore
+
+
+CHUNK_SIZE = 5000
+SIDE_SUFFIX = ".rotating"
+
+_cipher: typing.Optional[MultiFernet] = None
+_old_cipher: typing.Optional[MultiFernet] = None
+_new_cipher: typing.Optional[Fernet] = None
+
+
+def _init_worker(tokens: typing.List[bytes]):
+    global _cipher, _old_cipher, _new_cipher
+    _cipher = MultiFernet([Fernet(token) for token in tokens])
+    _old_cipher = MultiFernet([Fernet(token) for token in tokens[1:]])
+    _new_cipher = Fernet(tokens[0])
+
+
+def _rotate_chunk(items: typing.List[typing.Tuple[str, str]]) -> typing.List[typing.Tuple[str, str]]:
+    # MultiFernet.rotate decrypts with any token and encrypts with the first one
+    return [(name, _cipher.rotate(value.encode()).decode()) for name, value in items]
+
+
+def _verify_chunk(items: typing.List[typing.Tuple[str, str, str]]) -> typing.List[str]:
+    # Names whose new entry is not the old plaintext under the new token alone
+    mismatches = []
+    for name, old, new in items:
+        try:
+            if _new_cipher.decrypt(new.encode()) != _old_cipher.decrypt(old.encode()):
+                mismatches.append(name)
+        except InvalidToken:
+            mismatches.append(name)
+    return mismatches
+
+
+def _map_chunks(func, items: typing.List[typing.Any], tokens: typing.List[bytes], workers: int, chunk_size: int) -> typing.List[typing.Any]:
+    chunks = [items[i:i + chunk_size] for i in range(0, len(items), chunk_size)]
+    if workers <= 1 or len(chunks) <= 1:
+        _init_worker(tokens)
+        return [result for chunk in chunks for result in func(chunk)]
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=(tokens,)) as executor:
+        return [result for chunk in executor.map(func, chunks) for result in chunk]
+
+
+def _rotate_all(values: typing.Dict[str, str], tokens: typing.List[bytes], workers: int, chunk_size: int) -> typing.Dict[str, str]:
+    return dict(_map_chunks(_rotate_chunk, list(values.items()), tokens, workers, chunk_size))
+
+
+def _verify(old: typing.Dict[str, str], new: typing.Dict[str, str], tokens: typing.List[bytes], workers: int, chunk_size: int):
+    # Every entry is decrypted again from the side file before the swap
+    if set(old) != set(new):
+        raise ValueError("Rotated store does not hold the same names.")
+    mismatches = _map_chunks(_verify_chunk, [(name, old[name], new[name]) for name in old], tokens, workers, chunk_size)
+    if mismatches:
+        raise ValueError(f"Rotated entry {mismatches[0]} does not match the original.")
+
+
+def _load(path: str) -> typing.Dict[str, typing.Any]:
+    if not os.path.exists(path):
+        return {}
+    with open(path, 'r') as file:
+        try:
+            return json.load(file)
+        except json.JSONDecodeError:
+            return {}
+
+
+def _load_keys(path: str) -> typing.Tuple[typing.Dict[str, str], typing.Optional[typing.Dict[str, str]]]:
+    # Ciphertexts, and the stored addresses of a mapped keystore (None for JSON)
+    if not is_mapped(path):
+        return _load(path), None
+    store = MappedKeystore(path)
+    try:
+        entries = list(store.entries())
+    finally:
+        store.close()
+    return {name: value for name, value, _ in entries}, {name: address for name, _, address in entries if address}
+
+
+def _write_keys(path: str, keys: typing.Dict[str, str], addresses: typing.Optional[typing.Dict[str, str]]):
+    if addresses is None:
+        atomic_write(path, lambda file: json.dump(keys, file))
+    else:
+        atomic_write(path, lambda file: write_keystore(file, ((name, value, addresses.get(name)) for name, value in keys.items())), mode='wb')
+
+
+def rotate(
+    keys_path: str,
+    env_path: str,
+    old_token: str,
+    new_token: typing.Optional[str] = None,
+    previous_tokens: typing.Sequence[str] = (),
+    workers: typing.Optional[int] = None,
+    chunk_size: int = CHUNK_SIZE,
+) -> typing.Dict[str, typing.Any]:
+    """
+    Re-encrypt the whole keystore and its seeds file with a new token.
+
+    Entries are rotated in a process pool and written to side files, every
+    entry of which is decrypted again and checked before the cutover. The
+    cutover stores the new token in .env with the old one as
+    ENCRYPTION_TOKEN_PREVIOUS first, then renames the side files over the
+    stores, so an interrupted rotation leaves every entry readable. Writers
+    of the keystore are blocked for the duration.
+
+    Args:
+    keys_path (str): Keystore file, JSON or mapped.
+    env_path (str): .env file holding ENCRYPTION_TOKEN.
+    old_token (str): Current token.
+    new_token (Optional[str]): Token to rotate to, a new one is generated and stored in .env by default.
+    previous_tokens (Sequence[str]): Older tokens some entries may still use.
+    workers (Optional[int]): Worker processes, all CPUs by default.
+    chunk_size (int): Entries per task.
+
+    Returns:
+    dict: Number of rotated keys and seeds.
+    """
+    new_token = new_token or Fernet.generate_key().decode()
+    tokens = [token.encode() for token in [new_token, old_token, *previous_tokens] if token]
+    workers = workers or os.cpu_count() or 1
+    seeds_path = f"{os.path.splitext(keys_path)[0]}.seeds.json"
+
+    with lock(keys_path), lock(seeds_path):
+        keys, addresses = _load_keys(keys_path)
+        seeds = _load(seeds_path)
+        try:
+            rotated_keys = _rotate_all(keys, tokens, workers, chunk_size)
+            rotated_seeds = dict(seeds, seeds=_rotate_all(seeds.get("seeds", {}), tokens, 1, chunk_size)) if seeds else {}
+        except InvalidToken:
+            raise ValueError("Some entries cannot be decrypted with the current token.")
+
+        side_keys, side_seeds = keys_path + SIDE_SUFFIX, seeds_path + SIDE_SUFFIX
+        _write_keys(side_keys, rotated_keys, addresses)
+        if seeds:
+            atomic_write(side_seeds, lambda file: json.dump(rotated_seeds, file))
+
+        _verify(keys, _load_keys(side_keys)[0], tokens, workers, chunk_size)
+        if seeds:
+            _verify(seeds.get("seeds", {}), _load(side_seeds).get("seeds", {}), tokens, 1, chunk_size)
+
+        with lock(env_path):
+            set_key(env_path, "ENCRYPTION_TOKEN_PREVIOUS", old_token)
+            set_key(env_path, "ENCRYPTION_TOKEN", new_token)
+        if seeds:
+            os.replace(side_seeds, seeds_path)
+        os.replace(side_keys, keys_path)
+
+    return {"keys": len(rotated_keys), "seeds": len(rotated_seeds.get("seeds", {}))}
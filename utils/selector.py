@@ -0,0 +1,256 @@
+import bisect
+import re
+import typing
+from array import array
+
+import inquirer
+
+
+PAGE_SIZE = 20
+# Keystores up to this size keep the plain checkbox/list prompts
+SMALL_STORE = 200
+RANGE_REGEX = re.compile(r"^(?:(?P<prefix>.*?)_?)?(?P<start>\d+)-(?P<end>\d+)$")
+ADDRESS_REGEX = re.compile(r"^0x[0-9a-fA-F]*$")
+
+NEXT_PAGE = "» Next page"
+PREVIOUS_PAGE = "« Previous page"
+NEW_SEARCH = "New search"
+DONE = "Done"
+
+
+def _batch(name: str) -> str:
+    # Same grouping as KeyManager.get_available_batches
+    return name.split("_")[0]
+
+
+def _suffix(name: str) -> typing.Optional[int]:
+    _, _, suffix = name.rpartition("_")
+    return int(suffix) if suffix.isdigit() else None
+
+
+class AccountIndex:
+    def __init__(self, names: typing.Iterable[str], addresses: typing.Optional[typing.Dict[str, str]] = None):
+        """
+        Search index over account names, and addresses when they are known.
+
+        Names are kept sorted for prefix lookups, a trigram index for
+        substring lookups is built on the first one. Results are lists of
+        positions in the keystore order, names are only materialized a page
+        at a time.
+
+        Args:
+        names (Iterable[str]): Account names in keystore order.
+        addresses (Optional[dict]): Account name -> address.
+        """
+        self.names = list(names)
+        self._order = sorted(range(len(self.names)), key=lambda i: self.names[i].lower())
+        self._sorted = [self.names[i].lower() for i in self._order]
+        self.batches: typing.Dict[str, typing.List[int]] = {}
+        for i, name in enumerate(self.names):
+            self.batches.setdefault(_batch(name), []).append(i)
+        self._trigrams: typing.Optional[typing.Dict[str, array]] = None
+        self._addresses: typing.List[typing.Tuple[str, int]] = []
+        if addresses:
+            self.set_addresses(addresses)
+
+    def __len__(self) -> int:
+        return len(self.names)
+
+    def set_addresses(self, addresses: typing.Dict[str, str]):
+        positions = {name: i for i, name in enumerate(self.names)}
+        self._addresses = sorted(
+            (address.lower().removeprefix("0x"), positions[name]) for name, address in addresses.items() if name in positions
+        )
+
+    def _build_trigrams(self) -> typing.Dict[str, array]:
+        trigrams: typing.Dict[str, array] = {}
+        for i, name in enumerate(self.names):
+            name = name.lower()
+            for gram in {name[j:j + 3] for j in range(len(name) - 2)}:
+                trigrams.setdefault(gram, array("I")).append(i)
+        return trigrams
+
+    def prefix(self, text: str) -> typing.List[int]:
+        text = text.lower()
+        start = bisect.bisect_left(self._sorted, text)
+        end = bisect.bisect_left(self._sorted, text + "\uffff")
+        return sorted(self._order[start:end])
+
+    def contains(self, text: str) -> typing.List[int]:
+        text = text.lower()
+        if len(text) < 3:
+            return [i for i, name in enumerate(self.names) if text in name.lower()]
+        if self._trigrams is None:
+            self._trigrams = self._build_trigrams()
+        # Intersect from the rarest trigram, then check the candidates
+        postings = sorted((self._trigrams.get(text[j:j + 3], array("I")) for j in range(len(text) - 2)), key=len)
+        candidates = set(postings[0])
+        for posting in postings[1:]:
+            if not candidates:
+                break
+            candidates.intersection_update(posting)
+        return sorted(i for i in candidates if text in self.names[i].lower())
+
+    def regex(self, pattern: str) -> typing.List[int]:
+        compiled = re.compile(pattern)
+        return [i for i, name in enumerate(self.names) if compiled.search(name)]
+
+    def batch(self, name: str) -> typing.List[int]:
+        return list(self.batches.get(name, []))
+
+    def index_range(self, prefix: typing.Optional[str], start: int, end: int) -> typing.List[int]:
+        """
+        Return accounts prefix_start..prefix_end by their number, or positions start..end (1-based) without prefix.
+        """
+        if not prefix:
+            return list(range(max(start, 1) - 1, min(end, len(self.names))))
+        return [i for i in self.prefix(prefix + "_") if start <= (_suffix(self.names[i]) or -1) <= end]
+
+    def address(self, prefix: str) -> typing.List[int]:
+        prefix = prefix.lower().removeprefix("0x")
+        start = bisect.bisect_left(self._addresses, (prefix,))
+        end = bisect.bisect_left(self._addresses, (prefix + "g",))
+        return sorted(i for _, i in self._addresses[start:end])
+
+    def search(self, query: str) -> typing.List[int]:
+        """
+        Resolve a query:
+
+        - batch:<name>   accounts of a batch, as in get_available_batches
+        - re:<pattern>   names matching a regular expression
+        - <prefix>_<a>-<b> or <a>-<b>   numbered accounts of a batch, or positions a to b
+        - 0x<hex>        address prefix, when addresses are known
+        - anything else  names starting with it, then names containing it
+        """
+        query = query.strip()
+        if not query:
+            return list(range(len(self.names)))
+        if query.startswith("batch:"):
+            return self.batch(query[len("batch:"):].strip())
+        if query.startswith("re:"):
+            return self.regex(query[len("re:"):].strip())
+        match = RANGE_REGEX.match(query)
+        if match:
+            return self.index_range(match.group("prefix"), int(match.group("start")), int(match.group("end")))
+        if self._addresses and ADDRESS_REGEX.match(query):
+            return self.address(query)
+        found = self.prefix(query)
+        seen = set(found)
+        return found + [i for i in self.contains(query) if i not in seen]
+
+    def page(self, positions: typing.Sequence[int], number: int, size: int = PAGE_SIZE) -> typing.List[str]:
+        return [self.names[i] for i in positions[number * size:(number + 1) * size]]
+
+
+_cache: typing.Dict[str, typing.Any] = {"key": None, "index": None}
+
+
+def index_for(names: typing.Iterable[str]) -> AccountIndex:
+    """
+    Return the index of names, built again only when the names changed.
+    """
+    names = list(names)
+    key = hash(tuple(names))
+    if _cache["key"] != key:
+        _cache["key"], _cache["index"] = key, AccountIndex(names)
+    return _cache["index"]
+
+
+def select_accounts(
+    km,
+    message: str,
+    multiple: bool = True,
+    all_label: typing.Optional[str] = None,
+    addresses: typing.Optional[typing.Callable[[], typing.Dict[str, str]]] = None,
+) -> typing.List[str]:
+    """
+    Prompt for one or many accounts without listing the whole keystore.
+
+    Small keystores get the usual checkbox or list. Larger ones are searched
+    (see AccountIndex.search) or picked by batch, and matches are shown a page
+    at a time. Every match of a search can be selected at once.
+
+    Args:
+    km (KeyManager): Keystore to select from.
+    message (str): Prompt message.
+    multiple (bool): Select many accounts, or exactly one.
+    all_label (Optional[str]): Extra choice selecting every account, e.g. "Send from all accounts".
+    addresses (Optional[Callable]): Returns name -> address, called once on the first address search.
+
+    Returns:
+    List[str]: Selected account names, in keystore order, empty when nothing was selected.
+    """
+    names = list(km.keys)
+    if len(names) <= SMALL_STORE:
+        if multiple:
+            choices = names + ([all_label] if all_label else [])
+            answer = inquirer.prompt([inquirer.Checkbox("accounts", message=message, choices=choices)])["accounts"]
+            return names if all_label in answer else answer
+        return [inquirer.prompt([inquirer.List("account", message=message, choices=names)])["account"]]
+
+    index = index_for(names)
+    selected: typing.Dict[int, None] = {}
+    while True:
+        modes = ["Search", "Batch"] + ([all_label or "All accounts"] if multiple else [])
+        if selected:
+            modes.append(f"{DONE} ({len(selected)} selected)")
+        mode = inquirer.prompt([inquirer.List("mode", message=f"{message} ({len(index)} accounts)", choices=modes)])["mode"]
+        if mode.startswith(DONE):
+            break
+        if mode == (all_label or "All accounts"):
+            return names
+        if mode == "Batch":
+            batch = inquirer.prompt([
+                inquirer.List("batch", message="Select a batch", choices=sorted(km.get_available_batches()))
+            ])["batch"]
+            positions = index.batch(batch)
+        else:
+            query = inquirer.prompt([
+                inquirer.Text("query", message="Name, prefix_1-100, 1-100, batch:<name>, re:<pattern> or 0x<address>")
+            ])["query"]
+            if addresses is not None and ADDRESS_REGEX.match(query.strip()) and not index._addresses:
+                print("Deriving addresses for the search, once per session...")
+                index.set_addresses(addresses())
+            try:
+                positions = index.search(query)
+            except re.error as e:
+                print(f"Invalid pattern: {e}")
+                continue
+        if not positions:
+            print("No matching accounts.")
+            continue
+
+        pages = (len(positions) + PAGE_SIZE - 1) // PAGE_SIZE
+        number = 0
+        while True:
+            page = index.page(positions, number)
+            navigation = ([PREVIOUS_PAGE] if number > 0 else []) + ([NEXT_PAGE] if number < pages - 1 else []) + [NEW_SEARCH]
+            title = f"{len(positions)} match(es), page {number + 1}/{pages}"
+            if not multiple:
+                answer = inquirer.prompt([inquirer.List("account", message=title, choices=page + navigation)])["account"]
+                if answer not in navigation:
+                    return [answer]
+            else:
+                select_all = f"Select all {len(positions)} match(es)"
+                choices = page + [select_all] + navigation
+                default = [name for name, i in zip(page, positions[number * PAGE_SIZE:]) if i in selected]
+                picked = inquirer.prompt([
+                    inquirer.Checkbox("accounts", message=f"{title}, space to select, enter to confirm", choices=choices, default=default)
+                ])["accounts"]
+                page_positions = positions[number * PAGE_SIZE:(number + 1) * PAGE_SIZE]
+                for name, i in zip(page, page_positions):
+                    if name in picked:
+                        selected[i] = None
+                    else:
+                        selected.pop(i, None)
+                if select_all in picked:
+                    selected.update(dict.fromkeys(positions))
+                    break
+                answer = next((choice for choice in navigation if choice in picked), NEW_SEARCH)
+            if answer == NEXT_PAGE:
+                number += 1
+            elif answer == PREVIOUS_PAGE:
+                number -= 1
+            else:
+                break
+    return [names[i] for i in sorted(selected)]
@@ -0,0 +1,240 @@
+import sqlite3
+import threading
+import typing
+from pathlib import Path
+
+from utils.batch import batch_call
+from utils.init import DATA_PATH
+
+
+SNAPSHOT_FILE = "snapshots.db"
+NATIVE = ""
+# keccak("Transfer(address,address,uint256)")
+TRANSFER_TOPIC = "0xddf252ad1be2c89b69c2b068fc378daa952ba7f163c4a11628f55a4df523b3ef"
+BALANCE_OF = "0x70a08231"
+# A block with its transactions costs about this many eth_getBalance reads
+BLOCK_READ_COST = 10
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS balances (
+    chain_id INTEGER NOT NULL,
+    address TEXT NOT NULL,
+    token TEXT NOT NULL,
+    balance TEXT NOT NULL,
+    block INTEGER NOT NULL,
+    PRIMARY KEY (chain_id, address, token)
+);
+CREATE TABLE IF NOT EXISTS snapshots (
+    chain_id INTEGER NOT NULL,
+    token TEXT NOT NULL,
+    block INTEGER NOT NULL,
+    PRIMARY KEY (chain_id, token)
+);
+"""
+
+
+def _topic_address(topic) -> str:
+    data = topic if isinstance(topic, (bytes, bytearray)) else bytes.fromhex(str(topic).removeprefix("0x"))
+    return "0x" + bytes(data)[-20:].hex()
+
+
+class SnapshotStore:
+    def __init__(self, path: str = str(Path(DATA_PATH) / SNAPSHOT_FILE)):
+        """
+        Local store of (chainId, address, token, balance, block) rows.
+
+        Native balances use an empty token. Balances are kept as decimal
+        strings, uint256 does not fit SQLite integers.
+
+        Args:
+        path (str): SQLite database file.
+        """
+        self.path = path
+        Path(path).parent.mkdir(parents=True, exist_ok=True)
+        self.db = sqlite3.connect(path, check_same_thread=False)
+        self.db.executescript(SCHEMA)
+        self._lock = threading.Lock()
+
+    def close(self):
+        self.db.close()
+
+    def load(self, chain_id: int, token: str = NATIVE) -> typing.Dict[str, typing.Tuple[int, int]]:
+        """
+        Return address -> (balance, block) of one asset on one chain.
+        """
+        with self._lock:
+            rows = self.db.execute(
+                "SELECT address, balance, block FROM balances WHERE chain_id = ? AND token = ?",
+                (chain_id, token.lower()),
+            ).fetchall()
+        return {address: (int(balance), block) for address, balance, block in rows}
+
+    def rows(self, chain_id: typing.Optional[int] = None) -> typing.List[typing.Tuple[int, str, str, int, int]]:
+        """
+        Return every stored (chainId, address, token, balance, block), of one chain or all of them.
+        """
+        query = "SELECT chain_id, address, token, balance, block FROM balances"
+        with self._lock:
+            if chain_id is None:
+                rows = self.db.execute(query).fetchall()
+            else:
+                rows = self.db.execute(query + " WHERE chain_id = ?", (chain_id,)).fetchall()
+        return [(row_chain, address, token, int(balance), block) for row_chain, address, token, balance, block in rows]
+
+    def last_block(self, chain_id: int, token: str = NATIVE) -> typing.Optional[int]:
+        with self._lock:
+            row = self.db.execute(
+                "SELECT block FROM snapshots WHERE chain_id = ? AND token = ?", (chain_id, token.lower())
+            ).fetchone()
+        return row[0] if row else None
+
+    def save(self, chain_id: int, token: str, balances: typing.Dict[str, int], block: int):
+        """
+        Store balances read at block and mark the asset as up to date at that block.
+        """
+        token = token.lower()
+        with self._lock, self.db:
+            self.db.executemany(
+                "INSERT OR REPLACE INTO balances VALUES (?, ?, ?, ?, ?)",
+                [(chain_id, address.lower(), token, str(balance), block) for address, balance in balances.items()],
+            )
+            self.db.execute("INSERT OR REPLACE INTO snapshots VALUES (?, ?, ?)", (chain_id, token, block))
+
+    def update(self, chain_id: int, balances: typing.Dict[str, int], block: int, token: str = NATIVE):
+        """
+        Store balances read at block without moving the snapshot block of the asset.
+        """
+        with self._lock, self.db:
+            self.db.executemany(
+                "INSERT OR REPLACE INTO balances VALUES (?, ?, ?, ?, ?)",
+                [(chain_id, address.lower(), token.lower(), str(balance), block) for address, balance in balances.items()],
+            )
+
+    # -- refresh -- #
+
+    def _native_changes(self, w3, addresses: typing.Set[str], from_block: int, to_block: int) -> typing.Optional[typing.Set[str]]:
+        # Senders, recipients, fee recipients and withdrawals of every block in the range.
+        # None when a tracked address called a contract, which may have paid other tracked addresses internally
+        changed = set()
+        blocks = batch_call(w3, [(w3.eth.get_block, (number, True)) for number in range(from_block, to_block + 1)])
+        for block in blocks:
+            if isinstance(block, Exception):
+                raise block
+            for tx in block["transactions"]:
+                sender = (tx.get("from") or "").lower()
+                if sender in addresses and tx.get("input") not in (None, b"", "0x"):
+                    return None
+            touched = [block.get("miner")]
+            touched += [address for tx in block["transactions"] for address in (tx.get("from"), tx.get("to"))]
+            touched += [withdrawal.get("address") for withdrawal in block.get("withdrawals") or []]
+            changed.update(address.lower() for address in touched if address and address.lower() in addresses)
+        return changed
+
+    def _token_changes(self, w3, tokens: typing.List[str], addresses: typing.Set[str], from_block: int, to_block: int, chunk: int) -> typing.Dict[str, typing.Set[str]]:
+        changed = {token: set() for token in tokens}
+        for start in range(from_block, to_block + 1, chunk):
+            logs = w3.eth.get_logs({
+                "fromBlock": start,
+                "toBlock": min(start + chunk - 1, to_block),
+                "address": [w3.to_checksum_address(token) for token in tokens],
+                "topics": [TRANSFER_TOPIC],
+            })
+            for log in logs:
+                if len(log["topics"]) < 3:
+                    continue
+                token = log["address"].lower()
+                for topic in log["topics"][1:3]:
+                    address = _topic_address(topic)
+                    if address in addresses and token in changed:
+                        changed[token].add(address)
+        return changed
+
+    def _read(self, w3, token: str, addresses: typing.Iterable[str], block: int) -> typing.Dict[str, int]:
+        addresses = list(addresses)
+        if token == NATIVE:
+            calls = [(w3.eth.get_balance, (w3.to_checksum_address(address), block)) for address in addresses]
+        else:
+            to = w3.to_checksum_address(token)
+            calls = [(w3.eth.call, ({"to": to, "data": BALANCE_OF + address[2:].rjust(64, "0")}, block)) for address in addresses]
+        results = batch_call(w3, calls)
+        balances = {}
+        for address, result in zip(addresses, results):
+            if isinstance(result, Exception):
+                raise result
+            balances[address] = result if token == NATIVE else int.from_bytes(bytes(result) or b"\0", "big")
+        return balances
+
+    @staticmethod
+    def _scan_pays(blocks: int, addresses: int, max_scan_blocks: int) -> bool:
+        return blocks <= max_scan_blocks and blocks * BLOCK_READ_COST < addresses
+
+    def refresh(
+        self,
+        w3,
+        addresses: typing.Iterable[str],
+        tokens: typing.Iterable[str] = (),
+        full: bool = False,
+        scan_native: bool = False,
+        max_scan_blocks: int = 1000,
+        log_chunk: int = 2000,
+    ) -> typing.Dict[str, typing.Any]:
+        """
+        Bring the snapshot of addresses up to the current head.
+
+        Addresses without a stored balance are read directly. Token holders
+        are only read again when Transfer logs since the last snapshot block
+        touch them. Native balances are read again in batches at the head:
+        native paid by contract calls of others is not visible in blocks.
+        With scan_native, only native holders touched in the blocks in
+        between are read, while fetching the blocks costs less than reading
+        every balance (see BLOCK_READ_COST). A contract call by any tracked
+        address in the range reads everything, "scanned" in the result tells
+        when internal payments may have been missed.
+
+        Args:
+        w3 (Web3): Connected Web3 instance.
+        addresses (Iterable[str]): Tracked addresses.
+        tokens (Iterable[str]): ERC20 token addresses, native balances are always tracked.
+        full (bool): Read every balance again.
+        scan_native (bool): Scan blocks for changed native balances instead of reading them all.
+        max_scan_blocks (int): Longest native range scanned block by block.
+        log_chunk (int): Blocks per eth_getLogs request.
+
+        Returns:
+        dict: Snapshot block, number of balances read per asset, and native blocks scanned instead of read.
+        """
+        chain_id = w3.eth.chain_id
+        head = w3.eth.block_number
+        tracked = {address.lower() for address in addresses}
+        summary = {"chainId": chain_id, "block": head, "read": {}, "scanned": 0}
+
+        incremental_tokens: typing.Dict[int, typing.List[str]] = {}
+        for token in [NATIVE] + [token.lower() for token in tokens]:
+            stored = self.load(chain_id, token)
+            last = self.last_block(chain_id, token)
+            missing = tracked - set(stored)
+            if full or last is None or (token == NATIVE and not (scan_native and self._scan_pays(head - last, len(tracked - missing), max_scan_blocks))):
+                to_read = tracked
+            elif last >= head:
+                to_read = missing
+            elif token == NATIVE:
+                changed = self._native_changes(w3, tracked - missing, last + 1, head)
+                if changed is None:
+                    to_read = tracked
+                else:
+                    to_read = missing | changed
+                    summary["scanned"] = head - last
+            else:
+                # Tokens are grouped by snapshot block to share eth_getLogs requests
+                incremental_tokens.setdefault(last, []).append(token)
+                continue
+            self.save(chain_id, token, self._read(w3, token, to_read, head), head)
+            summary["read"][token or "native"] = len(to_read)
+
+        for last, group in incremental_tokens.items():
+            changes = self._token_changes(w3, group, tracked, last + 1, head, log_chunk)
+            for token in group:
+                to_read = (tracked - set(self.load(chain_id, token))) | changes[token]
+                self.save(chain_id, token, self._read(w3, token, to_read, head), head)
+                summary["read"][token] = len(to_read)
+        return summary
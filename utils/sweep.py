@@ -0,0 +1,141 @@
+import math
+import typing
+from concurrent.futures import ThreadPoolExecutor
+
+from utils.batch import batch_call
+from utils.crypto import derive_addresses
+from utils.tx import SendTransaction
+
+
+DEFAULT_GAS_LIMIT = 21000
+# Headroom over the pending base fee, two full blocks of base fee increases
+BASE_FEE_HEADROOM = 1.125 ** 2
+
+
+def sweep_fees(w3, fees: typing.Dict[str, int]) -> typing.Dict[str, int]:
+    """
+    Return fee fields whose price per gas is exactly what the tx pays.
+
+    A legacy gasPrice already is. With EIP-1559 fees maxFeePerGas is set to
+    maxPriorityFeePerGas, the tx then pays maxFeePerGas whatever the base fee
+    and the rest goes to the tip. It is the pending base fee with
+    BASE_FEE_HEADROOM plus the suggested tip, so little is overpaid, and if the
+    base fee rises further the tx waits instead of failing.
+    """
+    if "gasPrice" in fees:
+        return {"gasPrice": fees["gasPrice"]}
+    base_fee = w3.eth.fee_history(1, "latest")["baseFeePerGas"][-1]
+    price = math.ceil(base_fee * BASE_FEE_HEADROOM) + fees.get("maxPriorityFeePerGas", 0)
+    return {"maxFeePerGas": price, "maxPriorityFeePerGas": price}
+
+
+def price_per_gas(fees: typing.Dict[str, int]) -> int:
+    return fees.get("maxFeePerGas", fees.get("gasPrice", 0))
+
+
+def sweep(
+    w3,
+    private_keys: typing.Dict[str, str],
+    to_address: str,
+    fees: typing.Dict[str, int],
+    gas_limit: int = DEFAULT_GAS_LIMIT,
+    dust: int = 0,
+    concurrency: int = 8,
+) -> typing.List[typing.Dict[str, typing.Any]]:
+    """
+    Send the whole native balance of every account to one address.
+
+    Balances and pending nonces are fetched in batches, the sendable amount is
+    balance - gas_limit * price per gas. Fees go through sweep_fees(), so that
+    is the exact cost of a plain transfer and nothing is left on the account,
+    see check_empty().
+
+    Args:
+    w3 (Web3): Connected Web3 instance.
+    private_keys (dict): Account name -> private key.
+    to_address (str): Destination address.
+    fees (dict): Fee fields, from FeeOracle.fees(), turned into exact ones by sweep_fees().
+    gas_limit (int): Gas limit of each transfer.
+    dust (int): Accounts with a sendable amount at or below this (wei) are skipped.
+    concurrency (int): Number of transfers in flight.
+
+    Returns:
+    List[dict]: One summary row per account with status sent, skipped or failed.
+    """
+    chain_id = w3.eth.chain_id
+    fees = sweep_fees(w3, fees)
+    fee = gas_limit * price_per_gas(fees)
+    keys = [key if key.startswith("0x") else "0x" + key for key in private_keys.values()]
+    rows = [
+        {"account": name, "address": address, "key": key}
+        for name, key, address in zip(private_keys, keys, derive_addresses(keys))
+    ]
+
+    balances = batch_call(w3, [(w3.eth.get_balance, (row["address"], "latest")) for row in rows])
+    nonces = batch_call(w3, [(w3.eth.get_transaction_count, (row["address"], "pending")) for row in rows])
+
+    pending = []
+    for row, balance, nonce in zip(rows, balances, nonces):
+        if isinstance(balance, Exception) or isinstance(nonce, Exception):
+            row.update(status="failed", error=str(balance if isinstance(balance, Exception) else nonce))
+            continue
+        row.update(balance=balance, fee=fee, value=max(balance - fee, 0), nonce=nonce)
+        if row["value"] <= dust:
+            row["status"] = "skipped"
+        else:
+            pending.append(row)
+
+    def send(row):
+        tx = SendTransaction(
+            w3, chain_id, row["key"], row["address"], to_address, row["value"], gas_limit,
+            fees.get("gasPrice"), fees, nonce=row["nonce"],
+        )
+        try:
+            row["hash"] = "0x" + tx.send().hex().removeprefix("0x")
+            row["status"] = "sent"
+        except Exception as e:
+            row.update(status="failed", error=str(e))
+
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        list(executor.map(send, pending))
+
+    for row in rows:
+        del row["key"]
+    return rows
+
+
+def check_empty(w3, rows: typing.List[typing.Dict[str, typing.Any]], timeout: float = 120, concurrency: int = 8) -> typing.List[typing.Dict[str, typing.Any]]:
+    """
+    Wait for the sent rows of sweep() and read what is left on each account.
+
+    Balances are read in one batch at the block of each receipt, so later
+    deposits do not count. Rows get "left" (wei), or "error" when the receipt
+    did not come within timeout. Anything above 0 means the transfer used
+    less gas than its limit, e.g. a contract destination.
+
+    Returns:
+    List[dict]: The sent rows.
+    """
+    sent = [row for row in rows if row["status"] == "sent"]
+
+    def wait(row):
+        try:
+            return w3.eth.wait_for_transaction_receipt(row["hash"], timeout=timeout)
+        except Exception as e:
+            return e
+
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        receipts = list(executor.map(wait, sent))
+    confirmed = []
+    for row, receipt in zip(sent, receipts):
+        if isinstance(receipt, Exception):
+            row["error"] = f"No receipt: {receipt}"
+        else:
+            confirmed.append((row, receipt["blockNumber"]))
+    balances = batch_call(w3, [(w3.eth.get_balance, (row["address"], block)) for row, block in confirmed])
+    for (row, _), balance in zip(confirmed, balances):
+        if isinstance(balance, Exception):
+            row["error"] = str(balance)
+        else:
+            row["left"] = balance
+    return sent
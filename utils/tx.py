@@ -1,6 +1,9 @@
 
+from utils.journal import journal
+
+
 class SendTransaction:
-    def __init__(self, w3, сhain_id, private_key, from_address, to_address, amount, gas_limit, gas_price):
+    def __init__(self, w3, сhain_id, private_key, from_address, to_address, amount, gas_limit, gas_price=None, fees=None, nonce=None):
         self.w3 = w3
         self.from_address = from_address
         self.private_key = private_key
@@ -8,20 +11,32 @@ class SendTransaction:
         self.amount = amount
         self.gas_limit = gas_limit
         self.gas_price = gas_price
+        # EIP-1559 fee fields from FeeOracle.fees(), used when gas_price is not set
+        self.fees = fees
+        # Known nonce when the caller tracks nonces locally, fetched on build otherwise
+        self.nonce = nonce
         self.chain_id = сhain_id
         self.tx = None
         self.tx_hash = None
 
     def build(self):
-        nonce = self.w3.eth.get_transaction_count(self.from_address)
+        if self.tx is not None:
+            return self.tx
+        nonce = self.nonce
+        if nonce is None:
+            nonce = self.w3.eth.get_transaction_count(self.from_address)
         tx = {
             'nonce': nonce,
             'to': self.to_address,
             'value': self.amount,
             'gas': self.gas_limit,
-            'gasPrice': self.gas_price,
             'chainId': self.chain_id
         }
+        if self.gas_price is None and self.fees:
+            tx.update(self.fees)
+        else:
+            tx['gasPrice'] = self.gas_price
+        self.tx = tx
         return tx
     
     def sign(self):
@@ -32,9 +47,9 @@ class SendTransaction:
     def send(self):
         signed_tx = self.sign()
         self.tx_hash = self.w3.eth.send_raw_transaction(signed_tx.raw_transaction)
+        journal.record(self.chain_id, self.from_address, self.tx, self.tx_hash)
         return self.tx_hash
     
     def status(self):
         return self.w3.eth.wait_for_transaction_receipt(self.tx_hash)
     
-
@@ -0,0 +1,171 @@
+import math
+import multiprocessing
+import os
+import queue
+import re
+import string
+import time
+import typing
+
+from eth_utils import to_checksum_address
+
+from utils.crypto import N, get_backend, keccak
+
+
+# Attempts made by a worker between two checks of the shared stop flag
+CHECK_EVERY = 512
+
+
+class VanityPattern:
+    def __init__(self, prefix: str = "", suffix: str = "", regex: str = "", case_sensitive: bool = False):
+        """
+        Initialize the pattern an address should match.
+
+        Args:
+        prefix (str): Hex characters the address should start with (after 0x).
+        suffix (str): Hex characters the address should end with.
+        regex (str): Regular expression searched in the address without 0x.
+        case_sensitive (bool): Compare against the EIP-55 checksum address.
+        """
+        prefix = prefix.removeprefix("0x")
+        for part in (prefix, suffix):
+            if any(c not in string.hexdigits for c in part):
+                raise ValueError(f"Not a hex pattern: {part}")
+        if len(prefix) + len(suffix) > 40:
+            raise ValueError("Pattern is longer than an address.")
+        self.case_sensitive = case_sensitive
+        self.prefix = prefix if case_sensitive else prefix.lower()
+        self.suffix = suffix if case_sensitive else suffix.lower()
+        self.regex = re.compile(regex, 0 if case_sensitive else re.IGNORECASE) if regex else None
+        # Case-insensitive form of the pattern, a checksum address can only match what its lowercase form matches
+        self._loose = (prefix.lower(), suffix.lower(), re.compile(regex, re.IGNORECASE) if regex else None)
+
+    @staticmethod
+    def _match(address: str, prefix: str, suffix: str, regex: typing.Optional[typing.Pattern]) -> bool:
+        return (
+            address.startswith(prefix)
+            and address.endswith(suffix)
+            and (regex is None or regex.search(address) is not None)
+        )
+
+    def matches(self, address: str) -> bool:
+        """
+        Check a lowercase address without 0x against the pattern.
+
+        Case-sensitive patterns only checksum the addresses matching the lowercase pattern.
+        """
+        if not self._match(address, *self._loose):
+            return False
+        if not self.case_sensitive:
+            return True
+        return self._match(to_checksum_address(address)[2:], self.prefix, self.suffix, self.regex)
+
+    def difficulty(self) -> typing.Optional[float]:
+        """
+        Return the expected number of attempts per match, None for regex patterns.
+        """
+        if self.regex is not None:
+            return None
+        chars = self.prefix + self.suffix
+        # A checksummed letter has an extra 1/2 chance to be in the right case
+        cased = sum(1 for c in chars if c.isalpha()) if self.case_sensitive else 0
+        return 16 ** len(chars) * 2 ** cased
+
+
+def _worker(pattern: VanityPattern, stop, counter, index: int, results) -> None:
+    # Each check interval is derived as one batch by the fastest crypto backend
+    _, public_keys = get_backend()
+    attempts = 0
+    try:
+        while not stop.value:
+            batch = [os.urandom(32) for _ in range(CHECK_EVERY)]
+            # Out of the curve order, ~2^-128 chance
+            batch = [private_key for private_key in batch if 0 < int.from_bytes(private_key, "big") < N]
+            for private_key, public_key in zip(batch, public_keys(batch)):
+                address = keccak(public_key)[12:].hex()
+                if pattern.matches(address):
+                    results.put((private_key.hex(), to_checksum_address(address)))
+            attempts += CHECK_EVERY
+            counter[index] = attempts
+    except KeyboardInterrupt:
+        # Ctrl+C reaches the workers too, the matches already queued are still delivered
+        pass
+
+
+def search(
+    pattern: VanityPattern,
+    count: int = 1,
+    workers: typing.Optional[int] = None,
+    timeout: typing.Optional[float] = None,
+    on_progress: typing.Optional[typing.Callable[[int, float, typing.Optional[float]], None]] = None,
+) -> typing.List[typing.Tuple[str, str]]:
+    """
+    Generate random keys on every core until count addresses match the pattern.
+
+    Args:
+    pattern (VanityPattern): The pattern to search for.
+    count (int): Number of matching accounts to find.
+    workers (Optional[int]): Number of worker processes, CPU count by default.
+    timeout (Optional[float]): Give up after this many seconds.
+    on_progress (Callable): Called about once a second with (attempts, attempts/sec, expected seconds left).
+
+    Returns:
+    List[Tuple[str, str]]: (private key hex, checksum address) of the matches, may be shorter than count
+        on timeout or when the search is stopped with Ctrl+C.
+    """
+    workers = workers or os.cpu_count() or 1
+    stop = multiprocessing.Value("b", 0)
+    counter = multiprocessing.Array("Q", workers, lock=False)
+    results = multiprocessing.Queue()
+    processes = [
+        multiprocessing.Process(target=_worker, args=(pattern, stop, counter, i, results), daemon=True)
+        for i in range(workers)
+    ]
+    for process in processes:
+        process.start()
+
+    found = []
+    started = time.monotonic()
+    difficulty = pattern.difficulty()
+    try:
+        while len(found) < count:
+            try:
+                found.append(results.get(timeout=1))
+            except queue.Empty:
+                pass
+            elapsed = time.monotonic() - started
+            if on_progress is not None:
+                attempts = sum(counter)
+                rate = attempts / elapsed if elapsed > 0 else 0.0
+                eta = None
+                if difficulty is not None and rate > 0:
+                    # Attempts are memoryless, past misses do not bring the next match closer
+                    eta = difficulty * (count - len(found)) / rate
+                on_progress(attempts, rate, eta)
+            if timeout is not None and elapsed > timeout:
+                break
+    except KeyboardInterrupt:
+        # Stopped by the user, keep the matches found so far
+        pass
+    finally:
+        stop.value = 1
+        for process in processes:
+            process.join(timeout=5)
+            if process.is_alive():
+                process.terminate()
+    # Workers may have found a few more before stopping
+    while len(found) < count:
+        try:
+            found.append(results.get_nowait())
+        except queue.Empty:
+            break
+    return found[:count]
+
+
+def format_eta(seconds: typing.Optional[float]) -> str:
+    if seconds is None or math.isinf(seconds):
+        return "unknown"
+    for unit, size in (("d", 86400), ("h", 3600), ("m", 60)):
+        if seconds >= size:
+            return f"{seconds / size:.1f}{unit}"
+    return f"{seconds:.0f}s"